@@ -23,7 +23,14 @@ normalized-difference indices, so it is product-agnostic by construction.
 """
 
 import base64
+import functools
+import hashlib
 import io
+import math
+import shutil
+import threading
+import warnings
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
@@ -34,6 +41,9 @@ import rasterio
 import spectral.io.envi as envi
 from PIL import Image
 from rasterio.warp import transform_bounds
+from rasterio.windows import Window
+from rasterio.windows import bounds as window_bounds
+from rasterio.windows import transform as window_transform
 
 # Natural-colour band targets (nm) — AVIRIS-NG true colour
 RGB_WAVELENGTHS = {'red': 650.0, 'green': 550.0, 'blue': 470.0}
@@ -83,6 +93,32 @@ SEVERITY_CLASSES: List[Tuple] = [
 
 _RADIANCE_UNITS = "µW·cm⁻²·nm⁻¹·sr⁻¹"
 
+# Output rows copied per memmap read in _read_band — bounds the working set
+# to one block regardless of cube size.
+READ_BLOCK_ROWS = 512
+
+# (row0, row1, col0, col1) pixel window, half-open like Python slices
+PixelWindow = Tuple[int, int, int, int]
+
+# Decimation factors pre-built by build_overviews(); they match the app's
+# "Render downsample" options above 1×.
+OVERVIEW_LEVELS: Tuple[int, ...] = (2, 4, 8, 16)
+
+# Default byte budget for the per-analyzer decoded-band LRU (see _read_band).
+BAND_CACHE_BYTES = 512 * 1024 ** 2
+
+# Batch spectra: pixels per memmap fancy-index read, and the pixel budget one
+# get_spectra_in_polygon gather spans before reducing (~425 bands × 4 B each,
+# so 1M pixels ≈ 1.7 GB peak).
+SPECTRA_CHUNK = 65536
+POLYGON_BATCH_PIXELS = 1_000_000
+SPECTRA_REDUCERS = {
+    None:     None,
+    'mean':   np.nanmean,
+    'median': np.nanmedian,
+    'std':    np.nanstd,
+}
+
 
 class AVIRISAnalyzer:
     """
@@ -94,6 +130,9 @@ class AVIRISAnalyzer:
     img_path : str
         Path to the `*corr_v*_img` (reflectance) or `*rdn_v*_img` (radiance)
         ENVI binary. The matching `.hdr` is auto-detected.
+    band_cache_bytes : int
+        LRU budget for decoded bands, keyed on (band, downsample, window) so
+        layers sharing a wavelength (NDVI → NBR → EVI …) don't re-read it.
 
     Example
     -------
@@ -103,7 +142,7 @@ class AVIRISAnalyzer:
     >>> spectrum = a.get_spectra_latlon(38.9, -120.8)
     """
 
-    def __init__(self, img_path: str):
+    def __init__(self, img_path: str, band_cache_bytes: int = BAND_CACHE_BYTES):
         self.img_path = Path(img_path)
         hdr = Path(str(self.img_path) + ".hdr")
         if not hdr.exists():
@@ -111,12 +150,21 @@ class AVIRISAnalyzer:
         self.hdr_path = hdr
 
         self._spy = None
+        self._mm = None                              # (rows, cols, bands) memmap
+        self._overviews: Dict[int, np.ndarray] = {}  # factor → (bands, r, c)
         self._wl: Optional[np.ndarray] = None
         self._bounds: Optional[List[float]] = None   # [south, west, north, east]
         self._crs = None
         self._transform = None
         self._product_type: Optional[str] = None     # 'reflectance' | 'radiance'
 
+        self.band_cache_bytes = int(band_cache_bytes)
+        self._band_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._band_cache_nbytes = 0
+        self._band_cache_hits = 0
+        self._band_cache_misses = 0
+        self._cache_lock = threading.Lock()
+
     # ── Loading ───────────────────────────────────────────────────────────────
 
     def load(self) -> "AVIRISAnalyzer":
@@ -138,9 +186,81 @@ class AVIRISAnalyzer:
                 w, s, e, n = transform_bounds(src.crs, "EPSG:4326", w, s, e, n)
             self._bounds = [s, w, n, e]
 
+        self._overviews = self._open_overviews()
         self._product_type = self._detect_product_type()
         return self
 
+    # ── Overviews ─────────────────────────────────────────────────────────────
+
+    @property
+    def overview_dir(self) -> Path:
+        """Sidecar directory holding one `x{factor}.npy` per overview level."""
+        return Path(str(self.img_path) + ".ovr")
+
+    @property
+    def overview_levels(self) -> List[int]:
+        return sorted(self._overviews)
+
+    def _overview_shape(self, factor: int) -> Tuple[int, int, int]:
+        rows, cols = self.shape
+        return self.n_bands, -(-rows // factor), -(-cols // factor)
+
+    def _open_overviews(self) -> Dict[int, np.ndarray]:
+        """Memory-map whichever overview levels exist and match this cube."""
+        out = {}
+        for f in OVERVIEW_LEVELS:
+            path = self.overview_dir / f"x{f}.npy"
+            if not path.exists():
+                continue
+            ov = np.load(path, mmap_mode='r')
+            if ov.shape == self._overview_shape(f):
+                out[f] = ov
+        return out
+
+    def build_overviews(self, levels: Tuple[int, ...] = OVERVIEW_LEVELS,
+                        block_rows: int = 32, force: bool = False) -> List[int]:
+        """
+        Write area-averaged (NaN-aware mean, not nearest striding) decimated
+        copies of every band to the `.ovr` sidecar, in one streaming pass
+        over the cube. Run once per cube; afterwards _read_band serves any
+        matching downsample from the overview. Returns the levels available.
+        """
+        levels = tuple(sorted(set(levels)))
+        if not force and all(f in self._overviews for f in levels):
+            return self.overview_levels
+        mm = self._memmap()
+        if mm is None:
+            raise ValueError("Cube can't be memory-mapped — overviews unavailable.")
+
+        # Blocks must cover whole output pixels at every level.
+        step = math.lcm(*levels)
+        block_rows = max(step, block_rows // step * step)
+        rows, cols = self.shape
+        self._overviews = {}
+        tmp = Path(str(self.overview_dir) + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        out = {f: np.lib.format.open_memmap(tmp / f"x{f}.npy", mode='w+',
+                                            dtype=np.float32,
+                                            shape=self._overview_shape(f))
+               for f in levels}
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)   # all-NaN cells
+            for r0 in range(0, rows, block_rows):
+                block = np.array(mm[r0:r0 + block_rows], dtype=np.float32)
+                block[block < 0] = np.nan
+                for f, ov in out.items():
+                    ov[:, r0 // f:r0 // f + -(-block.shape[0] // f)] = (
+                        _area_mean(block, f).transpose(2, 0, 1))
+        for ov in out.values():
+            ov.flush()
+        del out
+        shutil.rmtree(self.overview_dir, ignore_errors=True)
+        tmp.rename(self.overview_dir)
+        self._overviews = self._open_overviews()
+        self.clear_band_cache()          # cached strided reads are now stale
+        return self.overview_levels
+
     def _detect_product_type(self) -> str:
         """
         Filename first (authoritative for standard AVIRIS-NG naming), then a
@@ -196,22 +316,146 @@ class AVIRISAnalyzer:
         """0-based index of the band closest to the requested wavelength."""
         return int(np.argmin(np.abs(self._wl - wavelength_nm)))
 
-    def _read_band(self, wavelength_nm: float, downsample: int = 1) -> np.ndarray:
-        """Read one band as float32 with negatives (fill values) → NaN."""
+    def _memmap(self) -> Optional[np.ndarray]:
+        """(rows, cols, bands) view of the cube file, opened once. None if the
+        file can't be memory-mapped (then reads fall back to read_band)."""
+        if self._mm is None:
+            try:
+                self._mm = self._spy.open_memmap(interleave='bip')
+            except Exception:
+                self._mm = False
+        return self._mm if self._mm is not False else None
+
+    def window_for_bbox(self, bbox: List[float]) -> PixelWindow:
+        """WGS-84 [west, south, east, north] → pixel window clipped to the
+        cube, as (row0, row1, col0, col1)."""
+        w, s, e, n = bbox
+        px = [self.latlon_to_pixel(lat, lon)
+              for lat, lon in ((s, w), (s, e), (n, w), (n, e))]
+        rows, cols = self.shape
+        r0 = max(0, min(r for r, _ in px))
+        r1 = min(rows, max(r for r, _ in px) + 1)
+        c0 = max(0, min(c for _, c in px))
+        c1 = min(cols, max(c for _, c in px) + 1)
+        if r1 <= r0 or c1 <= c0:
+            raise ValueError(f"bbox {bbox} does not overlap the scene")
+        return r0, r1, c0, c1
+
+    def _render_window(self, bbox: Optional[List[float]],
+                       downsample: int) -> Optional[PixelWindow]:
+        """window_for_bbox for a render at `downsample`. When an overview
+        serves that level the window is widened to whole overview cells, so
+        the bounds returned match the cells actually read (a bbox starting
+        mid-cell would otherwise be off by up to downsample-1 pixels)."""
+        if bbox is None:
+            return None
+        r0, r1, c0, c1 = self.window_for_bbox(bbox)
+        ds = max(1, int(downsample))
+        if ds in self._overviews:
+            rows, cols = self.shape
+            r0, c0 = r0 // ds * ds, c0 // ds * ds
+            r1, c1 = min(rows, -(-r1 // ds) * ds), min(cols, -(-c1 // ds) * ds)
+        return r0, r1, c0, c1
+
+    def _window_bounds(self, window: Optional[PixelWindow]) -> List[float]:
+        """[south, west, north, east] of a pixel window (scene if None)."""
+        if window is None:
+            return self._bounds
+        r0, r1, c0, c1 = window
+        w, s, e, n = window_bounds(Window(c0, r0, c1 - c0, r1 - r0),
+                                   self._transform)
+        if self._crs and not self._crs.is_geographic:
+            w, s, e, n = transform_bounds(self._crs, "EPSG:4326", w, s, e, n)
+        return [s, w, n, e]
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Band-cache counters: hits, misses, entries, bytes, budget."""
+        with self._cache_lock:
+            return {
+                'hits':    self._band_cache_hits,
+                'misses':  self._band_cache_misses,
+                'entries': len(self._band_cache),
+                'bytes':   self._band_cache_nbytes,
+                'budget':  self.band_cache_bytes,
+            }
+
+    def clear_band_cache(self) -> None:
+        with self._cache_lock:
+            self._band_cache.clear()
+            self._band_cache_nbytes = 0
+
+    def _read_band(self, wavelength_nm: float, downsample: int = 1,
+                   window: Optional[PixelWindow] = None) -> np.ndarray:
+        """
+        Read one band as float32 with negatives (fill values) → NaN.
+
+        Served from the band LRU when the same (band, downsample, window) was
+        read before; returned arrays are read-only because they're shared.
+        """
         idx = self._nearest_band(wavelength_nm)
-        arr = self._spy.read_band(idx).astype(np.float32)
-        if downsample > 1:
-            arr = arr[::downsample, ::downsample]
+        key = (idx, max(1, int(downsample)), window)
+        with self._cache_lock:
+            arr = self._band_cache.get(key)
+            if arr is not None:
+                self._band_cache.move_to_end(key)
+                self._band_cache_hits += 1
+                return arr
+            self._band_cache_misses += 1
+
+        arr = self._load_band(idx, key[1], window)
+        arr.flags.writeable = False
+        if arr.nbytes > self.band_cache_bytes:
+            return arr
+        with self._cache_lock:
+            if key not in self._band_cache:
+                self._band_cache[key] = arr
+                self._band_cache_nbytes += arr.nbytes
+            while self._band_cache_nbytes > self.band_cache_bytes:
+                _, old = self._band_cache.popitem(last=False)
+                self._band_cache_nbytes -= old.nbytes
+        return arr
+
+    def _load_band(self, idx: int, ds: int,
+                   window: Optional[PixelWindow]) -> np.ndarray:
+        """
+        Uncached band read. A matching overview level is used when present;
+        otherwise only the rows/cols of `window` (whole scene if None) at the
+        `ds` stride are touched: rows are pulled through the memmap in
+        READ_BLOCK_ROWS blocks straight into the output, so a coarse or
+        windowed read never scans the full band.
+        """
+        rows, cols = self.shape
+        r0, r1, c0, c1 = window or (0, rows, 0, cols)
+        n_out = (len(range(r0, r1, ds)), len(range(c0, c1, ds)))
+        ov = self._overviews.get(ds)
+        if ov is not None:
+            # Overview pixel k averages source pixels [k*ds, (k+1)*ds), already
+            # NaN-filled; renders align `window` to that grid (_render_window).
+            return np.array(ov[idx, r0 // ds:r0 // ds + n_out[0],
+                               c0 // ds:c0 // ds + n_out[1]], dtype=np.float32)
+        mm = self._memmap()
+        if mm is None:
+            arr = self._spy.read_band(idx)[r0:r1:ds, c0:c1:ds].astype(np.float32)
+        else:
+            arr = np.empty(n_out, dtype=np.float32)
+            for i in range(0, arr.shape[0], READ_BLOCK_ROWS):
+                rs = r0 + i * ds
+                re = min(r1, rs + READ_BLOCK_ROWS * ds)
+                arr[i:i + READ_BLOCK_ROWS] = mm[rs:re:ds, c0:c1:ds, idx]
         arr[arr < 0] = np.nan          # AVIRIS-NG fills bad/edge pixels negative
         return arr
 
     # ── Rendering ─────────────────────────────────────────────────────────────
 
     def render_rgb(self, p_low: float = 2, p_high: float = 98,
-                    downsample: int = 4) -> Tuple[np.ndarray, List[float]]:
-        r = self._read_band(RGB_WAVELENGTHS['red'],   downsample)
-        g = self._read_band(RGB_WAVELENGTHS['green'], downsample)
-        b = self._read_band(RGB_WAVELENGTHS['blue'],  downsample)
+                    downsample: int = 4, bbox: Optional[List[float]] = None
+                    ) -> Tuple[np.ndarray, List[float]]:
+        """bbox: optional WGS-84 [west, south, east, north] to render only
+        that part of the scene (bounds returned are the window's)."""
+        win = self._render_window(bbox, downsample)
+        r = self._read_band(RGB_WAVELENGTHS['red'],   downsample, win)
+        g = self._read_band(RGB_WAVELENGTHS['green'], downsample, win)
+        b = self._read_band(RGB_WAVELENGTHS['blue'],  downsample, win)
         rgb = np.stack([r, g, b], axis=-1)            # already 0–1 reflectance
 
         valid = rgb[~np.isnan(rgb)]
@@ -220,16 +464,18 @@ class AVIRISAnalyzer:
 
         alpha = (~np.any(np.isnan(rgb), axis=-1) * 255).astype(np.uint8)
         rgba = np.dstack([(np.nan_to_num(rgb) * 255).astype(np.uint8), alpha])
-        return rgba, self._bounds
-
-    def render_index(self, index_name: str,
-                     downsample: int = 4) -> Tuple[np.ndarray, List[float]]:
-        arr = self._compute_index(index_name, downsample)
-        cmap = plt.get_cmap(INDEX_COLORMAPS.get(index_name, 'RdYlGn'))
-        norm = mcolors.TwoSlopeNorm(vmin=-1, vcenter=0, vmax=1)
-        rgba = (cmap(norm(np.nan_to_num(arr, nan=0.0))) * 255).astype(np.uint8)
-        rgba[..., 3] = (~np.isnan(arr) * 255).astype(np.uint8)
-        return rgba, self._bounds
+        return rgba, self._window_bounds(win)
+
+    def render_index(self, index_name: str, downsample: int = 4,
+                     out: Optional[np.ndarray] = None,
+                     bbox: Optional[List[float]] = None
+                     ) -> Tuple[np.ndarray, List[float]]:
+        """LUT-coloured index. `out`: optional preallocated (H, W, 4) uint8.
+        bbox: optional WGS-84 window, as in render_rgb."""
+        win = self._render_window(bbox, downsample)
+        arr = self._compute_index(index_name, downsample, win)
+        rgba = index_to_rgba(arr, INDEX_COLORMAPS.get(index_name, 'RdYlGn'), out)
+        return rgba, self._window_bounds(win)
 
     # ── Point queries ─────────────────────────────────────────────────────────
 
@@ -258,24 +504,200 @@ class AVIRISAnalyzer:
         row, col = self.latlon_to_pixel(lat, lon)
         return self.get_spectra(row, col)
 
+    # ── Batch extraction ──────────────────────────────────────────────────────
+
+    def latlon_to_pixels(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized latlon_to_pixel: WGS-84 arrays → (rows, cols) int64.
+        Floors instead of truncating so points just off the top/left edge
+        map to -1 (out of bounds) rather than row/col 0."""
+        x = np.asarray(lons, dtype=float)
+        y = np.asarray(lats, dtype=float)
+        if self._crs and not self._crs.is_geographic:
+            from pyproj import Transformer
+            tr = Transformer.from_crs("EPSG:4326", self._crs, always_xy=True)
+            x, y = tr.transform(x, y)
+        col, row = ~self._transform * (np.asarray(x), np.asarray(y))
+        return (np.floor(row).astype(np.int64),
+                np.floor(col).astype(np.int64))
+
+    def get_spectra_batch(self, points, latlon: bool = True
+                          ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Spectra for many pixels in one pass.
+
+        Parameters
+        ----------
+        points : array-like (N, 2)
+            (lat, lon) pairs — or (row, col) pairs when latlon=False.
+
+        Returns
+        -------
+        (spectra, valid) — (N, bands) float32 with fill values as NaN, and an
+        (N,) bool mask that is False for points off the cube or all-fill.
+        Rows come back in input order.
+        """
+        pts = np.asarray(points, dtype=float).reshape(-1, 2)
+        if latlon:
+            rows, cols = self.latlon_to_pixels(pts[:, 0], pts[:, 1])
+        else:
+            rows, cols = pts[:, 0].astype(np.int64), pts[:, 1].astype(np.int64)
+        return self._gather(rows, cols)
+
+    def get_spectra_in_polygon(self, geometry, reduce: Optional[str] = None
+                               ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Spectra of every pixel whose centre falls inside a polygon.
+
+        Parameters
+        ----------
+        geometry : shapely geometry / GeoJSON mapping, or a sequence of them
+            In WGS-84 — or a GeoSeries/GeoDataFrame, which is reprojected
+            from its own CRS.
+        reduce : None | 'mean' | 'median' | 'std'
+            None (single geometry only) returns the pixels themselves;
+            otherwise one NaN-aware spectrum per polygon.
+
+        Returns
+        -------
+        reduce=None : (spectra (N, bands) float32, valid (N,) bool), as in
+            get_spectra_batch.
+        reduce set  : (stats (P, bands) float32, n_valid (P,) int64) — the
+            number of valid pixels behind each row; 0 means the polygon
+            missed the cube and its row is all-NaN.
+        """
+        if reduce not in SPECTRA_REDUCERS:
+            raise ValueError(f"Unknown reduce: {reduce!r}")
+        geoms = self._project_geometries(geometry)
+        if reduce is None:
+            if len(geoms) != 1:
+                raise ValueError("reduce=None needs a single geometry")
+            rows, cols = self._polygon_pixels(geoms[0])
+            return self._gather(rows, cols)
+
+        stats = np.full((len(geoms), self.n_bands), np.nan, dtype=np.float32)
+        counts = np.zeros(len(geoms), dtype=np.int64)
+        fn = SPECTRA_REDUCERS[reduce]
+        # Group polygons into batches of ~POLYGON_BATCH_PIXELS so one gather
+        # (sorted across the whole batch) serves many small parcels while
+        # peak memory stays bounded.
+        batch: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        pending = 0
+        for i, geom in enumerate(geoms + [None]):
+            if geom is not None:
+                rows, cols = self._polygon_pixels(geom)
+                if rows.size:
+                    batch.append((i, rows, cols))
+                    pending += rows.size
+                if pending < POLYGON_BATCH_PIXELS:
+                    continue
+            if not batch:
+                continue
+            spectra, valid = self._gather(
+                np.concatenate([r for _, r, _ in batch]),
+                np.concatenate([c for _, _, c in batch]),
+            )
+            splits = np.cumsum([r.size for _, r, _ in batch])[:-1]
+            for (j, _, _), spec, ok in zip(batch, np.split(spectra, splits),
+                                           np.split(valid, splits)):
+                counts[j] = ok.sum()
+                if counts[j]:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', RuntimeWarning)
+                        stats[j] = fn(spec[ok], axis=0)
+            batch, pending = [], 0
+        return stats, counts
+
+    def _gather(self, rows: np.ndarray, cols: np.ndarray
+                ) -> Tuple[np.ndarray, np.ndarray]:
+        """Read (N, bands) spectra at pixel coordinates, visiting them in
+        row-major order so the memmap is walked forward, SPECTRA_CHUNK
+        pixels per fancy-index read."""
+        n_rows, n_cols = self.shape
+        out = np.full((rows.size, self.n_bands), np.nan, dtype=np.float32)
+        inside = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+        sel = np.flatnonzero(inside)
+        order = sel[np.lexsort((cols[sel], rows[sel]))]
+
+        mm = self._memmap()
+        for i in range(0, order.size, SPECTRA_CHUNK):
+            idx = order[i:i + SPECTRA_CHUNK]
+            if mm is not None:
+                out[idx] = mm[rows[idx], cols[idx], :]
+            else:
+                for j in idx:
+                    out[j] = self._spy.read_pixel(int(rows[j]), int(cols[j]))
+        out[out < 0] = np.nan
+        valid = inside & np.isfinite(out).any(axis=1)
+        return out, valid
+
+    def _project_geometries(self, geometry) -> list:
+        """Normalize input to a list of shapely geometries in the cube CRS."""
+        import shapely
+        from shapely.geometry import shape as to_shape
+
+        if hasattr(geometry, 'to_crs'):          # GeoSeries / GeoDataFrame
+            if geometry.crs is not None and self._crs is not None:
+                geometry = geometry.to_crs(self._crs.to_wkt())
+                return list(geometry.geometry if hasattr(geometry, 'geometry')
+                            else geometry)
+            geometry = list(getattr(geometry, 'geometry', geometry))
+
+        single = hasattr(geometry, 'geom_type') or isinstance(geometry, dict)
+        geoms = [geometry] if single else list(geometry)
+        geoms = [g if hasattr(g, 'geom_type') else to_shape(g) for g in geoms]
+        if self._crs and not self._crs.is_geographic:
+            from pyproj import Transformer
+            tr = Transformer.from_crs("EPSG:4326", self._crs, always_xy=True)
+            geoms = [shapely.transform(g, tr.transform, interleaved=False)
+                     for g in geoms]
+        return geoms
+
+    def _polygon_pixels(self, geom) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cols) of pixels whose centres fall inside `geom` (cube CRS),
+        rasterized over just the geometry's bounding window."""
+        from rasterio.features import geometry_mask
+
+        if geom.is_empty:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        w, s, e, n = geom.bounds
+        inv = ~self._transform
+        corners = [inv * (x, y) for x, y in ((w, s), (w, n), (e, s), (e, n))]
+        n_rows, n_cols = self.shape
+        r0 = max(0, int(math.floor(min(r for _, r in corners))))
+        r1 = min(n_rows, int(math.ceil(max(r for _, r in corners))) + 1)
+        c0 = max(0, int(math.floor(min(c for c, _ in corners))))
+        c1 = min(n_cols, int(math.ceil(max(c for c, _ in corners))) + 1)
+        if r1 <= r0 or c1 <= c0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        win_tf = window_transform(Window(c0, r0, c1 - c0, r1 - r0),
+                                  self._transform)
+        mask = geometry_mask([geom], out_shape=(r1 - r0, c1 - c0),
+                             transform=win_tf, invert=True)
+        rows, cols = np.nonzero(mask)
+        return rows.astype(np.int64) + r0, cols.astype(np.int64) + c0
+
     # ── Burn scar ─────────────────────────────────────────────────────────────
 
     def burn_scar_analysis(self, post: "AVIRISAnalyzer",
-                           downsample: int = 4
+                           downsample: int = 4,
+                           bbox: Optional[List[float]] = None
                            ) -> Tuple[np.ndarray, np.ndarray, List[float]]:
         """
         dNBR = NBR_pre − NBR_post, classified with USGS thresholds.
         `self` is pre-fire, `post` is the post-fire analyzer.
+        bbox: optional WGS-84 window, resolved separately in each scene.
         Returns (dnbr, classified, bounds).
         """
-        nbr_pre  = self._compute_index('NBR', downsample)
-        nbr_post = post._compute_index('NBR', downsample)
+        win_pre  = self._render_window(bbox, downsample)
+        win_post = post._render_window(bbox, downsample)
+        nbr_pre  = self._compute_index('NBR', downsample, win_pre)
+        nbr_post = post._compute_index('NBR', downsample, win_post)
 
         r = min(nbr_pre.shape[0], nbr_post.shape[0])
         c = min(nbr_pre.shape[1], nbr_post.shape[1])
         dnbr = nbr_pre[:r, :c] - nbr_post[:r, :c]
 
-        return dnbr, self._classify_severity(dnbr), self._bounds
+        return dnbr, self._classify_severity(dnbr), self._window_bounds(win_pre)
 
     def render_burn_severity(self, classified: np.ndarray) -> np.ndarray:
         rgba = np.zeros((*classified.shape, 4), dtype=np.uint8)
@@ -303,9 +725,10 @@ class AVIRISAnalyzer:
 
     # ── Internal ──────────────────────────────────────────────────────────────
 
-    def _compute_index(self, name: str, downsample: int = 1) -> np.ndarray:
+    def _compute_index(self, name: str, downsample: int = 1,
+                       window: Optional[PixelWindow] = None) -> np.ndarray:
         def b(wl):
-            return self._read_band(wl, downsample)
+            return self._read_band(wl, downsample, window)
 
         if name in _ND_BANDS:
             wa, wb = _ND_BANDS[name]
@@ -327,9 +750,116 @@ class AVIRISAnalyzer:
         return out
 
 
-# ── Encoding helper (mirrors sentinel_analysis.rgba_to_base64) ────────────────
+def _area_mean(block: np.ndarray, factor: int) -> np.ndarray:
+    """NaN-aware mean over factor×factor cells of a (rows, cols, bands)
+    block; ragged edges are padded with NaN so they average what exists."""
+    r, c, b = block.shape
+    pr, pc = -(-r // factor) * factor, -(-c // factor) * factor
+    if (pr, pc) != (r, c):
+        padded = np.full((pr, pc, b), np.nan, dtype=block.dtype)
+        padded[:r, :c] = block
+        block = padded
+    cells = block.reshape(pr // factor, factor, pc // factor, factor, b)
+    return np.nanmean(cells, axis=(1, 3))
+
+
+# ── Colormap lookup tables (mirrors sentinel_analysis.index_to_rgba) ────────
+
+LUT_BINS = 1024   # index values in [-1, 1] are quantized to this many colours
 
-def rgba_to_base64(rgba: np.ndarray) -> str:
+
+@functools.lru_cache(maxsize=None)
+def colormap_lut(cmap_name: str) -> np.ndarray:
+    """(LUT_BINS, 4) uint8 RGBA table sampling a colormap over [-1, 1] —
+    the same mapping as TwoSlopeNorm(-1, 0, 1), computed once per cmap."""
+    cmap = plt.get_cmap(cmap_name)
+    lut = (cmap(np.linspace(0.0, 1.0, LUT_BINS)) * 255).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def index_to_rgba(arr: np.ndarray, cmap_name: str,
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Colour an index array through its LUT: quantize to LUT_BINS bins over
+    [-1, 1] (out-of-range values clamp to the ends, NaN → transparent) and
+    gather RGBA rows straight into `out` (allocated if None). Avoids the
+    float64 H×W×4 intermediate of cmap(norm(arr)).
+    """
+    lut = colormap_lut(cmap_name)
+    if out is None:
+        out = np.empty((*arr.shape, 4), dtype=np.uint8)
+    half = (LUT_BINS - 1) / 2.0
+    scaled = np.multiply(arr, half, dtype=np.float32)
+    np.add(scaled, half + 0.5, out=scaled)           # +0.5 → round on cast
+    nodata = np.isnan(scaled)
+    scaled[nodata] = half + 0.5                      # NaN draws as 0 (masked)
+    np.clip(scaled, 0, LUT_BINS - 1, out=scaled)
+    np.take(lut, scaled.astype(np.int16), axis=0, out=out)
+    out[..., 3][nodata] = 0
+    return out
+
+
+# ── Encoding helpers (mirror multispectral/encoding.py) ─────────────────────
+
+PNG_LEVEL = 1                  # zlib level; PIL's default 6 is ~4x slower
+WEBP_QUALITY = 80
+ENCODE_CACHE_BYTES = 64 * 1024 ** 2
+_ENCODE_MIME = {'png': 'image/png', 'webp': 'image/webp',
+                'webp_lossy': 'image/webp'}
+_encoded: "OrderedDict[bytes, bytes]" = OrderedDict()
+_encoded_bytes = 0
+_encode_lock = threading.Lock()
+
+
+def encode_rgba(rgba: np.ndarray, fmt: str = 'png',
+                level: Optional[int] = None,
+                quality: Optional[int] = None) -> bytes:
+    """Encode an (H, W, 4) uint8 layer as PNG (`level` = zlib level), lossless
+    WebP (`level` = method 0-6) or lossy WebP (`quality`). Results are kept
+    in a byte-bounded LRU keyed on a BLAKE2 hash of the pixels + params."""
+    global _encoded_bytes
+    if fmt not in _ENCODE_MIME:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of "
+                         f"{tuple(_ENCODE_MIME)}")
+    rgba = np.ascontiguousarray(rgba)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((rgba.shape, rgba.dtype.str, fmt, level, quality)).encode())
+    h.update(memoryview(rgba).cast('B'))
+    key = h.digest()
+    with _encode_lock:
+        if key in _encoded:
+            _encoded.move_to_end(key)
+            return _encoded[key]
+
+    img = Image.fromarray(rgba, 'RGBA')
     buf = io.BytesIO()
-    Image.fromarray(rgba, 'RGBA').save(buf, format='PNG')
-    return base64.b64encode(buf.getvalue()).decode()
+    if fmt == 'png':
+        img.save(buf, format='PNG',
+                 compress_level=PNG_LEVEL if level is None else level)
+    elif fmt == 'webp':
+        img.save(buf, format='WEBP', lossless=True,
+                 method=0 if level is None else level)
+    else:
+        img.save(buf, format='WEBP',
+                 quality=WEBP_QUALITY if quality is None else quality,
+                 method=4 if level is None else level)
+    data = buf.getvalue()
+
+    with _encode_lock:
+        if key not in _encoded and len(data) <= ENCODE_CACHE_BYTES:
+            _encoded[key] = data
+            _encoded_bytes += len(data)
+            while _encoded_bytes > ENCODE_CACHE_BYTES:
+                _, old = _encoded.popitem(last=False)
+                _encoded_bytes -= len(old)
+    return data
+
+
+def rgba_to_base64(rgba: np.ndarray, fmt: str = 'png', **kwargs) -> str:
+    return base64.b64encode(encode_rgba(rgba, fmt, **kwargs)).decode()
+
+
+def rgba_to_data_uri(rgba: np.ndarray, fmt: str = 'png', **kwargs) -> str:
+    """`data:` URI for folium ImageOverlay."""
+    return f"data:{_ENCODE_MIME[fmt]};base64,{rgba_to_base64(rgba, fmt, **kwargs)}"
@@ -0,0 +1,306 @@
+"""
+aviris_catalog.py
+-----------------
+Spatially indexed AVIRIS-NG flight-line catalog for hsi_app's Browse tab.
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+The JPL catalog is a ~10k-row public Google Sheet with each footprint given
+as four corner columns (Lon1..4 / Lat1..4). FlightLineCatalog parses it
+once, builds footprint polygons and a shapely STRtree over them, and answers
+"which flight lines intersect / contain / are nearest to this AOI or point"
+in microseconds. The parsed catalog is persisted as GeoParquet (WKB
+geometry) and re-fetched only when older than max_age_s, so app start-up
+reads one local columnar file instead of re-parsing the CSV.
+
+For the Browse map, view(bounds, zoom) returns only what the current
+viewport needs — simplified footprints when zoomed in, grid clusters when
+zoomed out — capped at VIEW_MAX_FEATURES so the page stays light however
+many flight lines match.
+
+Example
+-------
+>>> cat = FlightLineCatalog.load()                     # cached ≤ 24 h
+>>> cat.intersects([-121.0, 38.5, -120.5, 39.0])       # DataFrame of rows
+>>> cat.contains(-120.8, 38.9)                         # lines covering a point
+>>> cat.nearest(-120.8, 38.9, k=5)
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+from shapely.geometry import Point, box, mapping
+
+CATALOG_CSV = (
+    "https://docs.google.com/spreadsheets/d/"
+    "1g_yWgr4kwGPwVCDiFgCX3tZ9tAkxk-oDXxfqv5U4LeU/export?format=csv"
+)
+DEFAULT_CACHE_PATH = os.environ.get(
+    'AVIRIS_CATALOG_CACHE',
+    str(Path.home() / '.cache' / 'aviris_ng' / 'catalog.parquet'),
+)
+CATALOG_MAX_AGE_S = 24 * 3600
+
+NUMERIC_COLUMNS = ("Year", "Month", "Day", "Pixel Size", "File Size (GB)",
+                   "Lon1", "Lon2", "Lon3", "Lon4",
+                   "Lat1", "Lat2", "Lat3", "Lat4")
+CORNER_LONS = ["Lon1", "Lon2", "Lon3", "Lon4"]
+CORNER_LATS = ["Lat1", "Lat2", "Lat3", "Lat4"]
+
+# Viewport rendering (FlightLineCatalog.view): a map never gets more than
+# VIEW_MAX_FEATURES shapes; below CLUSTER_BELOW_ZOOM, or when more footprints
+# than that are in view, footprints are binned into ~CLUSTER_CELL_PX-pixel
+# grid cells and drawn as one counted marker per cell.
+VIEW_MAX_FEATURES = 500
+CLUSTER_BELOW_ZOOM = 8
+CLUSTER_CELL_PX = 64
+
+# An AOI is a shapely geometry, or a [west, south, east, north] bbox
+AOI = Union[shapely.Geometry, Sequence[float]]
+
+
+class FlightLineCatalog:
+    """
+    The flight-line table plus an STRtree over its footprints.
+
+    `df` is a GeoDataFrame (EPSG:4326) with the original catalog columns plus
+    `_date`, `_has_geom` and a footprint `geometry` (None when a corner is
+    missing). Query methods return row subsets of `df`, in catalog order.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        if not isinstance(df, gpd.GeoDataFrame):
+            df = gpd.GeoDataFrame(df, geometry=_footprints(df), crs="EPSG:4326")
+        self.df = df
+        valid = ~(df.geometry.isna() | df.geometry.is_empty).to_numpy()
+        self._tree_rows = np.flatnonzero(valid)
+        self._tree = STRtree(df.geometry.to_numpy()[valid])
+        centroids = shapely.centroid(self._tree.geometries)
+        self._cx = shapely.get_x(centroids)
+        self._cy = shapely.get_y(centroids)
+        self._simplified: Dict[int, np.ndarray] = {}   # zoom → geometries
+
+    # ── Construction / persistence ───────────────────────────────────────────
+
+    @classmethod
+    def from_csv(cls, source: str = CATALOG_CSV) -> "FlightLineCatalog":
+        """Parse the live catalog (URL or local CSV path)."""
+        return cls(_normalize(pd.read_csv(source, low_memory=False)))
+
+    @classmethod
+    def read_parquet(cls, path: str) -> "FlightLineCatalog":
+        return cls(gpd.read_parquet(path))
+
+    def to_parquet(self, path: str) -> None:
+        """Write as GeoParquet (WKB footprints), atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        self.df.to_parquet(tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, source: str = CATALOG_CSV,
+             cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+             max_age_s: float = CATALOG_MAX_AGE_S) -> "FlightLineCatalog":
+        """
+        Catalog from the Parquet cache if younger than max_age_s, else
+        re-fetched from `source` and re-cached. A failed refresh falls back
+        to a stale cache rather than failing outright.
+        """
+        if cache_path is None:
+            return cls.from_csv(source)
+        cache = Path(cache_path)
+        if cache.exists() and time.time() - cache.stat().st_mtime < max_age_s:
+            return cls.read_parquet(cache)
+        try:
+            catalog = cls.from_csv(source)
+        except Exception:
+            if cache.exists():
+                return cls.read_parquet(cache)
+            raise
+        catalog.to_parquet(cache)
+        return catalog
+
+    # ── Spatial queries ──────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def intersects(self, aoi: AOI) -> pd.DataFrame:
+        """Flight lines whose footprint intersects the AOI."""
+        return self._rows(self._tree.query(_geometry(aoi),
+                                           predicate='intersects'))
+
+    def contains(self, lon_or_aoi: Union[float, AOI],
+                 lat: Optional[float] = None) -> pd.DataFrame:
+        """Flight lines whose footprint fully contains a point (lon, lat)
+        or an AOI."""
+        geom = (Point(lon_or_aoi, lat) if lat is not None
+                else _geometry(lon_or_aoi))
+        return self._rows(self._tree.query(geom, predicate='within'))
+
+    def nearest(self, lon: float, lat: float, k: int = 1) -> pd.DataFrame:
+        """The k footprints closest to (lon, lat), nearest first, with a
+        `_distance_deg` column (planar degrees — fine for ranking)."""
+        pt = Point(lon, lat)
+        if k == 1:
+            idx, dist = self._tree.query_nearest(pt, return_distance=True,
+                                                 all_matches=False)
+        else:
+            geoms = self._tree.geometries
+            dist_all = shapely.distance(geoms, pt)
+            k = min(k, len(dist_all))
+            idx = np.argpartition(dist_all, k - 1)[:k]
+            idx = idx[np.argsort(dist_all[idx], kind='stable')]
+            dist = dist_all[idx]
+        out = self.df.iloc[self._tree_rows[idx]].copy()
+        out['_distance_deg'] = dist
+        return out
+
+    def query_rows(self, aoi: AOI, predicate: str = 'intersects') -> np.ndarray:
+        """Positional row indices into `df` — for combining with filters."""
+        return np.sort(self._tree_rows[self._tree.query(_geometry(aoi),
+                                                        predicate=predicate)])
+
+    # ── Viewport rendering ───────────────────────────────────────────────────
+
+    def view(self, bounds: Sequence[float], zoom: int,
+             rows: Optional[np.ndarray] = None,
+             max_features: int = VIEW_MAX_FEATURES) -> dict:
+        """
+        GeoJSON FeatureCollection of what a web map showing `bounds`
+        ([west, south, east, north]) at `zoom` should draw, restricted to
+        positional `rows` of `df` (e.g. the filtered subset) if given.
+
+        Only footprints intersecting the viewport are considered, and the
+        output never exceeds `max_features` features, so the payload stays
+        the same size however broad the filter is:
+
+        * mode 'footprints' — polygons pre-simplified to one screen pixel at
+          this zoom, properties Name / Site Name;
+        * mode 'clusters'  — one Point per grid cell at the cell's mean
+          centroid, property `count` (and `Name` when count == 1).
+
+        `mode` and `in_view` (matching footprints in the viewport) are
+        returned as foreign members of the collection.
+        """
+        zoom = int(max(0, min(zoom, 22)))
+        idx = self._tree.query(_geometry(bounds), predicate='intersects')
+        if rows is not None:
+            idx = idx[np.isin(self._tree_rows[idx], rows)]
+        idx = np.sort(idx)
+        in_view = len(idx)
+
+        if zoom < CLUSTER_BELOW_ZOOM or in_view > max_features:
+            features = self._clusters(idx, zoom, max_features)
+            mode = 'clusters'
+        else:
+            geoms = self._simplified_for(zoom)[idx]
+            names = self.df['Name'].to_numpy()[self._tree_rows[idx]]
+            sites = (self.df['Site Name'].to_numpy()[self._tree_rows[idx]]
+                     if 'Site Name' in self.df.columns else [None] * in_view)
+            features = [
+                {'type': 'Feature', 'geometry': mapping(g),
+                 'properties': {'Name': str(n), 'Site Name': _str_or_none(st)}}
+                for g, n, st in zip(geoms, names, sites)
+            ]
+            mode = 'footprints'
+        return {'type': 'FeatureCollection', 'features': features,
+                'mode': mode, 'in_view': in_view}
+
+    def _clusters(self, idx: np.ndarray, zoom: int,
+                  max_features: int) -> List[dict]:
+        """Grid-bin footprint centroids; coarsen the grid until the number
+        of occupied cells fits `max_features`."""
+        cell = 360.0 / (256 * 2 ** zoom) * CLUSTER_CELL_PX     # degrees
+        x, y = self._cx[idx], self._cy[idx]
+        while True:
+            gx = np.floor(x / cell).astype(np.int64)
+            gy = np.floor(y / cell).astype(np.int64)
+            cells, inverse, counts = np.unique(
+                np.stack([gx, gy], axis=1), axis=0,
+                return_inverse=True, return_counts=True)
+            if len(cells) <= max_features:
+                break
+            cell *= 2
+        inverse = inverse.ravel()
+        mx = np.bincount(inverse, weights=x) / counts
+        my = np.bincount(inverse, weights=y) / counts
+        names = self.df['Name'].to_numpy()[self._tree_rows[idx]]
+        first = np.full(len(cells), -1)
+        first[inverse[::-1]] = np.arange(len(idx))[::-1]
+        return [
+            {'type': 'Feature',
+             'geometry': {'type': 'Point', 'coordinates': [float(cx), float(cy)]},
+             'properties': {'count': int(n),
+                            'Name': str(names[f]) if n == 1 else None}}
+            for cx, cy, n, f in zip(mx, my, counts, first)
+        ]
+
+    def _simplified_for(self, zoom: int) -> np.ndarray:
+        """Footprints simplified to ~1 screen pixel at `zoom`, built once per
+        zoom level and reused."""
+        if zoom not in self._simplified:
+            tol = 360.0 / (256 * 2 ** zoom)
+            self._simplified[zoom] = shapely.simplify(
+                self._tree.geometries, tol, preserve_topology=True)
+        return self._simplified[zoom]
+
+    def _rows(self, tree_idx: np.ndarray) -> pd.DataFrame:
+        return self.df.iloc[np.sort(self._tree_rows[tree_idx])]
+
+
+# ── Parsing ───────────────────────────────────────────────────────────────────
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Typed columns, `_date` and `_has_geom`, Parquet-safe object columns."""
+    df.columns = [str(c).strip() for c in df.columns]
+    for c in NUMERIC_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+
+    df["_date"] = pd.to_datetime(
+        dict(year=df.get("Year"), month=df.get("Month"), day=df.get("Day")),
+        errors="coerce",
+    )
+    # Footprint validity = all four corners numeric
+    corner_cols = CORNER_LONS + CORNER_LATS
+    df["_has_geom"] = df[corner_cols].notna().all(axis=1) if all(
+        c in df.columns for c in corner_cols) else False
+
+    # Sheet columns mix numbers and text; Parquet needs one type per column
+    for c in df.columns[df.dtypes == object]:
+        df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return df
+
+
+def _footprints(df: pd.DataFrame) -> np.ndarray:
+    """Closed corner-ring polygons, vectorized; None where _has_geom is False."""
+    geoms = np.full(len(df), None, dtype=object)
+    ok = df["_has_geom"].to_numpy(dtype=bool)
+    if ok.any():
+        lons = df.loc[ok, CORNER_LONS].to_numpy(dtype=float)
+        lats = df.loc[ok, CORNER_LATS].to_numpy(dtype=float)
+        ring = np.stack([lons, lats], axis=-1)                 # (n, 4, 2)
+        ring = np.concatenate([ring, ring[:, :1]], axis=1)     # close it
+        geoms[ok] = shapely.polygons(ring)
+    return geoms
+
+
+def _str_or_none(v) -> Optional[str]:
+    return None if v is None or (isinstance(v, float) and np.isnan(v)) else str(v)
+
+
+def _geometry(aoi: AOI) -> shapely.Geometry:
+    if isinstance(aoi, shapely.Geometry):
+        return aoi
+    west, south, east, north = aoi
+    return box(west, south, east, north)
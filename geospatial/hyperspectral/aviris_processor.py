@@ -6,21 +6,27 @@ California DWR i15 land-use shapefiles that are commonly paired with it.
 
 Classes
 -------
-AVIRISProcessor      – Batch-download KML flight lines and convert to shapefiles
+AVIRISProcessor      – Batch-download KML flight lines and convert to vector files
 ShapefileProcessor   – Label i15 crop shapefiles with human-readable DWR crop codes
-ShapefileSplitter    – Split a labeled shapefile into one file per crop subclass
+ShapefileSplitter    – Split a labeled shapefile into one output per crop subclass
 ShapefileToMap       – Render any shapefile as an interactive Folium map
 """
 
-import subprocess
-from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
+from urllib.parse import quote, urlparse
 
 import folium
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ---------------------------------------------------------------------------
 # California DWR i15 crop code → description mapping
@@ -96,13 +102,30 @@ DWR_CROP_CODES: dict = {
     'Z':  {'description': 'Outside study area', 'subclasses': {}},
 }
 
+# DWR_CROP_CODES flattened once for vectorized labeling (ShapefileProcessor.label)
+DWR_CLASS_LABELS: dict = {code: info['description']
+                          for code, info in DWR_CROP_CODES.items()}
+DWR_LABEL_TABLE = pd.DataFrame(
+    [(code, sub, desc)
+     for code, info in DWR_CROP_CODES.items()
+     for sub, desc in info['subclasses'].items()],
+    columns=['CLASS_CODE', 'SUBCLASS_CODE', 'SUBCLASS_DESCRIPTION'],
+)
+
+
+# Downloader defaults (AVIRISProcessor.download_links)
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_BACKOFF_S = 0.5          # sleeps 0.5, 1, 2, 4 … s between retries
+DOWNLOAD_CHUNK_BYTES = 1 << 16
+
 
 # ---------------------------------------------------------------------------
 
 class AVIRISProcessor:
     """
     Batch-download AVIRIS-NG KML flight line outlines from the NASA/JPL data
-    portal and convert them to ESRI Shapefiles via GDAL.
+    portal and convert them to ESRI Shapefiles (or one consolidated
+    GeoPackage / GeoParquet) in-process via pyogrio.
 
     Parameters
     ----------
@@ -125,43 +148,262 @@ class AVIRISProcessor:
         self.shapefile_dir = Path(shapefile_dir)
         self.flight_lines  = pd.read_excel(excel_file)
 
-    def download_kml_files(self, workers: int = 5) -> None:
-        """Parallel KML download. Skips rows with missing links."""
-        self.kml_dir.mkdir(parents=True, exist_ok=True)
-
-        def _download(row) -> None:
-            kml_link = row.link_kml_outline
-            if pd.isna(kml_link):
-                print(f"Skipping {row.Name} — missing KML link")
-                return
-            out_path = self.kml_dir / f"{row.Name}.kml"
-            try:
-                resp = requests.get(kml_link, timeout=30)
-                resp.raise_for_status()
-                out_path.write_bytes(resp.content)
-                print(f"Downloaded: {out_path.name}")
-            except requests.exceptions.RequestException as e:
-                print(f"Failed {row.Name}: {e}")
-
-        with ThreadPoolExecutor(max_workers=workers) as pool:
-            pool.map(_download, self.flight_lines.itertuples(index=False))
-
-    def convert_to_shapefiles(self) -> None:
-        """Convert all KMLs in kml_dir to ESRI Shapefiles using ogr2ogr."""
+    def download_kml_files(self, workers: int = 5, **kwargs) -> Dict[str, dict]:
+        """Download every flight line's KML outline into kml_dir.
+        See download_links for options and the returned manifest."""
+        return self.download_links('link_kml_outline', self.kml_dir,
+                                   suffix='.kml', workers=workers, **kwargs)
+
+    def download_links(self, column: str, out_dir: str,
+                       suffix: Optional[str] = None, workers: int = 5,
+                       per_host: int = 4, retries: int = DOWNLOAD_RETRIES,
+                       backoff: float = DOWNLOAD_BACKOFF_S,
+                       timeout: float = 30) -> Dict[str, dict]:
+        """
+        Download one link column of the catalog (link_kml_outline, link_rgb,
+        link_rgb_small …) to `<out_dir>/<Name><suffix>`.
+
+        All requests share one pooled Session: at most `per_host` open
+        connections per host, and 429/5xx responses and connection errors
+        are retried `retries` times with exponential `backoff` (honouring
+        Retry-After). Files already on disk are re-requested conditionally
+        (If-None-Match / If-Modified-Since from the last run), so a re-run
+        only transfers changed files. Bodies stream to a temp file that is
+        renamed into place, so a killed run never leaves a truncated file.
+
+        `suffix` defaults to the URL's extension. Returns — and writes to
+        `<out_dir>/_manifest.json` — {Name: {url, status, path, bytes,
+        etag, last_modified, error}} with status one of 'downloaded',
+        'not_modified', 'missing_link' or 'failed'.
+        """
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = out_dir / '_manifest.json'
+        previous = {}
+        if manifest_path.exists():
+            previous = json.loads(manifest_path.read_text())
+
+        session = _download_session(workers, per_host, retries, backoff)
+        rows = self.flight_lines[['Name', column]].itertuples(
+            index=False, name=None)
+        manifest: Dict[str, dict] = {}
+        with session, ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for name, url in rows:
+                if pd.isna(url):
+                    manifest[name] = {'url': None, 'status': 'missing_link'}
+                    continue
+                ext = suffix if suffix is not None else Path(urlparse(url).path).suffix
+                futures[pool.submit(
+                    _fetch, session, url, out_dir / f"{name}{ext}",
+                    previous.get(name, {}), timeout,
+                )] = name
+            for fut in as_completed(futures):
+                name = futures[fut]
+                manifest[name] = fut.result()
+                if manifest[name]['status'] == 'failed':
+                    print(f"Failed {name}: {manifest[name]['error']}")
+
+        tmp = manifest_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        os.replace(tmp, manifest_path)
+
+        counts = pd.Series([m['status'] for m in manifest.values()],
+                           dtype=object).value_counts()
+        print(f"{column}: " + ", ".join(f"{n} {k}" for k, n in counts.items()))
+        return manifest
+
+    def convert_to_shapefiles(self, workers: Optional[int] = None,
+                              consolidated: Optional[str] = None,
+                              force: bool = False) -> Dict[str, int]:
+        """
+        Convert every KML in kml_dir in-process (pyogrio), across a process
+        pool of `workers` (default: all cores).
+
+        By default writes one `<name>.shp` per KML. With
+        `consolidated="flight_lines.gpkg"` (or `.parquet`) all flight lines
+        go into that single file — relative paths land in shapefile_dir —
+        with the flight line in a Name column.
+
+        Outputs newer than their KML are skipped unless `force`; in
+        consolidated mode only new/changed KMLs are re-read and merged into
+        the existing file. Returns {'converted', 'skipped', 'failed'}.
+        """
         self.shapefile_dir.mkdir(parents=True, exist_ok=True)
-        kml_files = list(self.kml_dir.glob("*.kml"))
-        print(f"Converting {len(kml_files)} KML files...")
-
-        for kml_file in kml_files:
-            out_path = self.shapefile_dir / f"{kml_file.stem}.shp"
-            try:
-                subprocess.run(
-                    ["ogr2ogr", "-f", "ESRI Shapefile", str(out_path), str(kml_file)],
-                    check=True,
-                )
-                print(f"Saved: {out_path.name}")
-            except subprocess.CalledProcessError as e:
-                print(f"Failed to convert {kml_file.name}: {e}")
+        kml_files = sorted(self.kml_dir.glob("*.kml"))
+        out_file = None
+        if consolidated:
+            out_file = Path(consolidated)
+            if not out_file.is_absolute():
+                out_file = self.shapefile_dir / out_file
+            if out_file.suffix not in ('.gpkg', '.parquet'):
+                raise ValueError("consolidated output must be .gpkg or .parquet")
+            stale = set(_stale(kml_files, lambda k: out_file, force))
+            # Also retry lines missing from the file (e.g. failed last run)
+            done = _consolidated_names(out_file) if out_file.exists() else set()
+            todo = [k for k in kml_files if k in stale or k.stem not in done]
+        else:
+            todo = _stale(kml_files,
+                          lambda k: self.shapefile_dir / f"{k.stem}.shp", force)
+        skipped = len(kml_files) - len(todo)
+        print(f"Converting {len(todo)} KML files "
+              f"({skipped} up to date)...")
+
+        t0 = time.perf_counter()
+        frames, failed = [], 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            if out_file is None:
+                futures = {pool.submit(_kml_to_shapefile, k,
+                                       self.shapefile_dir / f"{k.stem}.shp"): k
+                           for k in todo}
+            else:
+                futures = {pool.submit(_read_kml, k): k for k in todo}
+            for fut in as_completed(futures):
+                kml_file = futures[fut]
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Failed to convert {kml_file.name}: {e}")
+                    continue
+                if out_file is not None:
+                    frames.append(result)
+
+        if out_file is not None and frames:
+            _write_consolidated(out_file, frames)
+            print(f"Saved: {out_file.name}  ({len(frames)} flight lines)")
+
+        elapsed = time.perf_counter() - t0
+        converted = len(todo) - failed
+        rate = converted / elapsed if elapsed > 0 else 0.0
+        print(f"Converted {converted} files in {elapsed:.1f}s "
+              f"({rate:.1f} files/s), {skipped} skipped, {failed} failed")
+        return {'converted': converted, 'skipped': skipped, 'failed': failed}
+
+
+# Download helpers shared by every AVIRISProcessor.download_links call.
+
+def _download_session(workers: int, per_host: int, retries: int,
+                      backoff: float) -> requests.Session:
+    """Pooled Session: `per_host` keep-alive connections per host (callers
+    block for a free one rather than opening more), retries with
+    exponential backoff on connection errors and 429/5xx."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=max(1, workers),
+                          pool_maxsize=per_host, pool_block=True,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _fetch(session: requests.Session, url: str, out_path: Path,
+           previous: dict, timeout: float) -> dict:
+    """GET one file conditionally and write it atomically. Never raises —
+    failures are reported in the returned manifest entry."""
+    entry = {'url': url, 'path': str(out_path)}
+    headers = {}
+    if out_path.exists() and previous.get('url') == url:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+
+    tmp = out_path.with_name(f".{out_path.name}.part")
+    try:
+        with session.get(url, headers=headers, timeout=timeout,
+                         stream=True) as resp:
+            if resp.status_code == 304:
+                return {**previous, **entry, 'status': 'not_modified',
+                        'bytes': out_path.stat().st_size, 'error': None}
+            resp.raise_for_status()
+            nbytes = 0
+            with open(tmp, 'wb') as f:
+                for chunk in resp.iter_content(DOWNLOAD_CHUNK_BYTES):
+                    f.write(chunk)
+                    nbytes += len(chunk)
+            os.replace(tmp, out_path)
+            return {**entry, 'status': 'downloaded', 'bytes': nbytes,
+                    'etag': resp.headers.get('ETag'),
+                    'last_modified': resp.headers.get('Last-Modified'),
+                    'error': None}
+    except (requests.exceptions.RequestException, OSError) as e:
+        tmp.unlink(missing_ok=True)
+        return {**entry, 'status': 'failed', 'bytes': 0, 'error': str(e)}
+
+
+# KML → vector helpers. Module-level so ProcessPoolExecutor can pickle them.
+
+def _stale(kml_files: List[Path], out_for, force: bool) -> List[Path]:
+    """KMLs whose output is missing or older than the KML itself."""
+    if force:
+        return list(kml_files)
+    todo = []
+    for kml_file in kml_files:
+        out_path = out_for(kml_file)
+        if (not out_path.exists()
+                or out_path.stat().st_mtime < kml_file.stat().st_mtime):
+            todo.append(kml_file)
+    return todo
+
+
+def _consolidated_names(out_file: Path) -> set:
+    if out_file.suffix == '.parquet':
+        return set(pd.read_parquet(out_file, columns=['Name'])['Name'])
+    return set(gpd.read_file(out_file, columns=['Name'],
+                             ignore_geometry=True)['Name'])
+
+
+def _read_kml(kml_path: Path) -> gpd.GeoDataFrame:
+    """All layers of one KML as a single frame, Name = flight line (file
+    stem); the placemark's own name is kept as Placemark."""
+    import pyogrio
+
+    layers = [
+        pyogrio.read_dataframe(kml_path, layer=name)
+        for name, _ in pyogrio.list_layers(kml_path)
+    ]
+    gdf = gpd.GeoDataFrame(pd.concat(layers, ignore_index=True),
+                           crs=layers[0].crs)
+    if 'Name' in gdf.columns:
+        gdf = gdf.rename(columns={'Name': 'Placemark'})
+    gdf.insert(0, 'Name', kml_path.stem)
+    return gdf
+
+
+def _kml_to_shapefile(kml_path: Path, out_path: Path) -> int:
+    gdf = _read_kml(kml_path).drop(columns=['Name'])
+    gdf = gdf.rename(columns={'Placemark': 'Name'})
+    gdf.to_file(out_path, driver='ESRI Shapefile')
+    return len(gdf)
+
+
+def _write_consolidated(out_file: Path, frames: List[gpd.GeoDataFrame]) -> None:
+    """Merge freshly read flight lines into `out_file`, replacing any
+    existing rows for the same Name, and swap the result in atomically."""
+    new = pd.concat(frames, ignore_index=True)
+    if out_file.exists():
+        old = (gpd.read_parquet(out_file) if out_file.suffix == '.parquet'
+               else gpd.read_file(out_file))
+        old = old[~old['Name'].isin(new['Name'])]
+        new = pd.concat([old, new.to_crs(old.crs)], ignore_index=True)
+    new = gpd.GeoDataFrame(new, geometry='geometry', crs=frames[0].crs)
+
+    tmp = out_file.with_name(f".{out_file.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    if out_file.suffix == '.parquet':
+        new.to_parquet(tmp)
+    else:
+        new.to_file(tmp, driver='GPKG', layer='flight_lines')
+    os.replace(tmp, out_file)
 
 
 # ---------------------------------------------------------------------------
@@ -186,23 +428,46 @@ class ShapefileProcessor:
         self.output_path    = Path(output_path)
         self.gdf            = gpd.read_file(self.shapefile_path)
 
-    def _describe(self, class_code: str, subclass_code: Optional[str]):
-        info       = DWR_CROP_CODES.get(str(class_code).strip(), {})
-        class_desc = info.get('description', 'Unknown')
-        sub_desc   = info.get('subclasses', {}).get(str(subclass_code).strip(), 'Unknown')
-        return class_desc, sub_desc
+    @staticmethod
+    def label(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Return a copy of `df` with CLASS_CODE, SUBCLASS_CODE,
+        CLASS_DESCRIPTION and SUBCLASS_DESCRIPTION appended (all categorical).
+
+        MAIN_CROP has only a few hundred distinct values even statewide, so
+        codes are parsed and looked up once per distinct value (a merge
+        against DWR_LABEL_TABLE) and broadcast back to every parcel through
+        categorical codes — no per-row Python.
+        """
+        codes, crops = pd.factorize(df['MAIN_CROP'])
+        crops = pd.Series(crops, dtype=object).astype(str)
+        uniq = pd.DataFrame({
+            'CLASS_CODE':    crops.str.extract(r'([A-Za-z]+)', expand=False),
+            'SUBCLASS_CODE': crops.str.extract(r'(\d+)', expand=False),
+        })
+        uniq = uniq.merge(
+            DWR_LABEL_TABLE, how='left', on=['CLASS_CODE', 'SUBCLASS_CODE'],
+        )
+        uniq['CLASS_DESCRIPTION'] = uniq['CLASS_CODE'].map(DWR_CLASS_LABELS)
+        # Missing MAIN_CROP (code -1) labels as Unknown, like an unmatched code
+        uniq.loc[len(uniq)] = [None, None, 'Unknown', 'Unknown']
+        codes = np.where(codes < 0, len(uniq) - 1, codes)
+
+        out = df.copy()
+        for col in ('CLASS_CODE', 'SUBCLASS_CODE',
+                    'CLASS_DESCRIPTION', 'SUBCLASS_DESCRIPTION'):
+            values = uniq[col]
+            if col.endswith('DESCRIPTION'):
+                values = values.fillna('Unknown')
+            cat = values.astype('category')
+            out[col] = pd.Categorical.from_codes(
+                cat.cat.codes.to_numpy()[codes], cat.cat.categories,
+            )
+        return out
 
     def process(self) -> gpd.GeoDataFrame:
         """Filter, label, and save. Returns the labeled GeoDataFrame."""
-        df = self.gdf[self.gdf['MULTIUSE'] == 'S'].copy()
-        df['CLASS_CODE']    = df['MAIN_CROP'].str.extract(r'([A-Za-z]+)')
-        df['SUBCLASS_CODE'] = df['MAIN_CROP'].str.extract(r'(\d+)')
-
-        labels = df.apply(
-            lambda r: self._describe(r['CLASS_CODE'], r['SUBCLASS_CODE']), axis=1
-        )
-        df['CLASS_DESCRIPTION']    = [lbl[0] for lbl in labels]
-        df['SUBCLASS_DESCRIPTION'] = [lbl[1] for lbl in labels]
+        df = self.label(self.gdf[self.gdf['MULTIUSE'] == 'S'])
 
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
         df.to_file(self.output_path, driver='ESRI Shapefile')
@@ -214,28 +479,94 @@ class ShapefileProcessor:
 
 class ShapefileSplitter:
     """
-    Split a labeled i15 shapefile into one shapefile per crop subclass.
+    Split a labeled i15 shapefile into one output per crop subclass.
 
     Expects a SUBCLASS_D column produced by ShapefileProcessor.
 
+    Output formats
+    --------------
+    'shp'     – one `<subclass>.shp` per subclass (written in parallel)
+    'gpkg'    – one `split.gpkg` with a layer per subclass (written serially:
+                a GeoPackage is a single SQLite file)
+    'parquet' – a hive-partitioned GeoParquet dataset,
+                `SUBCLASS_D=<subclass>/part-0.parquet` (written in parallel)
+
     Example
     -------
     >>> ss = ShapefileSplitter("i15_labeled.shp", "split/")
-    >>> ss.split()
+    >>> manifest = ss.split(fmt='parquet', workers=8)
+    >>> manifest[['subclass', 'features', 'bytes']]
     """
 
-    def __init__(self, shapefile_path: str, output_dir: str):
+    FORMATS = ('shp', 'gpkg', 'parquet')
+
+    def __init__(self, shapefile_path: str, output_dir: str,
+                 column: str = 'SUBCLASS_D'):
         self.gdf        = gpd.read_file(shapefile_path)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-
-    def split(self) -> None:
-        """Write one shapefile per unique SUBCLASS_D value."""
-        for subclass in self.gdf['SUBCLASS_D'].unique():
-            subset   = self.gdf[self.gdf['SUBCLASS_D'] == subclass]
-            out_name = f"{str(subclass).replace(' ', '_')}.shp"
-            subset.to_file(self.output_dir / out_name)
-            print(f"Saved: {out_name}  ({len(subset)} features)")
+        self.column     = column
+
+    def split(self, fmt: str = 'shp', workers: int = 4) -> pd.DataFrame:
+        """
+        Write one output per unique subclass in a single groupby pass.
+
+        Returns a manifest DataFrame with one row per subclass:
+        subclass, path, layer (gpkg only), features, bytes.
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"fmt must be one of {self.FORMATS}, got {fmt!r}")
+        groups = self.gdf.groupby(self.column, sort=True, dropna=False,
+                                  observed=True)
+
+        if fmt == 'gpkg':
+            path = self.output_dir / 'split.gpkg'
+            path.unlink(missing_ok=True)
+            rows = [self._write_gpkg_layer(path, key, subset)
+                    for key, subset in groups]
+        else:
+            writer = self._write_shp if fmt == 'shp' else self._write_parquet
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(writer, key, subset)
+                           for key, subset in groups]
+                rows = [f.result() for f in futures]
+
+        manifest = pd.DataFrame(
+            rows, columns=['subclass', 'path', 'layer', 'features', 'bytes'])
+        print(f"Split {int(manifest['features'].sum())} features into "
+              f"{len(manifest)} {fmt} outputs "
+              f"({manifest['bytes'].sum() / 1e6:.1f} MB)")
+        return manifest
+
+    @staticmethod
+    def _safe_name(subclass) -> str:
+        return str(subclass).replace(' ', '_').replace('/', '_')
+
+    def _write_shp(self, subclass, subset: gpd.GeoDataFrame) -> tuple:
+        out_path = self.output_dir / f"{self._safe_name(subclass)}.shp"
+        subset.to_file(out_path)
+        nbytes = sum(p.stat().st_size
+                     for p in out_path.parent.glob(f"{out_path.stem}.*"))
+        print(f"Saved: {out_path.name}  ({len(subset)} features)")
+        return subclass, str(out_path), None, len(subset), nbytes
+
+    def _write_parquet(self, subclass, subset: gpd.GeoDataFrame) -> tuple:
+        part_dir = self.output_dir / f"{self.column}={quote(str(subclass), safe='')}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        out_path = part_dir / 'part-0.parquet'
+        # The partition value lives in the directory name, hive-style
+        subset.drop(columns=[self.column]).to_parquet(out_path)
+        print(f"Saved: {part_dir.name}  ({len(subset)} features)")
+        return subclass, str(out_path), None, len(subset), out_path.stat().st_size
+
+    def _write_gpkg_layer(self, path: Path, subclass,
+                          subset: gpd.GeoDataFrame) -> tuple:
+        layer  = self._safe_name(subclass)
+        before = path.stat().st_size if path.exists() else 0
+        subset.to_file(path, layer=layer, driver='GPKG')
+        print(f"Saved: {path.name}:{layer}  ({len(subset)} features)")
+        return (subclass, str(path), layer, len(subset),
+                path.stat().st_size - before)
 
 
 # ---------------------------------------------------------------------------
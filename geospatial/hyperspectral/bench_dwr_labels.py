@@ -0,0 +1,84 @@
+"""Benchmark: vectorized DWR crop labeling vs the per-row apply.
+
+    python bench_dwr_labels.py [n_parcels]
+
+Builds a synthetic i15-like GeoDataFrame (default 1,000,000 parcels, point
+geometries, MAIN_CROP drawn from every DWR code plus a few unknown / missing
+values), labels it with ShapefileProcessor.label and with the old
+df.apply(_describe, axis=1) path, checks both agree and reports the times.
+"""
+import sys
+import time
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from aviris_processor import DWR_CROP_CODES, ShapefileProcessor
+
+
+def synthetic_parcels(n: int, seed: int = 0) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    crops = [c + s for c, info in DWR_CROP_CODES.items()
+             for s in (info['subclasses'] or {'': ''})]
+    crops += ['D99', 'Q1', '**']                         # unknown codes
+    main = rng.choice(np.array(crops, dtype=object), n)
+    main[rng.random(n) < 0.01] = None                    # missing MAIN_CROP
+    return gpd.GeoDataFrame(
+        {'MAIN_CROP': main, 'MULTIUSE': 'S'},
+        geometry=gpd.points_from_xy(rng.uniform(-124, -114, n),
+                                    rng.uniform(32, 42, n)),
+        crs='EPSG:4326',
+    )
+
+
+def label_apply(df: pd.DataFrame) -> pd.DataFrame:
+    """The pre-vectorization implementation, verbatim."""
+    def describe(class_code, subclass_code):
+        info       = DWR_CROP_CODES.get(str(class_code).strip(), {})
+        class_desc = info.get('description', 'Unknown')
+        sub_desc   = info.get('subclasses', {}).get(str(subclass_code).strip(), 'Unknown')
+        return class_desc, sub_desc
+
+    df = df.copy()
+    df['CLASS_CODE']    = df['MAIN_CROP'].str.extract(r'([A-Za-z]+)')
+    df['SUBCLASS_CODE'] = df['MAIN_CROP'].str.extract(r'(\d+)')
+    labels = df.apply(
+        lambda r: describe(r['CLASS_CODE'], r['SUBCLASS_CODE']), axis=1
+    )
+    df['CLASS_DESCRIPTION']    = [lbl[0] for lbl in labels]
+    df['SUBCLASS_DESCRIPTION'] = [lbl[1] for lbl in labels]
+    return df
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    gdf = synthetic_parcels(n)
+    print(f"{n:,} parcels, {gdf['MAIN_CROP'].nunique()} distinct MAIN_CROP\n")
+
+    t0 = time.perf_counter()
+    fast = ShapefileProcessor.label(gdf)
+    t_fast = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    slow = label_apply(gdf)
+    t_slow = time.perf_counter() - t0
+
+    for col in ('CLASS_DESCRIPTION', 'SUBCLASS_DESCRIPTION'):
+        assert (fast[col].astype(str).to_numpy()
+                == slow[col].astype(str).to_numpy()).all(), col
+    mem_fast = fast[['CLASS_DESCRIPTION', 'SUBCLASS_DESCRIPTION']].memory_usage(
+        deep=True).sum()
+    mem_slow = slow[['CLASS_DESCRIPTION', 'SUBCLASS_DESCRIPTION']].memory_usage(
+        deep=True).sum()
+
+    print(f"{'path':<12} {'time':>9} {'label mem':>11}")
+    print(f"{'apply':<12} {t_slow:>8.2f}s {mem_slow / 1e6:>9.1f}MB")
+    print(f"{'vectorized':<12} {t_fast:>8.2f}s {mem_fast / 1e6:>9.1f}MB")
+    print(f"\nspeedup {t_slow / t_fast:.0f}x, labels identical")
+
+
+if __name__ == '__main__':
+    main()
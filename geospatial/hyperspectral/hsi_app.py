@@ -18,24 +18,24 @@ Supports both AVIRIS-NG reflectance (`*corr*`) and radiance (`*rdn*`) cubes;
 the analyzer auto-detects which and the UI adjusts labels / caveats.
 """
 
+from typing import List, Optional, Tuple
+
 import folium
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import streamlit as st
+from shapely.geometry import Point
 from streamlit_folium import st_folium
 
 from aviris_analyzer import (
     INDEX_COLORMAPS,
     SEVERITY_CLASSES,
     AVIRISAnalyzer,
-    rgba_to_base64,
+    rgba_to_data_uri,
 )
+from aviris_catalog import CATALOG_CSV, FlightLineCatalog
 
-CATALOG_CSV = (
-    "https://docs.google.com/spreadsheets/d/"
-    "1g_yWgr4kwGPwVCDiFgCX3tZ9tAkxk-oDXxfqv5U4LeU/export?format=csv"
-)
 DATA_PORTAL = "https://avirisng.jpl.nasa.gov/dataportal/"
 
 st.set_page_config(page_title="AVIRIS-NG Hyperspectral", layout="wide")
@@ -53,27 +53,24 @@ def get_analyzer(img_path: str) -> AVIRISAnalyzer:
     return AVIRISAnalyzer(img_path).load()
 
 
-@st.cache_data(ttl=86_400, show_spinner="Loading AVIRIS-NG catalog…")
-def load_catalog() -> pd.DataFrame:
-    """Live JPL flight-line catalog (public Google Sheet, no auth)."""
-    df = pd.read_csv(CATALOG_CSV, low_memory=False)
-    df.columns = [c.strip() for c in df.columns]
+@st.cache_resource(ttl=86_400, show_spinner="Loading AVIRIS-NG catalog…")
+def get_catalog() -> FlightLineCatalog:
+    """Live JPL flight-line catalog (public Google Sheet, no auth), spatially
+    indexed. Read from the local GeoParquet copy unless it's over 24 h old."""
+    return FlightLineCatalog.load(CATALOG_CSV)
 
-    for c in ("Year", "Month", "Day", "Pixel Size", "File Size (GB)",
-              "Lon1", "Lon2", "Lon3", "Lon4", "Lat1", "Lat2", "Lat3", "Lat4"):
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
 
-    df["_date"] = pd.to_datetime(
-        dict(year=df.get("Year"), month=df.get("Month"), day=df.get("Day")),
-        errors="coerce",
-    )
-    # Footprint validity = all four corners numeric
-    corner_cols = ["Lon1", "Lon2", "Lon3", "Lon4",
-                   "Lat1", "Lat2", "Lat3", "Lat4"]
-    df["_has_geom"] = df[corner_cols].notna().all(axis=1) if all(
-        c in df.columns for c in corner_cols) else False
-    return df
+def _parse_aoi(text: str) -> Optional[Tuple[str, List[float]]]:
+    """'lat, lon' → ('point', [lon, lat]); 'w, s, e, n' → ('bbox', [...])."""
+    try:
+        vals = [float(v) for v in text.replace(";", ",").split(",") if v.strip()]
+    except ValueError:
+        return None
+    if len(vals) == 2:
+        return 'point', [vals[1], vals[0]]
+    if len(vals) == 4:
+        return 'bbox', vals
+    return None
 
 
 def _footprint(row) -> list:
@@ -87,8 +84,67 @@ def _footprint(row) -> list:
     ]
 
 
+def _fit_view(geom: pd.DataFrame, width_px: int = 700) -> dict:
+    """Map view framing every footprint in `geom`."""
+    w = float(geom[["Lon1", "Lon2", "Lon3", "Lon4"]].min().min())
+    e = float(geom[["Lon1", "Lon2", "Lon3", "Lon4"]].max().max())
+    s = float(geom[["Lat1", "Lat2", "Lat3", "Lat4"]].min().min())
+    n = float(geom[["Lat1", "Lat2", "Lat3", "Lat4"]].max().max())
+    span = max(e - w, (n - s) * 1.5, 1e-3)
+    zoom = int(np.clip(np.floor(np.log2(width_px / 256 * 360 / span)), 2, 14))
+    return {'bounds': [w, s, e, n], 'center': [(s + n) / 2, (w + e) / 2],
+            'zoom': zoom}
+
+
+def _view_from_map(map_data: Optional[dict]) -> Optional[dict]:
+    """The viewport st_folium reports back, in _fit_view's shape."""
+    try:
+        sw = map_data['bounds']['_southWest']
+        ne = map_data['bounds']['_northEast']
+        bounds = [float(sw['lng']), float(sw['lat']),
+                  float(ne['lng']), float(ne['lat'])]
+        center = [float(map_data['center']['lat']),
+                  float(map_data['center']['lng'])]
+        return {'bounds': bounds, 'center': center,
+                'zoom': int(map_data['zoom'])}
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+def _view_changed(a: dict, b: dict) -> bool:
+    tol = 360.0 / (256 * 2 ** a['zoom']) * 8         # ~8 screen pixels
+    return a['zoom'] != b['zoom'] or any(
+        abs(x - y) > tol for x, y in zip(a['bounds'], b['bounds']))
+
+
+def _footprint_layer(fc: dict) -> folium.FeatureGroup:
+    """Folium layer for a FlightLineCatalog.view() collection."""
+    layer = folium.FeatureGroup(name="Flight lines")
+    features = fc['features']
+    if fc['mode'] == 'footprints':
+        if features:
+            folium.GeoJson(
+                {'type': 'FeatureCollection', 'features': features},
+                style_function=lambda _: {'color': '#38bdf8', 'weight': 1,
+                                          'fillOpacity': 0.08},
+                tooltip=folium.GeoJsonTooltip(['Name', 'Site Name']),
+            ).add_to(layer)
+        return layer
+    for f in features:
+        lon, lat = f['geometry']['coordinates']
+        n = f['properties']['count']
+        folium.CircleMarker(
+            [lat, lon], radius=4 + 4 * np.log10(n),
+            color='#38bdf8', weight=1, fill=True, fill_opacity=0.5,
+            tooltip=f['properties']['Name'] or f"{n} flight lines",
+        ).add_to(layer)
+    return layer
+
+
 for key, default in [
     ('hsi_click', None),
+    ('cat_view', None),
+    ('cat_filter_sig', None),
     ('hsi_path_loaded', None),
     ('wf_result', None),
 ]:
@@ -102,7 +158,8 @@ tab_browse, tab_spectral, tab_wildfire = st.tabs(
 # ── Tab 1: Browse Catalog ─────────────────────────────────────────────────────
 with tab_browse:
     try:
-        cat = load_catalog()
+        catalog = get_catalog()
+        cat = catalog.df
     except Exception as e:
         st.error(f"Could not load the JPL catalog: {e}")
         cat = None
@@ -126,6 +183,12 @@ with tab_browse:
 
             kw = st.text_input("Comment keyword", placeholder="e.g. clear, fire")
 
+            aoi_q = st.text_input(
+                "Location", placeholder="lat, lon  or  west, south, east, north",
+                help="A point keeps flight lines covering it; a bbox keeps "
+                     "those intersecting it (spatial index, no scan).",
+            )
+
             sub = cat[
                 cat["_date"].dt.year.between(*yr_range)
                 & cat["Pixel Size"].fillna(1e9).le(px_cap)
@@ -136,13 +199,25 @@ with tab_browse:
             if kw:
                 sub = sub[sub["Comments"].astype(str)
                           .str.contains(kw, case=False, na=False)]
+            aoi = _parse_aoi(aoi_q) if aoi_q else None
+            if aoi_q and aoi is None:
+                st.warning("Location must be `lat, lon` or `west, south, east, north`.")
+            elif aoi is not None:
+                kind, vals = aoi
+                rows = (catalog.query_rows(Point(*vals), 'within')
+                        if kind == 'point' else catalog.query_rows(vals))
+                sub = sub[sub.index.isin(cat.index[rows])]
+                if kind == 'point' and sub.empty:
+                    near = catalog.nearest(*vals)
+                    if not near.empty:
+                        st.caption(
+                            f"Nothing covers that point — nearest flight line "
+                            f"is {near.iloc[0]['Name']} "
+                            f"({near.iloc[0]['_distance_deg']:.2f}° away)."
+                        )
 
             st.metric("Matching scenes", f"{len(sub):,}")
             geom = sub[sub["_has_geom"]]
-            MAX_DRAW = 400
-            if len(geom) > MAX_DRAW:
-                st.caption(f"Showing first {MAX_DRAW} footprints on the map.")
-                geom = geom.head(MAX_DRAW)
 
             names = sub["Name"].astype(str).tolist()
             picked = st.selectbox(
@@ -155,23 +230,44 @@ with tab_browse:
             if geom.empty:
                 st.info("No footprints match — widen the filters.")
             else:
-                clat = geom[["Lat1", "Lat2", "Lat3", "Lat4"]].mean().mean()
-                clon = geom[["Lon1", "Lon2", "Lon3", "Lon4"]].mean().mean()
-                m = folium.Map(location=[clat, clon], zoom_start=5,
+                # Re-fit the map only when the filters change; otherwise keep
+                # whatever the user panned/zoomed to.
+                sig = (yr_range, site_q, px_cap, kw, aoi_q)
+                if (st.session_state['cat_view'] is None
+                        or st.session_state['cat_filter_sig'] != sig):
+                    st.session_state['cat_filter_sig'] = sig
+                    st.session_state['cat_view'] = _fit_view(geom)
+                view = st.session_state['cat_view']
+
+                fc = catalog.view(view['bounds'], view['zoom'],
+                                  rows=cat.index.get_indexer(geom.index))
+                layer = _footprint_layer(fc)
+                if picked and picked != "—":
+                    sel = geom[geom["Name"].astype(str) == picked]
+                    if not sel.empty:
+                        folium.Polygon(
+                            _footprint(sel.iloc[0]), color="#f59e0b", weight=3,
+                            fill=True, fill_opacity=0.35, tooltip=picked,
+                        ).add_to(layer)
+
+                m = folium.Map(location=view['center'], zoom_start=view['zoom'],
                                tiles="CartoDB dark_matter")
-
-                for _, r in geom.iterrows():
-                    is_sel = str(r["Name"]) == picked
-                    folium.Polygon(
-                        _footprint(r),
-                        color="#38bdf8" if not is_sel else "#f59e0b",
-                        weight=1 if not is_sel else 3,
-                        fill=True,
-                        fill_opacity=0.08 if not is_sel else 0.35,
-                        tooltip=f"{r['Name']} — {r.get('Site Name', '')}",
-                    ).add_to(m)
-
-                st_folium(m, width='100%', height=460, key='cat_map')
+                map_data = st_folium(
+                    m, width='100%', height=460, key='cat_map',
+                    center=view['center'], zoom=view['zoom'],
+                    feature_group_to_add=layer,
+                    returned_objects=['bounds', 'zoom', 'center'],
+                )
+                moved = _view_from_map(map_data)
+                if moved is not None and _view_changed(moved, view):
+                    st.session_state['cat_view'] = moved
+                    st.rerun()
+
+                st.caption(
+                    f"{fc['in_view']:,} footprints in view"
+                    + (" — clustered; zoom in for outlines."
+                       if fc['mode'] == 'clusters' else ".")
+                )
 
             if picked and picked != "—":
                 row = sub[sub["Name"].astype(str) == picked].iloc[0]
@@ -250,6 +346,20 @@ with tab_spectral:
                 f"{badge} · {analyzer.n_bands} bands · {rows:,}×{cols:,} px · "
                 f"{analyzer.wavelengths.min():.0f}–{analyzer.wavelengths.max():.0f} nm"
             )
+            if analyzer.overview_levels:
+                st.caption(
+                    "Overviews: "
+                    + ", ".join(f"{f}×" for f in analyzer.overview_levels)
+                    + " — downsample changes read the pre-averaged copy."
+                )
+            elif st.button("Build overviews", key='hsi_ovr_btn',
+                           help="One pass over the cube writing area-averaged "
+                                "2×/4×/8×/16× copies of every band to a "
+                                "`.ovr` sidecar; later renders at those "
+                                "downsample levels are small cached reads."):
+                with st.spinner("Building overviews (one-time, scans the cube)…"):
+                    analyzer.build_overviews()
+                st.rerun()
             if not analyzer.is_reflectance and layer != 'RGB':
                 st.warning(
                     f"**{layer} on radiance** is an uncalibrated proxy — "
@@ -267,16 +377,21 @@ with tab_spectral:
                     rgba, bounds = analyzer.render_rgb(downsample=downsample)
                 else:
                     rgba, bounds = analyzer.render_index(layer, downsample=downsample)
+            cs = analyzer.cache_stats()
+            st.caption(
+                f"Band cache: {cs['hits']} hits · {cs['misses']} misses · "
+                f"{cs['entries']} bands ({cs['bytes'] / 1e6:,.0f} of "
+                f"{cs['budget'] / 1e6:,.0f} MB)"
+            )
 
             south, west, north, east = bounds
-            b64 = rgba_to_base64(rgba)
             m = folium.Map(
                 location=[(south + north) / 2, (west + east) / 2],
                 zoom_start=13,
                 tiles='CartoDB dark_matter',
             )
             folium.raster_layers.ImageOverlay(
-                image=f"data:image/png;base64,{b64}",
+                image=rgba_to_data_uri(rgba),
                 bounds=[[south, west], [north, east]],
                 opacity=0.9,
                 name=layer,
@@ -399,13 +514,12 @@ with tab_wildfire:
                     "not calibrated severity reporting."
                 )
 
-            b64 = rgba_to_base64(sev_rgba)
             m = folium.Map(
                 location=[(south + north) / 2, (west + east) / 2],
                 zoom_start=13, tiles='CartoDB dark_matter',
             )
             folium.raster_layers.ImageOverlay(
-                image=f"data:image/png;base64,{b64}",
+                image=rgba_to_data_uri(sev_rgba),
                 bounds=[[south, west], [north, east]],
                 opacity=0.85, name="Burn Severity (dNBR)",
             ).add_to(m)
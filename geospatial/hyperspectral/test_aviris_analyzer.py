@@ -0,0 +1,294 @@
+"""Tests for AVIRISAnalyzer's read path on small synthetic ENVI cubes (no
+network, no real AVIRIS-NG data)."""
+import sys
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+import shapely
+import spectral.io.envi as envi
+from shapely.geometry import Polygon, box
+
+import aviris_analyzer
+from aviris_analyzer import AVIRISAnalyzer
+
+ROWS, COLS = 70, 90
+WAVELENGTHS = np.linspace(400.0, 2400.0, 41)   # 50 nm steps
+PIXEL_DEG = 0.001
+WEST, NORTH = -120.0, 39.0
+
+
+def synthetic_cube(path: Path, seed: int) -> Path:
+    """(ROWS, COLS, 41) float32 reflectance cube in BIP order, georeferenced
+    in the .hdr, with a patch of negative fill values like a real edge."""
+    rng = np.random.default_rng(seed)
+    cube = rng.uniform(0.01, 0.6, (ROWS, COLS, len(WAVELENGTHS))).astype(np.float32)
+    cube[:3, :5] = -9999.0
+    cube[40:43, 60:62, 4] = -1.0
+    envi.save_image(str(path) + '.hdr', cube, interleave='bip', ext='',
+                    force=True, metadata={
+                        'wavelength': [str(w) for w in WAVELENGTHS],
+                        'wavelength units': 'Nanometers',
+                        'map info': (f'{{Geographic Lat/Lon, 1, 1, {WEST}, '
+                                     f'{NORTH}, {PIXEL_DEG}, {PIXEL_DEG}, '
+                                     'WGS-84, units=Degrees}'),
+                    })
+    return path
+
+
+def lonlat(row, col):
+    """WGS-84 (lon, lat) of a (fractional) pixel coordinate."""
+    return WEST + col * PIXEL_DEG, NORTH - row * PIXEL_DEG
+
+
+def bbox_of(r0, r1, c0, c1):
+    """WGS-84 bbox whose corners fall inside pixels r0..r1-1 / c0..c1-1."""
+    eps = PIXEL_DEG / 2
+    return [WEST + c0 * PIXEL_DEG + eps, NORTH - r1 * PIXEL_DEG + eps,
+            WEST + c1 * PIXEL_DEG - eps, NORTH - r0 * PIXEL_DEG - eps]
+
+
+def reference_band(a: AVIRISAnalyzer, wavelength: float) -> np.ndarray:
+    """The whole band through spectral's own reader, fill values → NaN."""
+    band = np.asarray(a._spy.read_band(a._nearest_band(wavelength)),
+                      dtype=np.float32)
+    band[band < 0] = np.nan
+    return band
+
+
+def block_mean(band: np.ndarray, f: int) -> np.ndarray:
+    """NaN-aware f×f block mean of a 2-D band, ragged edges averaging only
+    the pixels that exist."""
+    r, c = band.shape
+    padded = np.full((-(-r // f) * f, -(-c // f) * f), np.nan, dtype=np.float32)
+    padded[:r, :c] = band
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)   # all-NaN cells
+        return np.nanmean(padded.reshape(padded.shape[0] // f, f,
+                                         padded.shape[1] // f, f), axis=(1, 3))
+
+
+def record_loads(a: AVIRISAnalyzer) -> list:
+    """Log every uncached band read as (band, downsample, window), and make
+    the whole-band fallback fail so only the windowed memmap path can run."""
+    calls = []
+    load = a._load_band
+
+    def logged(idx, ds, window):
+        calls.append((idx, ds, window))
+        return load(idx, ds, window)
+
+    def whole_band(*_):
+        raise AssertionError("whole-band read_band() fallback used")
+
+    a._load_band = logged
+    a._spy.read_band = whole_band
+    return calls
+
+
+def main():
+    ok = lambda name: print(f"PASS  {name}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        pre = AVIRISAnalyzer(str(synthetic_cube(tmp / 'ang_pre_corr_img', 0))).load()
+        post = AVIRISAnalyzer(str(synthetic_cube(tmp / 'ang_post_corr_img', 1))).load()
+        assert pre.shape == (ROWS, COLS) and pre.is_reflectance
+
+        # 1. Windowed, strided reads match the full band sliced the same way,
+        #    across several READ_BLOCK_ROWS blocks; renders go through them
+        block_rows = aviris_analyzer.READ_BLOCK_ROWS
+        aviris_analyzer.READ_BLOCK_ROWS = 4
+        try:
+            refs = {wl: reference_band(pre, wl) for wl in (470.0, 842.0, 2190.0)}
+            win = (5, 61, 7, 83)
+            r0, r1, c0, c1 = win
+            for ds in (1, 2, 3, 4, 8):
+                for wl, ref in refs.items():
+                    got = pre._load_band(pre._nearest_band(wl), ds, win)
+                    np.testing.assert_array_equal(
+                        got, ref[r0:r1, c0:c1][::ds, ::ds], err_msg=f"{wl} x{ds}")
+                    full = pre._load_band(pre._nearest_band(wl), ds, None)
+                    np.testing.assert_array_equal(full, ref[::ds, ::ds])
+            assert np.isnan(pre._load_band(0, 1, None)[:3, :5]).all()
+
+            bbox = bbox_of(*win)
+            assert pre.window_for_bbox(bbox) == win
+            pre.clear_band_cache(); post.clear_band_cache()
+            calls, post_calls = record_loads(pre), record_loads(post)
+            rgba, bounds = pre.render_rgb(downsample=4, bbox=bbox)
+            assert rgba.shape == (len(range(r0, r1, 4)), len(range(c0, c1, 4)), 4)
+            assert [c[2] for c in calls] == [win] * 3 and {c[1] for c in calls} == {4}
+            np.testing.assert_allclose(bounds, [NORTH - r1 * PIXEL_DEG,
+                                                WEST + c0 * PIXEL_DEG,
+                                                NORTH - r0 * PIXEL_DEG,
+                                                WEST + c1 * PIXEL_DEG])
+            calls.clear()
+            rgba, _ = pre.render_index('NDVI', downsample=2, bbox=bbox)
+            assert rgba.shape[:2] == (len(range(r0, r1, 2)), len(range(c0, c1, 2)))
+            assert calls and all(c[1:] == (2, win) for c in calls)
+            calls.clear()
+            dnbr, classes, _ = pre.burn_scar_analysis(post, downsample=2, bbox=bbox)
+            assert calls and all(c[1:] == (2, win) for c in calls)
+            assert post_calls and all(c[1:] == (2, win) for c in post_calls)
+            nir, swir = refs[842.0], refs[2190.0]
+            fresh = AVIRISAnalyzer(str(post.img_path)).load()
+            post_nir, post_swir = (reference_band(fresh, 842.0),
+                                   reference_band(fresh, 2190.0))
+            nbr = lambda n, s: ((n - s) / (n + s))[r0:r1:2, c0:c1:2]
+            np.testing.assert_allclose(dnbr, nbr(nir, swir) - nbr(post_nir, post_swir),
+                                       rtol=1e-5, equal_nan=True)
+            assert classes.shape == dnbr.shape
+        finally:
+            aviris_analyzer.READ_BLOCK_ROWS = block_rows
+        ok("windowed strided reads match read_band()[win][::N, ::N]; "
+           "render_rgb / render_index / burn_scar_analysis use them")
+
+        # 2. Overviews are block means of the full-res band; renders at an
+        #    overview level read only the sidecar, on its cell grid
+        pre = AVIRISAnalyzer(str(pre.img_path)).load()
+        assert pre.build_overviews(block_rows=16) == [2, 4, 8, 16]
+        assert (pre.overview_dir / 'x16.npy').exists()
+        full = {i: reference_band(pre, wl) for i, wl in enumerate(WAVELENGTHS)}
+        for f in aviris_analyzer.OVERVIEW_LEVELS:
+            ov = pre._overviews[f]
+            assert ov.shape == (len(WAVELENGTHS), -(-ROWS // f), -(-COLS // f))
+            for i, band in full.items():
+                np.testing.assert_allclose(ov[i], block_mean(band, f), rtol=1e-6,
+                                           equal_nan=True, err_msg=f"band {i} x{f}")
+
+        pre._mm = False                   # no cube memmap …
+        calls = record_loads(pre)         # … and no whole-band fallback
+        r0, r1, c0, c1 = win
+        for ds in (2, 4, 8, 16):
+            pre.clear_band_cache(); calls.clear()
+            rgba, bounds = pre.render_index('NDVI', downsample=ds, bbox=bbox)
+            sr0, sr1, sc0, sc1 = calls[0][2]
+            assert {c[2] for c in calls} == {(sr0, sr1, sc0, sc1)}
+            # the window starts on a whole overview cell, at most ds-1 pixels
+            # before the bbox, and the bounds describe exactly those cells
+            assert sr0 % ds == 0 and sc0 % ds == 0
+            assert 0 <= r0 - sr0 < ds and 0 <= c0 - sc0 < ds
+            assert sr1 >= r1 and sc1 >= c1
+            np.testing.assert_allclose(bounds, [NORTH - sr1 * PIXEL_DEG,
+                                                WEST + sc0 * PIXEL_DEG,
+                                                NORTH - sr0 * PIXEL_DEG,
+                                                WEST + sc1 * PIXEL_DEG])
+            nir = block_mean(full[pre._nearest_band(842)], ds)
+            red = block_mean(full[pre._nearest_band(665)], ds)
+            cells = np.s_[sr0 // ds:-(-sr1 // ds), sc0 // ds:-(-sc1 // ds)]
+            expected = aviris_analyzer.index_to_rgba(
+                ((nir - red) / (nir + red))[cells],
+                aviris_analyzer.INDEX_COLORMAPS['NDVI'])
+            np.testing.assert_array_equal(rgba, expected)
+        assert (r0 % 4, c0 % 4) != (0, 0)   # the offset case is exercised
+        ok("overviews = block means; renders at 2/4/8/16 read the sidecar "
+           "on whole cells, bounds match")
+
+        # 3. Band LRU: layers sharing a wavelength don't re-read it, the byte
+        #    budget holds, least-recently-used bands go first
+        a = AVIRISAnalyzer(str(post.img_path)).load()
+        calls = record_loads(a)
+        a.render_index('NDVI', downsample=2)
+        assert a.cache_stats()['misses'] == 2 and len(calls) == 2
+        a.render_index('NBR', downsample=2)            # NIR shared with NDVI
+        assert [c[0] for c in calls[2:]] == [a._nearest_band(2190)]
+        st = a.cache_stats()
+        assert (st['hits'], st['misses'], st['entries']) == (1, 3, 3)
+        a.render_index('NDVI', downsample=2)
+        a.render_index('NBR', downsample=2)
+        st2 = a.cache_stats()
+        assert st2['hits'] == st['hits'] + 4 and st2['misses'] == st['misses']
+        assert len(calls) == 3
+
+        band_bytes = ROWS * COLS * 4
+        a.clear_band_cache()
+        a.band_cache_bytes = int(2.5 * band_bytes)     # room for two bands
+        key = lambda wl: (a._nearest_band(wl), 1, None)
+        for wl in (470.0, 665.0, 470.0, 842.0, 2190.0, 842.0, 1600.0):
+            a._read_band(wl)
+            assert a.cache_stats()['bytes'] <= a.band_cache_bytes
+        # evictions: 665 (470 was re-read), 470, then 2190 (842 was re-read)
+        assert list(a._band_cache) == [key(842.0), key(1600.0)]
+        assert a.cache_stats()['bytes'] == 2 * band_bytes
+        a.band_cache_bytes = band_bytes - 1            # a band that can't fit
+        a.clear_band_cache()
+        assert a._read_band(470.0).shape == (ROWS, COLS)
+        assert a.cache_stats()['entries'] == 0
+        ok("band LRU: shared bands hit, byte budget respected, LRU evicted first")
+
+        # 4. Batch spectra match per-pixel read_pixel; polygon statistics
+        #    match NumPy over the pixels whose centres fall inside
+        a = AVIRISAnalyzer(str(post.img_path)).load()
+        cube = np.stack([reference_band(a, wl) for wl in WAVELENGTHS], axis=-1)
+        chunk, batch_px = (aviris_analyzer.SPECTRA_CHUNK,
+                           aviris_analyzer.POLYGON_BATCH_PIXELS)
+        aviris_analyzer.SPECTRA_CHUNK = 7
+        aviris_analyzer.POLYGON_BATCH_PIXELS = 300
+        try:
+            rng = np.random.default_rng(2)
+            pix = np.column_stack([rng.integers(0, ROWS, 40),
+                                   rng.integers(0, COLS, 40)])
+            pix = np.vstack([pix, [[0, 0], [2, 4],          # all-fill corner
+                                   [-1, 5], [5, -1], [ROWS, 5], [5, COLS]]])
+            lon, lat = lonlat(pix[:, 0] + 0.5, pix[:, 1] + 0.5)
+            spectra, valid = a.get_spectra_batch(np.column_stack([lat, lon]))
+            assert spectra.shape == (len(pix), len(WAVELENGTHS))
+            for (r, c), spec, v in zip(pix, spectra, valid):
+                inside = 0 <= r < ROWS and 0 <= c < COLS
+                if not inside:
+                    assert not v and np.isnan(spec).all()
+                    continue
+                px = np.asarray(a._spy.read_pixel(int(r), int(c)), np.float32)
+                px[px < 0] = np.nan
+                np.testing.assert_array_equal(spec, px)
+                assert v == (a.get_spectra(int(r), int(c)) is not None)
+            assert valid.sum() == 40 and not valid[40:].any()
+            by_rc, valid_rc = a.get_spectra_batch(pix, latlon=False)
+            np.testing.assert_array_equal(by_rc, spectra)
+            np.testing.assert_array_equal(valid_rc, valid)
+
+            polys = [
+                Polygon([lonlat(*rc) for rc in ((0.3, 0.2), (8.6, 1.1),
+                                                (6.2, 12.7))]),   # fill corner
+                box(*lonlat(45.6, 55.3), *lonlat(38.2, 65.8)),    # band-4 holes
+                Polygon([lonlat(*rc) for rc in ((20.1, 30.4), (33.7, 62.9),
+                                                (61.3, 41.8), (27.5, 35.2))]),
+                box(*lonlat(-9.0, COLS + 2.0), *lonlat(-20.0, COLS + 9.0)),  # off
+            ]
+            rr, cc = np.meshgrid(np.arange(ROWS), np.arange(COLS), indexing='ij')
+            centres = lonlat(rr + 0.5, cc + 0.5)
+            for reduce, fn in (('mean', np.nanmean), ('median', np.nanmedian),
+                               ('std', np.nanstd)):
+                stats, counts = a.get_spectra_in_polygon(polys, reduce=reduce)
+                assert stats.shape == (len(polys), len(WAVELENGTHS))
+                for poly, row, n in zip(polys, stats, counts):
+                    spec = cube[shapely.contains_xy(poly, *centres)]
+                    spec = spec[np.isfinite(spec).any(axis=1)]
+                    assert n == len(spec), (reduce, n, len(spec))
+                    if n == 0:
+                        assert np.isnan(row).all()
+                        continue
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', RuntimeWarning)
+                        np.testing.assert_allclose(row, fn(spec, axis=0),
+                                                   rtol=1e-5, err_msg=reduce)
+            assert counts[0] > 0 and counts[1] > 0 and counts[3] == 0
+            assert not np.isnan(stats[1, 4])         # holes skipped, not NaN
+            px, ok_px = a.get_spectra_in_polygon(polys[2])
+            assert ok_px.sum() == counts[2]
+        finally:
+            aviris_analyzer.SPECTRA_CHUNK = chunk
+            aviris_analyzer.POLYGON_BATCH_PIXELS = batch_px
+        ok("get_spectra_batch matches read_pixel (off-cube → valid=False); "
+           "polygon mean/median/std match NumPy")
+
+    print("\nALL TESTS PASSED")
+
+
+if __name__ == '__main__':
+    main()
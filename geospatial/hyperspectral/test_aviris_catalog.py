@@ -0,0 +1,110 @@
+"""Tests for FlightLineCatalog on a synthetic 10k-line catalog (no network)."""
+import sys
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import Point, box
+
+from aviris_catalog import FlightLineCatalog
+
+
+def synthetic_csv(path: Path, n: int = 10_000, seed: int = 0) -> None:
+    """Catalog-shaped CSV: four-corner footprints (~0.02° × 0.1° strips)
+    scattered over California, a few rows missing a corner."""
+    rng = np.random.default_rng(seed)
+    lon0 = rng.uniform(-124, -114, n)
+    lat0 = rng.uniform(32, 42, n)
+    df = pd.DataFrame({
+        'Name': [f"ang{i:05d}" for i in range(n)],
+        'Site Name': rng.choice(['Caldor, CA', 'Ivanpah Playa', 'Delta'], n),
+        'Year': rng.integers(2014, 2024, n), 'Month': 6, 'Day': 15,
+        'Pixel Size': rng.uniform(1, 8, n),
+        'RDN Ver': rng.choice(['v2', 2.0, None], n),     # mixed types
+        'Lon1': lon0, 'Lon2': lon0 + 0.02, 'Lon3': lon0 + 0.02, 'Lon4': lon0,
+        'Lat1': lat0, 'Lat2': lat0, 'Lat3': lat0 + 0.1, 'Lat4': lat0 + 0.1,
+    })
+    df.loc[:4, 'Lat3'] = None
+    df.to_csv(path, index=False)
+
+
+def main():
+    ok = lambda name: print(f"PASS  {name}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        csv = tmp / 'catalog.csv'
+        synthetic_csv(csv)
+        cache = tmp / 'cache' / 'catalog.parquet'
+
+        # 1. Parse + footprints; the Parquet cache round-trips geometry
+        cat = FlightLineCatalog.load(str(csv), cache_path=str(cache))
+        assert len(cat) == 10_000 and cache.exists()
+        assert cat.df['_has_geom'].sum() == 9_995
+        assert cat.df.geometry.isna().sum() == 5
+        again = FlightLineCatalog.load(str(csv) + '.gone', cache_path=str(cache))
+        assert again.df.geometry.equals(cat.df.geometry)
+        assert again.df['_date'].dtype.kind == 'M'
+        ok("CSV parse → GeoParquet cache round trip")
+
+        # 2. Queries match a brute-force scan
+        geoms = cat.df.geometry
+        aoi = [-121.0, 38.0, -120.0, 39.0]
+        brute = cat.df.index[geoms.intersects(box(*aoi)).fillna(False)]
+        assert cat.intersects(aoi).index.equals(brute)
+        pt = Point(-120.5, 38.5)
+        brute = cat.df.index[geoms.contains(pt).fillna(False)]
+        assert cat.contains(-120.5, 38.5).index.equals(brute)
+        near = cat.nearest(-120.5, 38.5, k=5)
+        dist = shapely.distance(geoms.to_numpy(), pt).astype(float)
+        assert near.index.tolist() == list(np.argsort(np.nan_to_num(dist, nan=1e9))[:5])
+        assert cat.nearest(-120.5, 38.5).index[0] == near.index[0]
+        ok("intersects / contains / nearest match brute force")
+
+        # 3. Index queries are sub-millisecond at 10k lines
+        rng = np.random.default_rng(1)
+        pts = [Point(x, y) for x, y in zip(rng.uniform(-124, -114, 500),
+                                           rng.uniform(32, 42, 500))]
+        t0 = time.perf_counter()
+        for p in pts:
+            cat.query_rows(p, 'within')
+            cat.query_rows(p.buffer(0.5).envelope)
+        per_query = (time.perf_counter() - t0) / (2 * len(pts))
+        assert per_query < 1e-3, f"{per_query * 1e6:.0f} µs/query"
+        ok(f"spatial query {per_query * 1e6:.0f} µs (10k footprints)")
+
+        # 4. Viewport rendering: bounded output, clusters conserve counts
+        state = [-125.0, 32.0, -113.0, 43.0]
+        for zoom in (3, 6, 9):
+            fc = cat.view(state, zoom)
+            assert fc['mode'] == 'clusters' and fc['in_view'] == 9_995
+            assert len(fc['features']) <= 500
+            assert sum(f['properties']['count'] for f in fc['features']) == 9_995
+        half = np.arange(0, len(cat), 2)
+        fc = cat.view(state, 6, rows=half)
+        assert fc['in_view'] == sum(cat.df['_has_geom'].to_numpy()[half])
+        fc = cat.view(aoi, 11)
+        assert fc['mode'] == 'footprints'
+        assert sorted(f['properties']['Name'] for f in fc['features']) == \
+            sorted(cat.intersects(aoi)['Name'])
+        ok("view(): viewport culling, zoom clustering, feature cap")
+
+        # 5. A stale cache is refreshed from the source
+        old = time.time() - 2 * 86_400
+        os.utime(cache, (old, old))
+        FlightLineCatalog.load(str(csv), cache_path=str(cache))
+        assert time.time() - cache.stat().st_mtime < 60
+        ok("24 h refresh of the on-disk cache")
+
+    print("\nALL TESTS PASSED")
+
+
+if __name__ == '__main__':
+    main()
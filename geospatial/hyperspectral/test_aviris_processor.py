@@ -0,0 +1,239 @@
+"""Tests for AVIRISProcessor.download_links against a local HTTP server,
+convert_to_shapefiles on a few tiny KMLs, and ShapefileSplitter on a small
+labeled GeoDataFrame.
+
+A ThreadingHTTPServer on 127.0.0.1 stands in for the JPL locator: it serves
+ETag'd files, answers conditional requests with 304, fails one path with 503
+before recovering, and 404s another — no network needed.
+"""
+import sys
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow.dataset as ds
+import pyogrio
+from shapely.geometry import Point
+
+import aviris_processor as ap
+
+FILES = {
+    '/kml/a.kml':  b'<kml>a</kml>',
+    '/kml/b.kml':  b'<kml>b</kml>',
+    '/kml/flaky.kml': b'<kml>flaky</kml>',
+    '/rgb/a_RGB.jpeg': b'\xff\xd8jpeg-a',
+}
+
+
+KML = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark>
+<name>{name}</name>
+<Polygon><outerBoundaryIs><LinearRing><coordinates>
+{x0},38.0 {x1},38.0 {x1},38.2 {x0},38.2 {x0},38.0
+</coordinates></LinearRing></outerBoundaryIs></Polygon>
+</Placemark></Document></kml>
+"""
+
+
+def write_kml(path: Path, i: int) -> Path:
+    """A one-placemark flight-line outline, 0.1° wide, offset by `i`."""
+    path.write_text(KML.format(name=f"outline {i}", x0=-121.0 + i * 0.1,
+                               x1=-120.9 + i * 0.1))
+    return path
+
+
+def mtimes(paths) -> dict:
+    return {p.name: p.stat().st_mtime_ns for p in paths}
+
+
+class Handler(BaseHTTPRequestHandler):
+    hits = Counter()          # path → requests seen
+    full = Counter()          # path → 200 responses sent
+    flaky_failures = 2
+
+    def do_GET(self):
+        Handler.hits[self.path] += 1
+        if self.path == '/kml/flaky.kml' and Handler.hits[self.path] <= Handler.flaky_failures:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        body = FILES.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        Handler.full[self.path] += 1
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    ok = lambda name: print(f"PASS  {name}")
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        excel = tmp / 'flight_lines.xlsx'
+        pd.DataFrame({
+            'Name': ['ang_a', 'ang_b', 'ang_flaky', 'ang_gone', 'ang_nolink'],
+            'link_kml_outline': [f"{base}/kml/a.kml", f"{base}/kml/b.kml",
+                                 f"{base}/kml/flaky.kml", f"{base}/kml/gone.kml",
+                                 None],
+            'link_rgb': [f"{base}/rgb/a_RGB.jpeg", None, None, None, None],
+        }).to_excel(excel, index=False)
+        proc = ap.AVIRISProcessor(str(excel), str(tmp / 'kml'), str(tmp / 'shp'))
+
+        # 1. First run: downloads, retries the 503s, records every outcome
+        m = proc.download_kml_files(workers=4, backoff=0.01)
+        status = {k: v['status'] for k, v in m.items()}
+        assert status == {'ang_a': 'downloaded', 'ang_b': 'downloaded',
+                          'ang_flaky': 'downloaded', 'ang_gone': 'failed',
+                          'ang_nolink': 'missing_link'}, status
+        assert (tmp / 'kml' / 'ang_a.kml').read_bytes() == FILES['/kml/a.kml']
+        assert (tmp / 'kml' / 'ang_flaky.kml').read_bytes() == FILES['/kml/flaky.kml']
+        assert Handler.hits['/kml/flaky.kml'] == 3
+        assert '404' in m['ang_gone']['error']
+        assert not list((tmp / 'kml').glob('.*.part')), "temp file left behind"
+        on_disk = json.loads((tmp / 'kml' / '_manifest.json').read_text())
+        assert on_disk['ang_a']['etag'] and on_disk['ang_a']['bytes'] == 12
+        ok("download + retry/backoff + failures recorded in manifest")
+
+        # 2. Re-run: unchanged files come back 304, only changed ones transfer
+        FILES['/kml/b.kml'] = b'<kml>b v2</kml>'
+        full_before = Handler.full.copy()
+        m = proc.download_kml_files(workers=4, backoff=0.01)
+        assert m['ang_a']['status'] == 'not_modified'
+        assert m['ang_flaky']['status'] == 'not_modified'
+        assert m['ang_b']['status'] == 'downloaded'
+        assert Handler.full['/kml/a.kml'] == full_before['/kml/a.kml']
+        assert (tmp / 'kml' / 'ang_b.kml').read_bytes() == b'<kml>b v2</kml>'
+        ok("conditional re-run (ETag / 304)")
+
+        # 3. A deleted local file is fetched again even though the ETag matches
+        (tmp / 'kml' / 'ang_a.kml').unlink()
+        m = proc.download_kml_files(workers=2, backoff=0.01)
+        assert m['ang_a']['status'] == 'downloaded'
+        assert (tmp / 'kml' / 'ang_a.kml').exists()
+        ok("missing local file re-downloaded")
+
+        # 4. Same pipeline serves other catalog links (RGB quicklooks)
+        m = proc.download_links('link_rgb', tmp / 'rgb', backoff=0.01)
+        assert m['ang_a']['status'] == 'downloaded'
+        assert (tmp / 'rgb' / 'ang_a.jpeg').read_bytes() == FILES['/rgb/a_RGB.jpeg']
+        assert sum(v['status'] == 'missing_link' for v in m.values()) == 4
+        ok("link_rgb quicklooks via download_links")
+
+        # 5. KML conversion: per-file and consolidated outputs are skipped
+        #    while up to date, and only a touched KML is converted again
+        kml_dir = tmp / 'kml_outlines'
+        kml_dir.mkdir()
+        kmls = [write_kml(kml_dir / f"ang_{c}.kml", i)
+                for i, c in enumerate('abc')]
+        conv = ap.AVIRISProcessor(str(excel), str(kml_dir), str(tmp / 'vec'))
+
+        assert conv.convert_to_shapefiles(workers=2) == {
+            'converted': 3, 'skipped': 0, 'failed': 0}
+        shps = sorted((tmp / 'vec').glob('*.shp'))
+        assert [p.stem for p in shps] == ['ang_a', 'ang_b', 'ang_c']
+        assert gpd.read_file(shps[1])['Name'].tolist() == ['outline 1']
+        before = mtimes(shps)
+        assert conv.convert_to_shapefiles(workers=2)['converted'] == 0
+        assert mtimes(shps) == before
+        os.utime(kmls[1])                   # touch
+        assert conv.convert_to_shapefiles(workers=2) == {
+            'converted': 1, 'skipped': 2, 'failed': 0}
+        after = mtimes(shps)
+        assert [k for k in after if after[k] != before[k]] == ['ang_b.shp']
+        assert conv.convert_to_shapefiles(workers=2, force=True)['converted'] == 3
+
+        for name in ('flight_lines.gpkg', 'flight_lines.parquet'):
+            out = tmp / 'vec' / name
+            read = gpd.read_parquet if out.suffix == '.parquet' else gpd.read_file
+            assert conv.convert_to_shapefiles(workers=2, consolidated=name)[
+                'converted'] == 3
+            merged = read(out)
+            assert sorted(merged['Name']) == ['ang_a', 'ang_b', 'ang_c']
+            assert set(merged['Placemark']) == {'outline 0', 'outline 1',
+                                                'outline 2'}
+            assert conv.convert_to_shapefiles(workers=2, consolidated=name)[
+                'converted'] == 0
+            write_kml(kmls[2], 7)          # edited outline, newer than `out`
+            assert conv.convert_to_shapefiles(workers=2, consolidated=name) == {
+                'converted': 1, 'skipped': 2, 'failed': 0}
+            merged = read(out)
+            assert sorted(merged['Name']) == ['ang_a', 'ang_b', 'ang_c']
+            assert merged.set_index('Name').loc['ang_c', 'Placemark'] == 'outline 7'
+            write_kml(kmls[2], 2)
+        assert not list((tmp / 'vec').glob('.*.tmp')), "temp file left behind"
+        ok("convert_to_shapefiles: skips up-to-date outputs, reconverts touched "
+           "KMLs, consolidated file holds every Name")
+
+        # 6. ShapefileSplitter: one output per subclass in every format,
+        #    feature counts adding up to the input
+        subclasses = (['Almonds'] * 4 + ['Grapes'] * 3
+                      + ['Melons, squash/cucumbers'] * 2 + ['Rice'])
+        labeled = gpd.GeoDataFrame(
+            {'SUBCLASS_D': subclasses, 'ACRES': range(len(subclasses))},
+            geometry=[Point(-121.0 + i * 0.01, 38.5)
+                      for i in range(len(subclasses))],
+            crs='EPSG:4326')
+        labeled.to_file(tmp / 'labeled.shp')
+        want = Counter(subclasses)
+        for fmt in ap.ShapefileSplitter.FORMATS:
+            out_dir = tmp / f'split_{fmt}'
+            manifest = ap.ShapefileSplitter(str(tmp / 'labeled.shp'),
+                                            str(out_dir)).split(fmt=fmt, workers=3)
+            assert dict(zip(manifest['subclass'], manifest['features'])) == want, fmt
+            assert manifest['features'].sum() == len(labeled)
+            assert (manifest['bytes'] > 0).all()
+            if fmt == 'shp':
+                for sub, path in zip(manifest['subclass'], manifest['path']):
+                    assert len(gpd.read_file(path)) == want[sub]
+                assert (out_dir / 'Melons,_squash_cucumbers.shp').exists()
+            elif fmt == 'parquet':
+                assert sorted(p.name for p in out_dir.iterdir()) == sorted(
+                    f"SUBCLASS_D={ap.quote(s, safe='')}" for s in want)
+                part = gpd.read_parquet(manifest['path'][0])
+                assert 'SUBCLASS_D' not in part.columns and part.crs == labeled.crs
+                table = ds.dataset(out_dir, format='parquet',
+                                   partitioning='hive').to_table()
+                assert Counter(table.column('SUBCLASS_D').to_pylist()) == want
+            else:
+                gpkg = out_dir / 'split.gpkg'
+                layers = {name for name, _ in pyogrio.list_layers(gpkg)}
+                assert layers == set(manifest['layer']) == {
+                    'Almonds', 'Grapes', 'Melons,_squash_cucumbers', 'Rice'}
+                for sub, layer in zip(manifest['subclass'], manifest['layer']):
+                    assert len(gpd.read_file(gpkg, layer=layer)) == want[sub]
+        ok("ShapefileSplitter: shp / hive parquet / gpkg layers, counts add up")
+
+    server.shutdown()
+    print("\nALL TESTS PASSED")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,7 @@ import streamlit.components.v1 as components
 from PIL import Image
 from streamlit_folium import st_folium
 
+from composite_cache import CompositeCache
 from drift import (
     DRIFT_SITES,
     FETCH_TIMEOUT_S,
@@ -28,15 +29,49 @@ from sentinel_analysis import (
     SPECTRAL_ASSETS,
     SentinelAnalyzer,
     fetch_weather,
-    rgba_to_base64,
+    group_by_month,
+    rgba_to_data_uri,
 )
+from tile_server import TileServer
+from tile_store import TileStore
 
 st.set_page_config(page_title="Sentinel-2 Analysis", layout="wide")
 st.title("Sentinel-2 Analysis")
 
+@st.cache_resource
+def get_composite_cache():
+    # Process-wide: every session re-querying the same AOI hits the same disk.
+    return CompositeCache()
+
+@st.cache_resource
+def get_tile_store():
+    # Process-wide: Drift tiles rendered for one session start instantly for
+    # every later session (SENTINEL_TILE_STORE overrides the location).
+    return TileStore()
+
+@st.cache_resource
+def get_tile_server():
+    # Process-wide XYZ server, opt-in: only when SENTINEL_TILE_URL says where
+    # the browser reaches it (a reverse proxy, or http://127.0.0.1:<port> for
+    # a local browser), bound to SENTINEL_TILE_HOST:SENTINEL_TILE_PORT.
+    # Otherwise — or if it fails to start — layers are inlined as PNG
+    # overlays, which work wherever the page itself loads.
+    public_url = os.environ.get('SENTINEL_TILE_URL')
+    if not public_url:
+        return None
+    try:
+        server = TileServer()
+        server.start(host=os.environ.get('SENTINEL_TILE_HOST', '127.0.0.1'),
+                     port=int(os.environ.get('SENTINEL_TILE_PORT', '0')),
+                     public_url=public_url)
+        return server
+    except (ImportError, OSError, RuntimeError, ValueError) as e:
+        print(f"Tile server disabled, using inline overlays: {e}")
+        return None
+
 @st.cache_resource
 def get_analyzer():
-    return SentinelAnalyzer()
+    return SentinelAnalyzer(cache=get_composite_cache())
 
 analyzer = get_analyzer()
 
@@ -95,6 +130,21 @@ with tab_spectral:
 
         load_btn = st.button("Load Data", type="primary")
 
+        if analyzer.cache is not None:
+            cs = analyzer.cache.stats()
+            st.caption(
+                f"Composite cache: {cs['hits']} hits · {cs['misses']} misses · "
+                f"{cs['entries']} stored ({cs['bytes'] / 1e6:,.0f} MB)"
+            )
+        pd_stats = getattr(analyzer, 'last_pushdown', None)
+        if pd_stats:
+            st.caption(
+                f"Cloud pushdown: read {pd_stats['scenes_read']} of "
+                f"{pd_stats['scenes']} scenes, skipped "
+                f"{pd_stats['blocks_skipped']:,} of {pd_stats['blocks']:,} "
+                "spectral chunks"
+            )
+
     # Compute bbox from center + radius
     bbox = [
         center_lon - radius_deg, center_lat - radius_deg,
@@ -115,9 +165,9 @@ with tab_spectral:
             st.warning("No scenes found — try widening the date range or cloud cover.")
         else:
             with st.spinner(f"Loading {len(items)} scenes from S3 and computing composite..."):
-                stack     = analyzer.load_stack(items, bbox)
-                masked    = analyzer.cloud_mask(stack)
-                composite = analyzer.median_composite(masked)
+                composite = analyzer.load_composite(
+                    items, bbox, start_str, end_str, cloud_cover
+                )
 
             st.session_state['composite']   = composite
             st.session_state['load_params'] = current_params
@@ -131,26 +181,38 @@ with tab_spectral:
         if composite is None:
             st.info("Set a location and click **Load Data** to fetch imagery.")
         else:
-            # Render chosen layer
-            if selected_layer == 'RGB':
-                rgba, bounds = analyzer.render_rgb(composite)
-            else:
-                rgba, bounds = analyzer.render_index(composite, selected_layer)
-
-            south, west, north, east = bounds
-            b64 = rgba_to_base64(rgba)
-
             m = folium.Map(
                 location=[center_lat, center_lon],
                 zoom_start=11,
                 tiles='CartoDB dark_matter',
             )
-            folium.raster_layers.ImageOverlay(
-                image=f"data:image/png;base64,{b64}",
-                bounds=[[south, west], [north, east]],
-                opacity=0.85,
-                name=selected_layer,
-            ).add_to(m)
+            tile_server = get_tile_server()
+            if tile_server is not None:
+                # Browser fetches only the visible 256-px tiles
+                token = tile_server.register(composite, analyzer)
+                folium.TileLayer(
+                    tiles=tile_server.tile_url(token, selected_layer),
+                    attr='Sentinel-2 L2A',
+                    name=selected_layer,
+                    overlay=True,
+                    opacity=0.85,
+                    bounds=tile_server.bounds(token),
+                    max_zoom=18,
+                ).add_to(m)
+            else:
+                # Default: whole layer inlined as a base64 PNG
+                if selected_layer == 'RGB':
+                    rgba, bounds = analyzer.render_rgb(composite)
+                else:
+                    rgba, bounds = analyzer.render_index(composite, selected_layer)
+
+                south, west, north, east = bounds
+                folium.raster_layers.ImageOverlay(
+                    image=rgba_to_data_uri(rgba),
+                    bounds=[[south, west], [north, east]],
+                    opacity=0.85,
+                    name=selected_layer,
+                ).add_to(m)
 
             # Show last-click marker
             if st.session_state['last_click']:
@@ -242,8 +304,20 @@ with tab_timelapse:
             if not items:
                 st.warning("No scenes found — try widening the date range or cloud cover.")
             else:
-                with st.spinner(f"Rendering monthly composites from {len(items)} scenes..."):
-                    frames = analyzer.render_timelapse(items, tl_bbox, resolution=0.002)
+                # Frames stream in month by month; preview each as it lands.
+                months   = list(group_by_month(items))
+                progress = st.progress(0.0, text=f"Rendering {len(months)} monthly "
+                                                 f"composites from {len(items)} scenes…")
+                preview  = st.empty()
+                frames   = []
+                for month, frame in analyzer.iter_timelapse(items, tl_bbox,
+                                                            resolution=0.002):
+                    frames.append(frame)
+                    preview.image(frame, caption=f"{month} · frame {len(frames)}")
+                    progress.progress((months.index(month) + 1) / len(months),
+                                      text=f"{month} done ({len(frames)} frames)")
+                progress.empty()
+                preview.empty()
 
                 if not frames:
                     st.warning("All months were fully cloudy — no frames to render.")
@@ -363,7 +437,6 @@ with tab_wildfire:
 
             # ── Severity map ─────────────────────────────────────────────────
             severity_rgba = analyzer.render_burn_severity(classified)
-            sev_b64       = rgba_to_base64(severity_rgba)
 
             m_wf = folium.Map(
                 location=[wf_lat, wf_lon],
@@ -371,7 +444,7 @@ with tab_wildfire:
                 tiles='CartoDB dark_matter',
             )
             folium.raster_layers.ImageOverlay(
-                image=f"data:image/png;base64,{sev_b64}",
+                image=rgba_to_data_uri(severity_rgba),
                 bounds=[[south, west], [north, east]],
                 opacity=0.85,
                 name="Burn Severity (dNBR)",
@@ -553,7 +626,7 @@ with tab_drift:
             radius_deg=d_radius, resolution=d_res,
             start=start_str, end=end_str, cloud=cloud_cover, site=site,
             source=('instant' if d_source == "Instant basemap" else 'live'),
-            gap_fill=d_gap_fill,
+            gap_fill=d_gap_fill, tile_store=get_tile_store(),
         )
         st.session_state['drift_engine'] = eng
         st.session_state['drift_cfg'] = d_cfg
@@ -613,7 +686,7 @@ with tab_drift:
         eng.poll()
         running = st.session_state['drift_running']
 
-        if running and eng.mosaic_b64() is not None:
+        if running and eng.mosaic_tiles() is not None:
             now = time.time()
             last = st.session_state['drift_last']
             dt = min(now - last, 5.0) if last else 0.0
@@ -638,7 +711,7 @@ with tab_drift:
             # First tile still in flight — hold position, keep polling.
             st.session_state['drift_last'] = time.time()
 
-        mos = eng.mosaic_b64()
+        mos = eng.mosaic_tiles()
         if mos is None:
             err = eng.current_tile_error()
             wait = eng.current_wait_seconds()
@@ -676,13 +749,13 @@ with tab_drift:
                         on_click=_cancel_wait,
                     )
         else:
-            b64, bounds = mos
+            tiles, bounds = mos
             # If holding at an edge waiting on imagery, freeze the client pan
             # too — otherwise it would extrapolate into the void.
             client_speed = 0.0 if eng.waiting else d_speed
             components.html(
                 drift_component_html(
-                    b64, bounds, eng.lat, eng.lon,
+                    tiles, bounds, eng.lat, eng.lon,
                     speed=client_speed, heading=eng.heading,
                     tile_size=eng.tile_size, running=running,
                     site_name=eng.site_name,
@@ -700,8 +773,11 @@ with tab_drift:
         s1, s2, s3, s4 = st.columns(4)
         s1.caption(f"**Site:** {eng.site_name}")
         s2.caption(f"**Pos:** {eng.lat:.3f}°, {eng.lon:.3f}°")
+        store_hits = (f" · {eng.tile_store.hits} from store"
+                      if eng.tile_store is not None else "")
         s3.caption(
             f"**Tiles:** {len(eng.tiles)} cached · {eng.fetching()} fetching"
+            f"{store_hits}"
         )
         s4.caption(
             f"**Corridor:** {eng.tiles_crossed} crossed · "
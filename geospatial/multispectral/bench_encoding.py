@@ -0,0 +1,94 @@
+"""Benchmark: encode time vs payload size for every encoding.py format.
+
+    python bench_encoding.py [size]
+
+Encodes two synthetic size×size layers (default 2000×2000) — a textured
+true-colour composite and an NDVI-style LUT render with ~5% masked pixels —
+at each format / effort setting, and reports best-of-3 encode time, payload
+bytes, base64 overhead and the cost of a cached repeat (one hash pass).
+The first row is the old PIL PNG default (zlib level 6) for reference.
+"""
+import base64
+import sys
+import time
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import numpy as np
+
+import encoding
+from sentinel_analysis import index_to_rgba
+
+SETTINGS = [
+    ('png', dict(level=6)),
+    ('png', dict(level=1)),
+    ('png', dict(level=3)),
+    ('webp', dict(level=0)),
+    ('webp', dict(level=4)),
+    ('webp_lossy', dict(quality=80)),
+    ('jpeg', dict(quality=85)),
+]
+
+
+def synthetic_layers(size: int):
+    """Smooth multi-scale fields + sensor-like noise, so the compressors see
+    something closer to imagery than white noise."""
+    rng = np.random.default_rng(0)
+
+    def field(scale):
+        coarse = rng.normal(size=(size // scale + 2, size // scale + 2))
+        rows = np.arange(size) / scale
+        cols = np.arange(size) / scale
+        r0, c0 = rows.astype(int), cols.astype(int)
+        fr, fc = (rows - r0)[:, None], (cols - c0)[None, :]
+        return ((1 - fr) * (1 - fc) * coarse[r0][:, c0]
+                + fr * (1 - fc) * coarse[r0 + 1][:, c0]
+                + (1 - fr) * fc * coarse[r0][:, c0 + 1]
+                + fr * fc * coarse[r0 + 1][:, c0 + 1])
+
+    base = field(200) + 0.5 * field(40) + 0.25 * field(8)
+    rgb = np.stack([base + 0.3 * field(60) for _ in range(3)], axis=-1)
+    rgb += rng.normal(scale=0.05, size=rgb.shape)
+    rgb = (rgb - rgb.min()) / (rgb.max() - rgb.min())
+    composite = np.empty((size, size, 4), dtype=np.uint8)
+    composite[..., :3] = (rgb * 255).astype(np.uint8)
+    composite[..., 3] = 255
+
+    ndvi = np.tanh(base).astype(np.float32)
+    ndvi[field(30) > 1.6] = np.nan
+    index = index_to_rgba(ndvi, 'RdYlGn')
+    return {'composite': composite, 'index': index}
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    layers = synthetic_layers(size)
+    raw_mb = size * size * 4 / 1e6
+    print(f"{size}x{size} RGBA ({raw_mb:.0f} MB raw), times are best of 3\n")
+    for name, rgba in layers.items():
+        print(f"── {name} " + "─" * 50)
+        print(f"{'format':<11} {'params':<12} {'encode':>8} {'+b64':>7} "
+              f"{'bytes':>10} {'ratio':>6} {'cached':>8}")
+        for fmt, kw in SETTINGS:
+            params = ','.join(f"{k}={v}" for k, v in kw.items())
+            t_enc = best_of(lambda: encoding.encode(rgba, fmt, cache=False, **kw))
+            enc = encoding.encode(rgba, fmt, **kw)
+            t_b64 = best_of(lambda: base64.b64encode(enc.data))
+            t_hit = best_of(lambda: encoding.encode(rgba, fmt, **kw))
+            print(f"{fmt:<11} {params:<12} {t_enc * 1e3:>6.0f}ms "
+                  f"{t_b64 * 1e3:>5.0f}ms {enc.nbytes:>10,d} "
+                  f"{raw_mb * 1e6 / enc.nbytes:>5.1f}x {t_hit * 1e3:>6.1f}ms")
+        print()
+
+
+if __name__ == '__main__':
+    main()
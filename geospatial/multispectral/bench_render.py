@@ -0,0 +1,63 @@
+"""Benchmark: LUT index rendering vs the matplotlib cmap(norm(arr)) path.
+
+    python bench_render.py [size]
+
+Renders a synthetic size×size index (default 4000×4000, ~5% NaN, values
+slightly beyond [-1, 1]) through every INDEX_COLORMAPS entry both ways and
+reports time per render and the largest per-channel difference.
+aviris_analyzer.index_to_rgba is a line-for-line mirror, so the numbers
+apply to the hyperspectral app too.
+"""
+import sys
+import time
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import matplotlib.colors as mcolors
+import matplotlib.pyplot as plt
+import numpy as np
+
+from sentinel_analysis import INDEX_COLORMAPS, index_to_rgba
+
+
+def render_matplotlib(arr: np.ndarray, cmap_name: str) -> np.ndarray:
+    """The pre-LUT implementation, verbatim."""
+    cmap = plt.get_cmap(cmap_name)
+    norm = mcolors.TwoSlopeNorm(vmin=-1, vcenter=0, vmax=1)
+    rgba = (cmap(norm(np.nan_to_num(arr, nan=0.0))) * 255).astype(np.uint8)
+    rgba[..., 3] = (~np.isnan(arr) * 255).astype(np.uint8)
+    return rgba
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    rng = np.random.default_rng(0)
+    arr = rng.uniform(-1.1, 1.1, (size, size)).astype(np.float32)
+    arr[rng.random((size, size)) < 0.05] = np.nan
+    out = np.empty((size, size, 4), dtype=np.uint8)
+
+    print(f"{size}x{size} index, times are best of 3\n")
+    print(f"{'cmap':<8} {'matplotlib':>11} {'LUT':>9} {'LUT+buf':>9} "
+          f"{'speedup':>8} {'max diff':>9}")
+    for name in sorted(set(INDEX_COLORMAPS.values())):
+        ref = render_matplotlib(arr, name)
+        lut = index_to_rgba(arr, name)
+        diff = int(np.abs(ref.astype(np.int16) - lut).max())
+        t_mpl = best_of(lambda: render_matplotlib(arr, name))
+        t_lut = best_of(lambda: index_to_rgba(arr, name))
+        t_buf = best_of(lambda: index_to_rgba(arr, name, out))
+        print(f"{name:<8} {t_mpl * 1e3:>9.0f}ms {t_lut * 1e3:>7.0f}ms "
+              f"{t_buf * 1e3:>7.0f}ms {t_mpl / t_buf:>7.1f}x {diff:>9d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Persistent on-disk cache for Sentinel-2 median composites.
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+A composite is content-addressed by everything that determines its pixels —
+bbox, date range, cloud threshold, resolution, asset list and the STAC item
+IDs that went into it — so a repeat "Load Data" for an AOI computed earlier
+is served from local disk in milliseconds instead of 10-60 s of S3 reads.
+
+Each entry is a directory holding the pixel array as a plain `.npy` file
+(memory-mapped on read, so only the bands/rows that get touched are paged in)
+plus a small JSON sidecar with the band / y / x coordinates. Entries are
+evicted least-recently-used once the cache exceeds its byte budget.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import xarray as xr
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'SENTINEL_CACHE_DIR',
+    str(Path.home() / '.cache' / 'sentinel_analysis' / 'composites'),
+)
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3   # 4 GB
+
+
+def composite_key(bbox: List[float], start: str, end: str, cloud: int,
+                  resolution: float, assets: List[str],
+                  item_ids: List[str], **extra) -> str:
+    """Stable content hash for one composite request. Floats are rounded so
+    the same AOI typed twice doesn't miss on the 15th decimal."""
+    payload = {
+        'bbox':       [round(float(v), 6) for v in bbox],
+        'start':      str(start),
+        'end':        str(end),
+        'cloud':      int(cloud),
+        'resolution': round(float(resolution), 9),
+        'assets':     sorted(assets),
+        'items':      sorted(item_ids),
+        **extra,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode()).hexdigest()[:32]
+
+
+class CompositeCache:
+    """Size-bounded LRU store of composites on local disk.
+
+    Safe to share between threads; writes go to a temp directory and are
+    renamed into place, so a concurrent reader never sees a half-written
+    entry.
+
+    Example
+    -------
+    >>> cache = CompositeCache("/tmp/composites", max_bytes=2 * 1024**3)
+    >>> comp = cache.get(key)            # None on miss
+    >>> cache.put(key, comp)
+    >>> cache.stats()                    # {'hits': .., 'misses': .., ...}
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def get(self, key: str) -> Optional[xr.DataArray]:
+        entry = self.root / key
+        try:
+            with open(entry / 'meta.json') as f:
+                meta = json.load(f)
+            data = np.load(entry / 'data.npy', mmap_mode='r')
+            # Bump recency for LRU eviction. Inside the try: an entry evicted
+            # by another thread/process since the load is just a miss.
+            os.utime(entry, None)
+        except (FileNotFoundError, ValueError, OSError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return xr.DataArray(
+            data,
+            dims=('band', 'y', 'x'),
+            coords={
+                'band': meta['band'],
+                'y':    np.asarray(meta['y'], dtype=float),
+                'x':    np.asarray(meta['x'], dtype=float),
+            },
+        )
+
+    def put(self, key: str, composite: xr.DataArray) -> None:
+        """Write a computed composite (dims band, y, x)."""
+        composite = composite.transpose('band', 'y', 'x')
+        tmp = Path(tempfile.mkdtemp(prefix=f'.{key}.', dir=self.root))
+        try:
+            np.save(tmp / 'data.npy', np.ascontiguousarray(composite.values))
+            meta = {
+                'band':    [str(b) for b in composite.band.values.tolist()],
+                'y':       composite.y.values.tolist(),
+                'x':       composite.x.values.tolist(),
+                'created': time.time(),
+            }
+            with open(tmp / 'meta.json', 'w') as f:
+                json.dump(meta, f)
+            entry = self.root / key
+            with self.lock:
+                if entry.exists():
+                    shutil.rmtree(entry, ignore_errors=True)
+                os.replace(tmp, entry)
+        finally:
+            if tmp.exists():
+                shutil.rmtree(tmp, ignore_errors=True)
+        self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._entries()
+        with self.lock:
+            return {
+                'hits':      self.hits,
+                'misses':    self.misses,
+                'evictions': self.evictions,
+                'entries':   len(entries),
+                'bytes':     sum(size for _, _, size in entries),
+            }
+
+    def clear(self) -> None:
+        with self.lock:
+            for path, _, _ in self._entries():
+                shutil.rmtree(path, ignore_errors=True)
+
+    # ── Internals ────────────────────────────────────────────────────────────
+
+    def _entries(self) -> list:
+        """[(path, last_used, bytes)] for every committed entry."""
+        out = []
+        for p in self.root.iterdir():
+            if p.name.startswith('.') or not p.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in p.iterdir())
+                out.append((p, p.stat().st_mtime, size))
+            except FileNotFoundError:
+                continue   # evicted by another thread/process mid-scan
+        return out
+
+    def _evict(self) -> None:
+        with self.lock:
+            entries = sorted(self._entries(), key=lambda e: e[1])
+            total = sum(size for _, _, size in entries)
+            # Always keep the newest entry, even if it alone is over budget.
+            while total > self.max_bytes and len(entries) > 1:
+                path, _, size = entries.pop(0)
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                self.evictions += 1
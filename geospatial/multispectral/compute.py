@@ -0,0 +1,152 @@
+"""Dask compute configuration for Sentinel-2 compositing.
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+Left to defaults, a composite is whatever stackstac's 1024-px chunks and
+dask's global threaded scheduler make of it: chunk edges ignore the source
+COGs' internal tiling, the worker count is the host's, and peak RAM grows
+with the whole (time, band, y, x) stack. ComputeConfig makes those explicit:
+
+    chunksize     output pixels per spatial chunk. By default a whole number
+                  of COG internal tiles (1024 px at 10 m) at the requested
+                  resolution, so one source tile is fetched by one chunk
+                  instead of being split across 2-4 of them
+    scheduler     'threads' | 'processes' | 'distributed' (a LocalCluster,
+                  needs the `distributed` package)
+    workers       dask workers (default: all cores)
+    memory_limit  bytes or '4GB'; bounds each streamed block, and each
+                  distributed worker's share
+    streaming     reduce over time one spatial block at a time (see
+                  reduce_blocks) so peak RAM ≈ block × timesteps × bands
+
+SentinelAnalyzer reads the SENTINEL_SCHEDULER / SENTINEL_WORKERS /
+SENTINEL_MEMORY_LIMIT / SENTINEL_CHUNK_PX environment variables through
+ComputeConfig.from_env() unless given a config explicitly.
+"""
+
+import math
+import os
+import threading
+from typing import Callable, Dict, Optional, Union
+
+import numpy as np
+import xarray as xr
+from dask.utils import parse_bytes
+
+SCHEDULERS = ('threads', 'processes', 'distributed')
+COG_BLOCK_PX = 1024              # internal tile edge of Earth Search L2A COGs
+NATIVE_RES_M = 10.0              # ...at the 10 m bands (B02/B03/B04/B08)
+METERS_PER_DEGREE = 111_320.0
+MIN_CHUNK_PX = 256               # below this, per-task overhead dominates
+MAX_CHUNK_PX = 2048
+DEFAULT_MEMORY_LIMIT = 2 * 1024 ** 3
+# Peak bytes per (time, band, pixel) sample inside one block's median: the
+# uint16 read, its float32 copy, and the float32 copy the median sorts.
+BYTES_PER_SAMPLE = 10
+
+_clients: Dict[tuple, object] = {}
+_clients_lock = threading.Lock()
+
+
+class ComputeConfig:
+    """How composites are chunked, scheduled and bounded in memory."""
+
+    def __init__(self, scheduler: str = 'threads', workers: Optional[int] = None,
+                 memory_limit: Union[int, str, None] = None,
+                 chunksize: Optional[int] = None, streaming: bool = True):
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler {scheduler!r}; "
+                             f"expected one of {SCHEDULERS}")
+        self.scheduler = scheduler
+        self.workers = int(workers or os.cpu_count() or 1)
+        self.memory_limit = (DEFAULT_MEMORY_LIMIT if memory_limit is None
+                             else parse_bytes(memory_limit))
+        self.chunksize = int(chunksize) if chunksize else None
+        self.streaming = streaming
+
+    @classmethod
+    def from_env(cls) -> 'ComputeConfig':
+        return cls(
+            scheduler=os.environ.get('SENTINEL_SCHEDULER', 'threads'),
+            workers=int(os.environ.get('SENTINEL_WORKERS', 0)) or None,
+            memory_limit=os.environ.get('SENTINEL_MEMORY_LIMIT') or None,
+            chunksize=int(os.environ.get('SENTINEL_CHUNK_PX', 0)) or None,
+        )
+
+    def __repr__(self) -> str:
+        return (f"ComputeConfig(scheduler={self.scheduler!r}, "
+                f"workers={self.workers}, memory_limit={self.memory_limit}, "
+                f"chunksize={self.chunksize}, streaming={self.streaming})")
+
+    def chunks_for(self, resolution: float) -> int:
+        """Spatial chunk edge (output px) for a stack at `resolution` degrees:
+        the explicit chunksize, else a multiple (or even fraction) of the COG
+        block footprint kept within [MIN_CHUNK_PX, MAX_CHUNK_PX]."""
+        if self.chunksize:
+            return self.chunksize
+        footprint = COG_BLOCK_PX * NATIVE_RES_M / (resolution * METERS_PER_DEGREE)
+        if footprint >= MIN_CHUNK_PX:
+            return int(round(footprint / math.ceil(footprint / MAX_CHUNK_PX)))
+        return int(round(footprint * math.ceil(MIN_CHUNK_PX / footprint)))
+
+    def block_px(self, n_time: int, n_band: int, chunk: int) -> int:
+        """Edge of a streamed block: the largest whole number of chunks whose
+        (time, band) samples fit memory_limit — never less than one chunk."""
+        per_px = max(n_time, 1) * max(n_band, 1) * BYTES_PER_SAMPLE
+        side = int(math.sqrt(self.memory_limit / per_px))
+        return max(chunk, side // chunk * chunk)
+
+    def dask_kwargs(self) -> Dict:
+        """Keyword arguments for `.compute()` under this config."""
+        if self.scheduler == 'distributed':
+            return {'scheduler': self.client()}
+        return {'scheduler': self.scheduler, 'num_workers': self.workers}
+
+    def client(self):
+        """Process-wide LocalCluster client for this worker count / memory
+        limit, created on first use. Raises ImportError without distributed."""
+        from dask.distributed import Client, LocalCluster
+
+        key = (self.workers, self.memory_limit)
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None or client.status != 'running':
+                cluster = LocalCluster(
+                    n_workers=self.workers, threads_per_worker=1,
+                    memory_limit=max(self.memory_limit // self.workers, 1),
+                    dashboard_address=None,
+                )
+                client = _clients[key] = Client(cluster, set_as_default=False)
+            return client
+
+
+def reduce_blocks(arr: xr.DataArray,
+                  fn: Callable[[xr.DataArray], xr.DataArray],
+                  config: ComputeConfig) -> xr.DataArray:
+    """Apply a reduction over 'time' (e.g. a median) one spatial block at a
+    time and assemble the in-memory result.
+
+    Blocks are whole multiples of the stack's own y/x chunks sized by
+    config.block_px, so no chunk is read twice and peak RAM is bounded by
+    block × timesteps × bands rather than the full stack. Each block is
+    computed with the configured scheduler, which parallelizes across its
+    (time, band, chunk) tasks.
+    """
+    template = fn(arr)                     # lazy: dims, coords and dtype only
+    out = xr.DataArray(
+        np.empty(template.shape, dtype=template.dtype),
+        dims=template.dims, coords=template.coords, attrs=template.attrs,
+        name=template.name,
+    )
+    chunk = max(max(arr.chunksizes['y']) if arr.chunks else 0,
+                max(arr.chunksizes['x']) if arr.chunks else 0) \
+        or max(arr.sizes['y'], arr.sizes['x'])
+    side = config.block_px(arr.sizes.get('time', 1), arr.sizes.get('band', 1),
+                           chunk)
+    kwargs = config.dask_kwargs()
+    for y0 in range(0, arr.sizes['y'], side):
+        for x0 in range(0, arr.sizes['x'], side):
+            window = {'y': slice(y0, y0 + side), 'x': slice(x0, x0 + side)}
+            block = fn(arr.isel(window)).compute(**kwargs)
+            out[window] = block.transpose(*out.dims).values
+    return out
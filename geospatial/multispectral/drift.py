@@ -10,8 +10,8 @@ requestAnimationFrame component in app.py) pans smoothly across that mosaic;
 Python only pushes a new mosaic when a prefetched tile lands.
 """
 
-import base64
 import io
+import json
 import math
 import random
 import socket
@@ -25,6 +25,11 @@ from typing import Dict, List, Optional, Tuple
 import numpy as np
 from PIL import Image
 
+from encoding import encode
+from fetch_broker import FetchBroker
+from tile_store import tile_key
+from xyz_cache import DEFAULT_XYZ_PATH, XYZCache
+
 BG_RGB = (13, 17, 23)          # matches the app's #0d1117 background
 VIEW_SPAN_FRAC = 0.6           # viewport width as a fraction of tile size
 FRAME_CAP = 300                # rolling frame buffer cap (GIF export)
@@ -45,8 +50,140 @@ EOX_LAYERS = [           # tried in order; first that responds is kept
 EOX_TILE_URL = ("https://tiles.maps.eox.at/wmts/1.0.0/"
                 "{layer}/default/g/{z}/{y}/{x}.jpg")
 EOX_MAX_ZOOM = 14
+EOX_TILE_PX = 256
+EOX_FETCH_WORKERS = 8          # concurrent XYZ requests, shared by all engines
+EOX_TIMEOUT_S = 10
+EOX_PROBE_BACKOFF_S = 30       # no layer responded: don't re-probe before this
 EMPTY_ALPHA_FRAC = 0.25        # tile counts as empty below this valid-pixel frac
 
+# One fetch broker per process: every DriftEngine (every session) shares its
+# workers, and identical in-flight tile specs are fetched once.
+FETCH_BROKER = FetchBroker()
+
+# XYZ sub-tiles of an instant drift tile are fetched concurrently on one
+# bounded pool over one keep-alive connection pool, both shared by every
+# engine so many sessions can't open an unbounded number of sockets to EOX.
+EOX_POOL = ThreadPoolExecutor(max_workers=EOX_FETCH_WORKERS,
+                              thread_name_prefix='eox')
+_eox_session = None
+_eox_session_lock = threading.Lock()
+_eox_layer: Optional[str] = None       # first EOX_LAYERS name that responded
+_eox_probe: Optional[threading.Event] = None   # set when the running probe ends
+_eox_probe_retry_at = 0.0              # monotonic time a failed probe may rerun
+_eox_probe_lock = threading.Lock()     # guards the three above, never held for I/O
+
+# Raw EOX JPEGs by (layer, z, x, y), consulted before any request: adjacent
+# drift tiles share the XYZ tiles along their edges, and every session shares
+# the cache (SENTINEL_XYZ_CACHE= empty keeps it in memory only).
+XYZ_CACHE = XYZCache(DEFAULT_XYZ_PATH)
+_eox_inflight: Dict[tuple, threading.Event] = {}   # XYZ downloads under way
+_eox_inflight_lock = threading.Lock()
+
+
+def eox_session():
+    """Process-wide requests.Session sized to EOX_FETCH_WORKERS."""
+    global _eox_session
+    with _eox_session_lock:
+        if _eox_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2,
+                                  pool_maxsize=EOX_FETCH_WORKERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _eox_session = session
+        return _eox_session
+
+
+def xyz_grid(bbox: List[float], resolution: float):
+    """(z, (x0f, y0f, x1f, y1f), cells) for the EOX tiles covering bbox at the
+    zoom whose ground resolution best matches `resolution`: fractional tile
+    coords of the top-left / bottom-right corners and the (x, y) tiles."""
+    w, s, e, n = bbox
+    z = int(round(math.log2(360.0 / (EOX_TILE_PX * resolution))))
+    z = max(3, min(EOX_MAX_ZOOM, z))
+    x0f, y0f = DriftEngine._merc_frac(n, w, z)   # top-left
+    x1f, y1f = DriftEngine._merc_frac(s, e, z)   # bottom-right
+    cells = [(xt, yt) for yt in range(int(y0f), int(y1f) + 1)
+             for xt in range(int(x0f), int(x1f) + 1) if 0 <= yt < 2 ** z]
+    return z, (x0f, y0f, x1f, y1f), cells
+
+
+def eox_tile(layer: str, z: int, x: int, y: int,
+             cache: Optional[XYZCache] = None) -> Optional[bytes]:
+    """Encoded EOX tile from the cache, else the network (and then cached);
+    None when it can't be fetched. x wraps around the antimeridian. Drift
+    tiles fetched side by side need the same edge tiles at the same moment,
+    so a tile already being downloaded is waited for, not requested again."""
+    x %= 2 ** z
+    cache = XYZ_CACHE if cache is None else cache
+    data = cache.get(layer, z, x, y)
+    if data is not None:
+        return data
+    key = (layer, z, x, y)
+    with _eox_inflight_lock:
+        pending = _eox_inflight.get(key)
+        if pending is None:
+            _eox_inflight[key] = threading.Event()
+    if pending is not None:
+        pending.wait(EOX_TIMEOUT_S)
+        data = cache.get(layer, z, x, y)
+        if data is not None:
+            return data
+        return _eox_download(layer, z, x, y, cache)   # that download failed
+    try:
+        return _eox_download(layer, z, x, y, cache)
+    finally:
+        with _eox_inflight_lock:
+            _eox_inflight.pop(key).set()
+
+
+def _eox_download(layer: str, z: int, x: int, y: int,
+                  cache: XYZCache) -> Optional[bytes]:
+    url = EOX_TILE_URL.format(layer=layer, z=z, y=y, x=x)
+    try:
+        r = eox_session().get(url, timeout=EOX_TIMEOUT_S)
+        r.raise_for_status()
+    except Exception:
+        return None
+    cache.put(layer, z, x, y, r.content)
+    return r.content
+
+
+def eox_layer(z: int, x: int, y: int,
+              cache: Optional[XYZCache] = None) -> Optional[str]:
+    """The EOX layer name in use, probed once per process on tile (z, x, y).
+    Concurrent first callers wait for one probe instead of each trying every
+    name. None if no name responds; that result is remembered and the probe
+    isn't retried for EOX_PROBE_BACKOFF_S, so an outage doesn't cost every
+    drift tile a round of timeouts."""
+    global _eox_layer, _eox_probe, _eox_probe_retry_at
+    with _eox_probe_lock:
+        if _eox_layer is not None:
+            return _eox_layer
+        if time.monotonic() < _eox_probe_retry_at:
+            return None
+        pending = _eox_probe
+        if pending is None:
+            _eox_probe = threading.Event()
+    if pending is not None:
+        pending.wait(EOX_TIMEOUT_S * len(EOX_LAYERS))
+        return _eox_layer
+    layer = None
+    try:
+        layer = next((l for l in EOX_LAYERS
+                      if eox_tile(l, z, x, y, cache) is not None), None)
+    finally:
+        with _eox_probe_lock:
+            _eox_layer = layer
+            if layer is None:
+                _eox_probe_retry_at = time.monotonic() + EOX_PROBE_BACKOFF_S
+            _eox_probe.set()
+            _eox_probe = None
+    return layer
+
 # ~30 visually rich Sentinel-2 targets across continents and biomes.
 DRIFT_SITES: List[Tuple[str, float, float]] = [
     # Reefs / shallow seas
@@ -107,14 +244,25 @@ class DriftEngine:
     """
 
     MAX_TILES = 4  # LRU: current + neighbors + a jump target in flight
+    # Mosaic encoding (see encoding.py): lossy WebP keeps alpha and is ~10x
+    # faster and ~40x smaller than the old level-6 PNG on imagery.
+    MOSAIC_FORMAT = 'webp_lossy'
 
     def __init__(self, radius_deg: float, resolution: float,
                  start: str, end: str, cloud: int,
                  site: Optional[Tuple[str, float, float]] = None,
                  analyzer=None, source: str = 'live',
-                 gap_fill: bool = True):
+                 gap_fill: bool = True, tile_store=None,
+                 broker: Optional[FetchBroker] = None,
+                 xyz_cache: Optional[XYZCache] = None):
         self.source = source  # 'live' (dated S2 from S3) | 'instant' (EOX mosaic)
         self.gap_fill = gap_fill
+        # Optional process-wide tile_store.TileStore: tiles any engine (any
+        # session) rendered before come off local disk instead of S3 / EOX.
+        self.tile_store = tile_store
+        # Raw EOX XYZ tiles for the instant source; the process-wide
+        # XYZ_CACHE unless one is given.
+        self.xyz_cache = xyz_cache if xyz_cache is not None else XYZ_CACHE
         if analyzer is None and source == 'live':
             # Own instance -> background threads never share the UI's client.
             from sentinel_analysis import SentinelAnalyzer
@@ -131,18 +279,15 @@ class DriftEngine:
         self.tiles: "OrderedDict[Tuple[int, int], Dict]" = OrderedDict()
         self.futures: Dict[Tuple[int, int], object] = {}
         self.fetch_started: Dict[Tuple[int, int], float] = {}
+        self.fetch_ids: Dict[Tuple[int, int], str] = {}   # key -> tile_key(spec)
         self.lock = threading.Lock()
-        # Background prefetch (neighbor tiles) and the actively-awaited
-        # current/retry tile use separate pools. Otherwise, on a degraded
-        # connection, several slow prefetches can saturate one shared pool
-        # and starve the tile the user is actually staring at — it would sit
-        # queued behind them and get marked "timed out" before a worker ever
-        # picks it up.
-        self.executor = ThreadPoolExecutor(max_workers=2)
-        # 2 workers: if the in-flight current-tile fetch is genuinely stuck
-        # (not just slow), a user-triggered retry() still gets its own free
-        # worker immediately instead of queuing behind the stuck one forever.
-        self.urgent_executor = ThreadPoolExecutor(max_workers=2)
+        # Fetches go through a broker shared by every engine in the process:
+        # identical tile specs (other sessions, same site) share one fetch,
+        # and the actively-awaited current/retry tile is URGENT, so on a
+        # degraded connection it never sits queued behind slow neighbor
+        # prefetches. Workers held back from background work mean a retry()
+        # still starts immediately while a genuinely stuck fetch lingers.
+        self.broker = broker if broker is not None else FETCH_BROKER
 
         if site is None:
             site = random.choice(DRIFT_SITES)
@@ -161,7 +306,13 @@ class DriftEngine:
         self.max_tiles = self.MAX_TILES
         self.waiting = False            # True while holding at a tile edge
         self.preload_keys: List[Tuple[int, int]] = []
-        self._mosaic_cache = None  # (token, canvas, bounds, b64)
+        self._mosaic_cache = None  # (token, canvas view, bounds, Encoded|None)
+        # Persistent 3x3-tile canvas anchored on the current tile's grid
+        # cell; tiles are pasted once when they arrive (see _mosaic_data).
+        self._canvas: Optional[np.ndarray] = None
+        self._anchor: Optional[Tuple[int, int]] = None
+        self._placed: Dict[Tuple[int, int], Dict] = {}    # key -> pasted tile
+        self._tile_enc: Dict[Tuple[int, int], tuple] = {}  # key -> (tile, Encoded)
 
         self.ensure(self.key_for(self.lat, self.lon), urgent=True)
         self._prefetch_ahead(self.key_for(self.lat, self.lon), force=True)
@@ -179,11 +330,33 @@ class DriftEngine:
 
     # ── Fetching ─────────────────────────────────────────────────────────────
 
+    def tile_spec(self, key: Tuple[int, int]) -> Dict:
+        """Everything that determines a tile's pixels (the TileStore key).
+        The instant basemap ignores dates, clouds and stretch."""
+        spec = {'source': self.source, 'key': list(key),
+                'tile_size': self.tile_size, 'resolution': self.resolution}
+        if self.source == 'live':
+            spec.update(start=self.start, end=self.end, cloud=self.cloud,
+                        gap_fill=self.gap_fill,
+                        stretch=list(self.stretch) if self.stretch else None)
+        return spec
+
     def _fetch(self, key: Tuple[int, int]) -> Dict:
         try:
+            spec = self.tile_spec(key)
+            if self.tile_store is not None:
+                hit = self.tile_store.get(spec)
+                if hit is not None:
+                    if self.source == 'live' and self.stretch is None:
+                        self.stretch = hit['stretch']
+                    return hit
             if self.source == 'instant':
-                return self._fetch_instant(key)
-            return self._fetch_live(key)
+                tile = self._fetch_instant(key)
+            else:
+                tile = self._fetch_live(key)
+            if self.tile_store is not None and not tile.get('empty'):
+                self.tile_store.put(spec, tile)
+            return tile
         except Exception as e:
             return {'empty': True, 'error': f'{type(e).__name__}: {e}'}
 
@@ -205,7 +378,8 @@ class DriftEngine:
         if coverage < EMPTY_ALPHA_FRAC:
             return {'empty': True,
                     'error': 'Mostly nodata / ocean / clouds here'}
-        return {'empty': False, 'rgba': rgba, 'bounds': bounds}
+        return {'empty': False, 'rgba': rgba, 'bounds': bounds,
+                'stretch': result['stretch']}
 
     # ── Instant source (EOX Sentinel-2 cloudless mosaic) ─────────────────────
 
@@ -220,49 +394,39 @@ class DriftEngine:
 
     def _fetch_instant(self, key: Tuple[int, int]) -> Dict:
         """Stitch pre-rendered EOX s2cloudless XYZ tiles covering this drift
-        tile's bbox. Whole-tile latency is ~1-2 s instead of 10-30 s."""
-        import requests
+        tile's bbox. Whole-tile latency is ~1-2 s instead of 10-30 s.
 
+        Sub-tiles come from the XYZ cache when present and are otherwise
+        fetched concurrently on EOX_POOL; each is decoded straight into its
+        slot of one preallocated canvas."""
         w, s, e, n = self.bbox_for(key)
-        # Zoom whose ground resolution best matches self.resolution
-        z = int(round(math.log2(360.0 / (256.0 * self.resolution))))
-        z = max(3, min(EOX_MAX_ZOOM, z))
-
-        x0f, y0f = self._merc_frac(n, w, z)   # top-left
-        x1f, y1f = self._merc_frac(s, e, z)   # bottom-right
+        z, (x0f, y0f, x1f, y1f), cells = xyz_grid([w, s, e, n], self.resolution)
         xt0, yt0 = int(x0f), int(y0f)
         xt1, yt1 = int(x1f), int(y1f)
 
-        n_tiles = 2 ** z
-        stitched = Image.new(
-            'RGB', ((xt1 - xt0 + 1) * 256, (yt1 - yt0 + 1) * 256), BG_RGB
-        )
-        session = requests.Session()
-        # Stick with whichever layer name worked first for this engine.
-        layers = ([self._eox_layer] if getattr(self, '_eox_layer', None)
-                  else list(EOX_LAYERS))
-        got_any = False
-        for xt in range(xt0, xt1 + 1):
-            for yt in range(yt0, yt1 + 1):
-                if not (0 <= yt < n_tiles):
-                    continue
-                for layer in layers:
-                    url = EOX_TILE_URL.format(
-                        layer=layer, z=z, y=yt, x=xt % n_tiles
-                    )
-                    try:
-                        r = session.get(url, timeout=10)
-                        r.raise_for_status()
-                        tile_img = Image.open(io.BytesIO(r.content)).convert('RGB')
-                        stitched.paste(tile_img,
-                                       ((xt - xt0) * 256, (yt - yt0) * 256))
-                        got_any = True
-                        self._eox_layer = layer
-                        layers = [layer]
-                        break
-                    except Exception:
-                        continue  # try next layer name / leave background
-        if not got_any:
+        px = EOX_TILE_PX
+        canvas = np.empty(((yt1 - yt0 + 1) * px, (xt1 - xt0 + 1) * px, 3),
+                          dtype=np.uint8)
+        canvas[:] = BG_RGB
+
+        layer = eox_layer(z, *cells[0], cache=self.xyz_cache)
+
+        def paste(cell: Tuple[int, int]) -> bool:
+            xt, yt = cell
+            data = eox_tile(layer, z, xt, yt, self.xyz_cache)
+            if data is None:
+                return False                          # leave background
+            try:
+                with Image.open(io.BytesIO(data)) as img:
+                    img.draft('RGB', (px, px))       # JPEG: decode as RGB
+                    oy, ox = (yt - yt0) * px, (xt - xt0) * px
+                    canvas[oy:oy + px, ox:ox + px] = np.asarray(
+                        img.convert('RGB'))[:px, :px]
+            except Exception:
+                return False
+            return True
+
+        if layer is None or not any(list(EOX_POOL.map(paste, cells))):
             return {'empty': True,
                     'error': 'Basemap tiles unreachable — check your network '
                              '(tiles.maps.eox.at)'}
@@ -270,13 +434,10 @@ class DriftEngine:
         # Crop the stitched mercator image to the exact bbox. Over a <1° tile
         # the mercator-vs-linear latitude difference is sub-pixel, so a
         # linear crop between the projected corners is visually exact.
-        px0 = (x0f - xt0) * 256.0
-        py0 = (y0f - yt0) * 256.0
-        px1 = (x1f - xt0) * 256.0
-        py1 = (y1f - yt0) * 256.0
-        cropped = stitched.crop((int(px0), int(py0),
-                                 max(int(px0) + 1, int(px1)),
-                                 max(int(py0) + 1, int(py1))))
+        px0, py0 = int((x0f - xt0) * px), int((y0f - yt0) * px)
+        px1, py1 = int((x1f - xt0) * px), int((y1f - yt0) * px)
+        cropped = Image.fromarray(canvas[py0:max(py0 + 1, py1),
+                                         px0:max(px0 + 1, px1)])
         out_w = max(2, int(round((e - w) / self.resolution)))
         out_h = max(2, int(round((n - s) / self.resolution)))
         cropped = cropped.resize((out_w, out_h), Image.LANCZOS)
@@ -287,25 +448,36 @@ class DriftEngine:
         ])
         return {'empty': False, 'rgba': rgba, 'bounds': [s, w, n, e]}
 
-    def ensure(self, key: Tuple[int, int], urgent: bool = False) -> None:
+    def ensure(self, key: Tuple[int, int], urgent: bool = False,
+               fresh: bool = False) -> None:
         """Request a tile fetch if not cached and not already in flight.
-        urgent=True (current-position / retry tiles) uses a dedicated pool so
-        it's never queued behind background neighbor prefetches."""
+        urgent=True (current-position / retry tiles) is served before any
+        engine's background neighbor prefetches. fresh=True never joins an
+        already in-flight fetch of the same spec."""
         with self.lock:
             if key in self.tiles or key in self.futures:
                 return
-            pool = self.urgent_executor if urgent else self.executor
-            self.futures[key] = pool.submit(self._fetch, key)
+            spec_id = tile_key(self.tile_spec(key))
+            self.futures[key] = self.broker.submit(
+                spec_id, self._fetch, key, urgent=urgent, fresh=fresh)
+            self.fetch_ids[key] = spec_id
             self.fetch_started[key] = time.time()
 
     def retry(self, key: Tuple[int, int]) -> None:
         """Clear a failed/timed-out tile and re-fetch it from scratch."""
         with self.lock:
             self.tiles.pop(key, None)
-            self.futures.pop(key, None)
-            self.fetch_started.pop(key, None)
+            self._release(key)
         self._mosaic_cache = None
-        self.ensure(key, urgent=True)
+        self.ensure(key, urgent=True, fresh=True)
+
+    def _release(self, key: Tuple[int, int]) -> None:
+        """Stop waiting on a fetch (call with self.lock held)."""
+        fut = self.futures.pop(key, None)
+        spec_id = self.fetch_ids.pop(key, None)
+        self.fetch_started.pop(key, None)
+        if fut is not None and spec_id is not None:
+            self.broker.release(spec_id, fut)
 
     def poll(self) -> bool:
         """Collect finished fetches into the LRU cache, and give up on any
@@ -320,10 +492,15 @@ class DriftEngine:
             for k in done:
                 f = self.futures.pop(k)
                 self.fetch_started.pop(k, None)
+                self.fetch_ids.pop(k, None)
                 try:
                     self.tiles[k] = f.result()
                 except Exception as e:
                     self.tiles[k] = {'empty': True, 'error': f'{type(e).__name__}: {e}'}
+                # A fetch shared with another engine brings that engine's
+                # stretch; adopt it so this session's tiles match.
+                if self.stretch is None and self.tiles[k].get('stretch'):
+                    self.stretch = self.tiles[k]['stretch']
                 self.tiles.move_to_end(k)
                 arrived = True
             stalled = [
@@ -331,8 +508,7 @@ class DriftEngine:
                 if not f.done() and now - self.fetch_started.get(k, now) > FETCH_TIMEOUT_S
             ]
             for k in stalled:
-                self.futures.pop(k)  # stop waiting; thread may linger, harmless
-                self.fetch_started.pop(k, None)
+                self._release(k)  # stop waiting; thread may linger, harmless
                 self.tiles[k] = {
                     'empty': True,
                     'error': f'Timed out after {FETCH_TIMEOUT_S}s — check your '
@@ -528,50 +704,162 @@ class DriftEngine:
     # ── Mosaic / viewport ────────────────────────────────────────────────────
 
     def _mosaic_data(self):
-        """Stitch cached tiles adjacent to the current tile into one RGBA
-        canvas. Cached until the tile set changes."""
+        """Cached tiles adjacent to the current tile as one RGBA canvas:
+        (token, canvas, (S, W, N, E), Encoded or None until first asked for).
+
+        The canvas persists across calls. It covers the 3x3 grid cells around
+        an anchor tile; newly arrived tiles are pasted into their cell, evicted
+        or replaced ones cleared, and when the current tile changes the pixels
+        shift by whole cells instead of being re-stitched. The returned canvas
+        is a view cropped to the loaded tiles."""
         key = self.key_for(self.lat, self.lon)
         tx, ty = key
         with self.lock:
-            sel = [(k, t) for k, t in self.tiles.items()
+            sel = {k: t for k, t in self.tiles.items()
                    if abs(k[0] - tx) <= 1 and abs(k[1] - ty) <= 1
-                   and not t.get('empty')]
+                   and not t.get('empty')}
         if not sel:
             return None
-        token = tuple(sorted(k for k, _ in sel))
+        token = (key, tuple(sorted((k, id(t)) for k, t in sel.items())))
         if self._mosaic_cache is not None and self._mosaic_cache[0] == token:
             return self._mosaic_cache
 
+        self._update_canvas(key, sel)
         res = self.resolution
-        S = min(t['bounds'][0] for _, t in sel)
-        W = min(t['bounds'][1] for _, t in sel)
-        N = max(t['bounds'][2] for _, t in sel)
-        E = max(t['bounds'][3] for _, t in sel)
-        Wpx = int(round((E - W) / res)) + 1
-        Hpx = int(round((N - S) / res)) + 1
-        canvas = np.zeros((Hpx, Wpx, 4), dtype=np.uint8)
-        for _, t in sel:
-            _, tw, tn, _ = t['bounds']
-            arr = t['rgba']
-            row0 = max(0, int(round((N - tn) / res)))
-            col0 = max(0, int(round((tw - W) / res)))
-            r1 = min(row0 + arr.shape[0], Hpx)
-            c1 = min(col0 + arr.shape[1], Wpx)
-            if r1 > row0 and c1 > col0:
-                canvas[row0:r1, col0:c1] = arr[:r1 - row0, :c1 - col0]
-
-        buf = io.BytesIO()
-        Image.fromarray(canvas, 'RGBA').save(buf, format='PNG')
-        b64 = base64.b64encode(buf.getvalue()).decode()
-        self._mosaic_cache = (token, canvas, (S, W, N, E), b64)
+        S = min(t['bounds'][0] for t in sel.values())
+        W = min(t['bounds'][1] for t in sel.values())
+        N = max(t['bounds'][2] for t in sel.values())
+        E = max(t['bounds'][3] for t in sel.values())
+        row0, col0 = self._canvas_offset(N, W)
+        view = self._canvas[max(row0, 0):row0 + int(round((N - S) / res)) + 1,
+                            max(col0, 0):col0 + int(round((E - W) / res)) + 1]
+        self._mosaic_cache = (token, view, (S, W, N, E), None)
         return self._mosaic_cache
 
+    def _canvas_offset(self, north: float, west: float) -> Tuple[int, int]:
+        """(row, col) of a (north, west) corner on the anchored canvas."""
+        ax, ay = self._anchor
+        return (int(round(((ay + 2) * self.tile_size - north) / self.resolution)),
+                int(round((west - (ax - 1) * self.tile_size) / self.resolution)))
+
+    def _update_canvas(self, key: Tuple[int, int],
+                       sel: Dict[Tuple[int, int], Dict]) -> None:
+        """Bring the persistent canvas in line with `sel` around `key`."""
+        cell_f = self.tile_size / self.resolution
+        cell = int(round(cell_f))
+        side = 3 * cell + 1
+        if self._canvas is None or self._canvas.shape[0] != side:
+            self._canvas = np.zeros((side, side, 4), dtype=np.uint8)
+            self._anchor, self._placed = key, {}
+        elif key != self._anchor:
+            dx = key[0] - self._anchor[0]
+            dy = self._anchor[1] - key[1]              # rows grow southward
+            if max(abs(dx), abs(dy)) > 2 or abs(cell_f - cell) > 1e-6:
+                self._canvas[:] = 0                    # nothing reusable
+                self._placed = {}
+            else:
+                self._shift_canvas(dx * cell, dy * cell)
+                self._placed = {k: t for k, t in self._placed.items()
+                                if abs(k[0] - key[0]) <= 1
+                                and abs(k[1] - key[1]) <= 1}
+            self._anchor = key
+
+        gone = [k for k, t in self._placed.items() if sel.get(k) is not t]
+        for k in gone:
+            del self._placed[k]
+            w, s, e, n = self.bbox_for(k)
+            r0, c0 = self._canvas_offset(n, w)
+            self._canvas[max(r0, 0):r0 + cell + 1, max(c0, 0):c0 + cell + 1] = 0
+        # A cleared cell may have taken a neighbor's one-pixel overlap with it.
+        repaste = [k for k in self._placed
+                   if any(abs(k[0] - g[0]) <= 1 and abs(k[1] - g[1]) <= 1
+                          for g in gone)]
+        for k in repaste + [k for k in sel if k not in self._placed]:
+            self._paste(sel[k])
+            self._placed[k] = sel[k]
+
+    def _shift_canvas(self, dx: int, dy: int) -> None:
+        """Move canvas pixels (dx, dy) cells' worth of pixels west / north,
+        i.e. re-anchor east / south by that many pixels; clear what's vacated."""
+        c = self._canvas
+        h, w = c.shape[:2]
+        src_r, dst_r = (slice(dy, h), slice(0, h - dy)) if dy >= 0 else \
+            (slice(0, h + dy), slice(-dy, h))
+        src_c, dst_c = (slice(dx, w), slice(0, w - dx)) if dx >= 0 else \
+            (slice(0, w + dx), slice(-dx, w))
+        c[dst_r, dst_c] = c[src_r, src_c].copy()
+        if dy > 0:
+            c[h - dy:] = 0
+        elif dy < 0:
+            c[:-dy] = 0
+        if dx > 0:
+            c[:, w - dx:] = 0
+        elif dx < 0:
+            c[:, :-dx] = 0
+
+    def _paste(self, tile: Dict) -> None:
+        _, tw, tn, _ = tile['bounds']
+        arr = tile['rgba']
+        row0, col0 = self._canvas_offset(tn, tw)
+        hpx, wpx = self._canvas.shape[:2]
+        r0, c0 = max(row0, 0), max(col0, 0)
+        r1 = min(row0 + arr.shape[0], hpx)
+        c1 = min(col0 + arr.shape[1], wpx)
+        if r1 > r0 and c1 > c0:
+            self._canvas[r0:r1, c0:c1] = arr[r0 - row0:r1 - row0,
+                                             c0 - col0:c1 - col0]
+
+    def _mosaic_encoded(self):
+        """(Encoded, bounds) of the whole mosaic, encoded once per tile set."""
+        data = self._mosaic_data()
+        if data is None:
+            return None
+        token, view, bounds, enc = data
+        if enc is None:
+            # Already cached per tile set, so skip encoding's hash-keyed LRU
+            enc = encode(view, self.MOSAIC_FORMAT, cache=False)
+            self._mosaic_cache = (token, view, bounds, enc)
+        return enc, bounds
+
     def mosaic_b64(self) -> Optional[Tuple[str, Tuple[float, float, float, float]]]:
+        """(base64 payload in MOSAIC_FORMAT, (S, W, N, E)) or None."""
+        data = self._mosaic_encoded()
+        if data is None:
+            return None
+        enc, bounds = data
+        return enc.b64(), bounds
+
+    def mosaic_uri(self) -> Optional[Tuple[str, Tuple[float, float, float, float]]]:
+        """Like mosaic_b64 but a complete `data:` URI, MIME type included."""
+        data = self._mosaic_encoded()
+        if data is None:
+            return None
+        enc, bounds = data
+        return enc.data_uri(), bounds
+
+    def mosaic_tiles(self):
+        """([(data URI, (S, W, N, E)) per tile], mosaic (S, W, N, E)) or None.
+
+        The per-tile alternative to mosaic_uri for drift_component_html: each
+        tile is encoded once when it arrives, so a new neighbor costs one
+        tile's encode instead of re-encoding the whole 3x3 mosaic."""
         data = self._mosaic_data()
         if data is None:
             return None
-        _, _, bounds, b64 = data
-        return b64, bounds
+        _, token_tiles = data[0]
+        out = []
+        for k, _ in token_tiles:
+            tile = self._placed[k]
+            cached = self._tile_enc.get(k)
+            if cached is None or cached[0] is not tile:
+                cached = (tile, encode(tile['rgba'], self.MOSAIC_FORMAT,
+                                       cache=False))
+                self._tile_enc[k] = cached
+            s, w, n, e = tile['bounds']
+            out.append((cached[1].data_uri(), (s, w, n, e)))
+        for k in [k for k in self._tile_enc if k not in self._placed]:
+            del self._tile_enc[k]
+        return out, data[2]
 
     def viewport_jpeg(self, size: Tuple[int, int] = (512, 384)) -> Optional[bytes]:
         """Crop the current viewport out of the mosaic -> JPEG bytes."""
@@ -613,15 +901,58 @@ class DriftEngine:
         return buf.getvalue()
 
     def shutdown(self) -> None:
-        for pool in (self.executor, self.urgent_executor):
-            try:
-                pool.shutdown(wait=False, cancel_futures=True)
-            except TypeError:  # Python < 3.9
-                pool.shutdown(wait=False)
+        """Release every pending fetch; queued ones no other engine wants
+        are dropped by the broker."""
+        with self.lock:
+            for k in list(self.futures):
+                self._release(k)
 
 
 # ── Export helpers ────────────────────────────────────────────────────────────
 
+def seed_xyz_cache(radius_deg: float, resolution: float,
+                   sites: Optional[List[Tuple[str, float, float]]] = None,
+                   ring: int = 1, cache: Optional[XYZCache] = None,
+                   progress=None) -> Dict[str, int]:
+    """Pre-warm the XYZ cache with every EOX tile under the (2*ring+1)^2
+    drift tiles around each site (default: all DRIFT_SITES), at the zoom an
+    instant engine with this radius / resolution would use. Tiles shared by
+    neighbouring drift tiles are requested once. progress(done, total) is
+    called as tiles land."""
+    cache = XYZ_CACHE if cache is None else cache
+    tile_size = 2.0 * radius_deg
+    wanted = OrderedDict()
+    for _, lat, lon in (DRIFT_SITES if sites is None else sites):
+        tx, ty = math.floor(lon / tile_size), math.floor(lat / tile_size)
+        for dx in range(-ring, ring + 1):
+            for dy in range(-ring, ring + 1):
+                bbox = [(tx + dx) * tile_size, (ty + dy) * tile_size,
+                        (tx + dx + 1) * tile_size, (ty + dy + 1) * tile_size]
+                z, _, cells = xyz_grid(bbox, resolution)
+                for x, y in cells:
+                    wanted[(z, x % 2 ** z, y)] = None
+    stats = {'tiles': len(wanted), 'cached': 0, 'fetched': 0, 'failed': 0}
+    if not wanted:
+        return stats
+    layer = eox_layer(*next(iter(wanted)), cache=cache)
+    if layer is None:
+        stats['failed'] = len(wanted)
+        return stats
+    lock = threading.Lock()
+
+    def seed(tile):
+        hit = cache.get(layer, *tile) is not None
+        ok = hit or eox_tile(layer, *tile, cache=cache) is not None
+        with lock:
+            stats['cached' if hit else 'fetched' if ok else 'failed'] += 1
+            done = stats['cached'] + stats['fetched'] + stats['failed']
+        if progress is not None:
+            progress(done, len(wanted))
+
+    list(EOX_POOL.map(seed, wanted))
+    return stats
+
+
 def build_gif_bytes(jpeg_frames: List[bytes], fps: int) -> bytes:
     """Assemble buffered JPEG frames into an animated GIF (PIL), mirroring the
     Timelapse tab's save call."""
@@ -658,7 +989,7 @@ def build_mp4_bytes(jpeg_frames: List[bytes], fps: int) -> bytes:
 
 # ── Client-side pan component ────────────────────────────────────────────────
 
-def drift_component_html(mosaic_b64: str,
+def drift_component_html(mosaic,
                          bounds: Tuple[float, float, float, float],
                          lat: float, lon: float,
                          speed: float, heading: float,
@@ -668,8 +999,17 @@ def drift_component_html(mosaic_b64: str,
     """Canvas + requestAnimationFrame pan across the mosaic. The client
     extrapolates the same motion model Python uses, so panning stays smooth
     between Streamlit reruns; each rerun rebases it on the authoritative
-    position (and a fresh mosaic when a prefetched tile has landed)."""
+    position (and a fresh mosaic when a prefetched tile has landed).
+
+    `mosaic` is the tile list from DriftEngine.mosaic_tiles — drawn tile by
+    tile at their own bounds — or one image covering `bounds`: a `data:` URI
+    (DriftEngine.mosaic_uri) or a bare base64 PNG."""
     S, W, N, E = bounds
+    if isinstance(mosaic, str):
+        src = mosaic if mosaic.startswith('data:') else f"data:image/png;base64,{mosaic}"
+        mosaic = [(src, bounds)]
+    tiles_js = json.dumps([{'src': src, 'S': b[0], 'W': b[1], 'N': b[2], 'E': b[3]}
+                           for src, b in mosaic])
     span_x = tile_size * VIEW_SPAN_FRAC
     speed_js = speed if running else 0.0
     return f"""
@@ -688,7 +1028,7 @@ def drift_component_html(mosaic_b64: str,
 (function() {{
   const cv = document.getElementById('driftcv');
   const ctx = cv.getContext('2d');
-  const img = new Image();
+  const tiles = {tiles_js};
   const Wd = {W}, Nd = {N}, Ed = {E}, Sd = {S};
   const lat0 = {lat}, lon0 = {lon};
   const speed = {speed_js};
@@ -703,26 +1043,35 @@ def drift_component_html(mosaic_b64: str,
     if (t0 === null) t0 = ts;
     const t = (ts - t0) / 1000.0;
     const lat = lat0 + vLat * t, lon = lon0 + vLon * t;
-    const ppdX = img.width / (Ed - Wd);
-    const ppdY = img.height / (Nd - Sd);
-    let cx = (lon - Wd) * ppdX, cy = (Nd - lat) * ppdY;
-    const sw = spanX * ppdX, sh = spanY * ppdY;
     // Clamp: never pan the viewport past the mosaic edge (no black bands).
     // If the mosaic is smaller than the viewport in an axis, center on it.
-    cx = (img.width  > sw) ? Math.min(Math.max(cx, sw / 2), img.width  - sw / 2)
-                           : img.width  / 2;
-    cy = (img.height > sh) ? Math.min(Math.max(cy, sh / 2), img.height - sh / 2)
-                           : img.height / 2;
+    const cLon = (Ed - Wd > spanX)
+      ? Math.min(Math.max(lon, Wd + spanX / 2), Ed - spanX / 2) : (Wd + Ed) / 2;
+    const cLat = (Nd - Sd > spanY)
+      ? Math.min(Math.max(lat, Sd + spanY / 2), Nd - spanY / 2) : (Sd + Nd) / 2;
+    const vw = cLon - spanX / 2, vn = cLat + spanY / 2;
+    const sx = cv.width / spanX, sy = cv.height / spanY;
     ctx.fillStyle = '#0d1117';
     ctx.fillRect(0, 0, cv.width, cv.height);
     ctx.imageSmoothingEnabled = true;
-    ctx.drawImage(img, cx - sw / 2, cy - sh / 2, sw, sh,
-                  0, 0, cv.width, cv.height);
+    for (const tl of tiles) {{
+      // Snap to whole device pixels so adjacent tiles meet without seams.
+      const x0 = Math.floor((tl.W - vw) * sx), x1 = Math.ceil((tl.E - vw) * sx);
+      const y0 = Math.floor((vn - tl.N) * sy), y1 = Math.ceil((vn - tl.S) * sy);
+      if (x1 > 0 && y1 > 0 && x0 < cv.width && y0 < cv.height)
+        ctx.drawImage(tl.img, x0, y0, x1 - x0, y1 - y0);
+    }}
     posEl.textContent = lat.toFixed(3) + '\\u00b0, ' + lon.toFixed(3) + '\\u00b0';
     if (speed > 0) requestAnimationFrame(draw);
   }}
-  img.onload = function() {{ requestAnimationFrame(draw); }};
-  img.src = 'data:image/png;base64,{mosaic_b64}';
+  let pending = tiles.length;
+  for (const tl of tiles) {{
+    tl.img = new Image();
+    tl.img.onload = tl.img.onerror = function() {{
+      if (--pending === 0) requestAnimationFrame(draw);
+    }};
+    tl.img.src = tl.src;
+  }}
 }})();
 </script>
 """
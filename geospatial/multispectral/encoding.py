@@ -0,0 +1,189 @@
+"""Image encoders for rendered RGBA layers.
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+Every map overlay, drift mosaic and XYZ tile ends up as an (H, W, 4) uint8
+array that has to be compressed before the browser sees it, and PIL's PNG at
+its default zlib level 6 was a large share of per-rerun latency. encode()
+makes the format and effort explicit:
+
+    'png'         lossless; `level` is the zlib level 0-9 (default PNG_LEVEL,
+                  ~3-5x faster than 6 for a few % more bytes on imagery)
+    'webp'        lossless WebP; `level` is the encoder method 0-6
+    'webp_lossy'  lossy WebP with alpha; `quality` 0-100
+    'jpeg'        lossy JPEG of the RGB channels; the alpha channel, unless
+                  fully opaque, comes back separately as an 8-bit PNG mask
+
+Results are cached in a byte-bounded LRU keyed on a BLAKE2 hash of the
+pixels plus the encode parameters, so re-encoding the same layer on a
+Streamlit rerun costs one hash pass. Callers that can take bytes (tile
+responses, st.image, downloads) use Encoded.data directly; only callers that
+must inline the image in HTML pay for base64 via Encoded.data_uri().
+
+Example
+-------
+>>> enc = encode(rgba, 'webp_lossy', quality=80)
+>>> folium.raster_layers.ImageOverlay(image=enc.data_uri(), bounds=b)
+"""
+
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+FORMATS = ('png', 'webp', 'webp_lossy', 'jpeg')
+MIME_TYPES = {
+    'png':        'image/png',
+    'webp':       'image/webp',
+    'webp_lossy': 'image/webp',
+    'jpeg':       'image/jpeg',
+}
+PNG_LEVEL = 1              # zlib level; PIL's default is 6
+WEBP_METHOD = 0            # lossless WebP effort (0 fastest … 6 smallest)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+ENCODE_CACHE_BYTES = 64 * 1024 ** 2
+
+
+class Encoded(NamedTuple):
+    """Encoded image bytes. `alpha` is only set for JPEG with transparency."""
+    data: bytes
+    mime: str
+    alpha: Optional[bytes] = None
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + len(self.alpha or b'')
+
+    def b64(self) -> str:
+        return base64.b64encode(self.data).decode()
+
+    def data_uri(self) -> str:
+        return f"data:{self.mime};base64,{self.b64()}"
+
+    def alpha_uri(self) -> Optional[str]:
+        if self.alpha is None:
+            return None
+        return "data:image/png;base64," + base64.b64encode(self.alpha).decode()
+
+
+class _EncodeCache:
+    """Thread-safe LRU of Encoded results bounded by total payload bytes."""
+
+    def __init__(self, max_bytes: int = ENCODE_CACHE_BYTES):
+        self.max_bytes = int(max_bytes)
+        self.entries: "OrderedDict[bytes, Encoded]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[Encoded]:
+        with self.lock:
+            enc = self.entries.get(key)
+            if enc is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return enc
+
+    def put(self, key: bytes, enc: Encoded) -> None:
+        if enc.nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = enc
+            self.bytes += enc.nbytes
+            while self.bytes > self.max_bytes:
+                _, old = self.entries.popitem(last=False)
+                self.bytes -= old.nbytes
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.hits = self.misses = 0
+
+
+_cache = _EncodeCache()
+
+
+def _cache_key(rgba: np.ndarray, params: tuple) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((rgba.shape, rgba.dtype.str, params)).encode())
+    h.update(memoryview(np.ascontiguousarray(rgba)).cast('B'))
+    return h.digest()
+
+
+def _save(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def _encode(rgba: np.ndarray, fmt: str, level: Optional[int],
+            quality: Optional[int]) -> Encoded:
+    img = Image.fromarray(rgba, 'RGBA')
+    if fmt == 'png':
+        data = _save(img, 'PNG', compress_level=PNG_LEVEL if level is None else level)
+    elif fmt == 'webp':
+        data = _save(img, 'WEBP', lossless=True,
+                     method=WEBP_METHOD if level is None else level)
+    elif fmt == 'webp_lossy':
+        data = _save(img, 'WEBP', quality=WEBP_QUALITY if quality is None else quality,
+                     method=4 if level is None else level)
+    else:
+        data = _save(img.convert('RGB'), 'JPEG',
+                     quality=JPEG_QUALITY if quality is None else quality)
+        alpha = rgba[..., 3]
+        if not (alpha == 255).all():
+            mask = _save(Image.fromarray(np.ascontiguousarray(alpha), 'L'),
+                         'PNG', compress_level=PNG_LEVEL)
+            return Encoded(data, MIME_TYPES[fmt], mask)
+    return Encoded(data, MIME_TYPES[fmt])
+
+
+def encode(rgba: np.ndarray, fmt: str = 'png', level: Optional[int] = None,
+           quality: Optional[int] = None, cache: bool = True) -> Encoded:
+    """Encode an (H, W, 4) uint8 array. `level` is the PNG zlib level or the
+    WebP method; `quality` applies to the lossy formats. cache=False skips
+    the LRU for callers that keep their own (e.g. the tile server)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
+    rgba = np.asarray(rgba)
+    if rgba.dtype != np.uint8 or rgba.ndim != 3 or rgba.shape[2] != 4:
+        raise ValueError(f"Expected an (H, W, 4) uint8 array, got "
+                         f"{rgba.shape} {rgba.dtype}")
+    if not cache:
+        return _encode(rgba, fmt, level, quality)
+    key = _cache_key(rgba, (fmt, level, quality))
+    enc = _cache.get(key)
+    if enc is None:
+        enc = _encode(rgba, fmt, level, quality)
+        _cache.put(key, enc)
+    return enc
+
+
+def to_data_uri(rgba: np.ndarray, fmt: str = 'png', **kwargs) -> str:
+    """`data:` URI for a single-image format (JPEG's alpha can't ride along
+    in one URI — use encode() and Encoded.alpha_uri() for that)."""
+    if fmt == 'jpeg':
+        raise ValueError("JPEG carries alpha separately; use encode()")
+    return encode(rgba, fmt, **kwargs).data_uri()
+
+
+def cache_stats() -> Dict[str, int]:
+    with _cache.lock:
+        return {'hits': _cache.hits, 'misses': _cache.misses,
+                'entries': len(_cache.entries), 'bytes': _cache.bytes}
+
+
+def clear_cache() -> None:
+    _cache.clear()
@@ -0,0 +1,175 @@
+"""Process-wide broker for Drift tile fetches.
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+Every DriftEngine used to own two thread pools and deduplicate only against
+its own in-flight fetches, so ten sessions drifting from the same DRIFT_SITES
+entry ran ten identical drift_tile pipelines. All engines now submit to one
+FetchBroker:
+
+- Requests are keyed on the full tile spec (tile_store.tile_key), and every
+  requester of an in-flight spec gets the same Future, so upstream S3 / EOX
+  load scales with unique tiles rather than users.
+- A fixed set of worker threads bounds concurrency globally.
+- Two priority classes: URGENT (the tile a user is staring at, retries)
+  always dequeues before BACKGROUND (neighbour prefetch, preload), and
+  `urgent_reserve` workers are kept free of background work so an urgent
+  fetch never queues behind a wall of slow prefetches. A queued background
+  job is promoted when someone asks for it urgently.
+- Requesters release() what they no longer need; a queued job nobody is
+  waiting on is dropped before it ever runs.
+
+Workers are daemon threads: a fetch hung on a dead socket is abandoned by
+its engine (see DriftEngine.poll) and never blocks interpreter exit.
+"""
+
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+URGENT = 0
+BACKGROUND = 1
+DEFAULT_WORKERS = 8
+DEFAULT_URGENT_RESERVE = 2
+
+
+class _Job:
+    __slots__ = ('key', 'fn', 'args', 'future', 'priority', 'waiters', 'state')
+
+    def __init__(self, key: str, fn: Callable, args: tuple, priority: int):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.future: Future = Future()
+        self.priority = priority
+        self.waiters = 1
+        self.state = 'queued'        # queued | running | done | dropped
+
+
+class FetchBroker:
+    """Deduplicating, globally bounded, two-class priority executor.
+
+    Example
+    -------
+    >>> broker = FetchBroker(max_workers=8)
+    >>> fut = broker.submit(spec_key, engine._fetch, key, urgent=True)
+    >>> broker.release(spec_key, fut)    # no longer interested
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS,
+                 urgent_reserve: int = DEFAULT_URGENT_RESERVE):
+        self.max_workers = max(1, int(max_workers))
+        # Background work may occupy at most this many workers.
+        self.background_limit = max(1, self.max_workers - int(urgent_reserve))
+        self.inflight: Dict[str, _Job] = {}
+        self._queue: List[tuple] = []          # (priority, seq, job)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self.running = {URGENT: 0, BACKGROUND: 0}
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.dropped = 0
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def submit(self, key: str, fn: Callable, *args, urgent: bool = False,
+               fresh: bool = False) -> Future:
+        """Future for fn(*args) under `key`. Joins an in-flight job with the
+        same key unless fresh=True (a retry after a stall), which starts a
+        new job that later requesters join instead."""
+        priority = URGENT if urgent else BACKGROUND
+        with self._cond:
+            self._start_workers()
+            job = self.inflight.get(key)
+            if job is not None and not fresh and job.state in ('queued', 'running'):
+                job.waiters += 1
+                self.coalesced += 1
+                if priority < job.priority and job.state == 'queued':
+                    job.priority = priority
+                    heapq.heappush(self._queue, (priority, next(self._seq), job))
+                    self._cond.notify()
+                return job.future
+            job = _Job(key, fn, args, priority)
+            self.inflight[key] = job
+            self.submitted += 1
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            self._cond.notify()
+            return job.future
+
+    def release(self, key: str, future: Future) -> None:
+        """Drop one requester's interest; a queued job nobody waits on any
+        more never runs."""
+        with self._cond:
+            job = self.inflight.get(key)
+            if job is None or job.future is not future:
+                return
+            job.waiters -= 1
+            if job.waiters <= 0 and job.state == 'queued':
+                job.state = 'dropped'
+                job.future.cancel()
+                del self.inflight[key]
+                self.dropped += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'completed': self.completed,
+                'dropped':   self.dropped,
+                'running':   self.running[URGENT] + self.running[BACKGROUND],
+                'queued':    sum(j.state == 'queued' for j in self.inflight.values()),
+            }
+
+    # ── Internals ────────────────────────────────────────────────────────────
+
+    def _start_workers(self) -> None:
+        """Spawn the worker threads on first use (call with the lock held)."""
+        if self._threads:
+            return
+        for i in range(self.max_workers):
+            t = threading.Thread(target=self._work, daemon=True,
+                                 name=f'drift-fetch-{i}')
+            t.start()
+            self._threads.append(t)
+
+    def _next_job(self) -> Optional[_Job]:
+        """Pop the best runnable job, or None (call with the lock held)."""
+        while self._queue:
+            priority, _, job = self._queue[0]
+            if job.state != 'queued' or priority != job.priority:
+                heapq.heappop(self._queue)     # stale: dropped or promoted
+                continue
+            if priority == BACKGROUND and \
+                    self.running[BACKGROUND] >= self.background_limit:
+                return None                    # nothing urgent is queued
+            heapq.heappop(self._queue)
+            return job
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                job.state = 'running'
+                priority = job.priority
+                self.running[priority] += 1
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn(*job.args))
+                except BaseException as e:
+                    job.future.set_exception(e)
+            with self._cond:
+                job.state = 'done'
+                self.running[priority] -= 1
+                self.completed += 1
+                if self.inflight.get(job.key) is job:
+                    del self.inflight[job.key]
+                self._cond.notify_all()
@@ -0,0 +1,155 @@
+"""Memoized STAC search layer shared by every SentinelAnalyzer in the process.
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+The Spectral / Timelapse / Wildfire tabs and every Drift tile all call
+SentinelAnalyzer.search independently, and each earth-search round-trip costs
+0.5-3 s. This layer sits in front of it and:
+
+- normalizes keys (bbox rounded to 1e-6 deg, cloud as int) so near-identical
+  requests share an entry,
+- expires entries after a TTL so new acquisitions eventually show up,
+- answers a query whose bbox lies inside an already-cached larger bbox (same
+  dates, equal-or-looser cloud threshold) by filtering that result locally —
+  on each item's footprint geometry and cloud cover, the same tests the STAC
+  API applies, so a warm answer matches a cold search,
+- collapses concurrent identical searches — e.g. Drift's background prefetch
+  threads — into a single in-flight request whose result every caller shares.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from shapely.geometry import box, shape
+
+SEARCH_TTL_S = 15 * 60
+MAX_ENTRIES = 256
+
+Key = Tuple[Tuple[float, float, float, float], str, str, int]
+
+
+def search_key(bbox: List[float], start: str, end: str, cloud_pct: int) -> Key:
+    return (tuple(round(float(v), 6) for v in bbox), str(start), str(end),
+            int(cloud_pct))
+
+
+def _contains(outer, inner) -> bool:
+    return (outer[0] <= inner[0] and outer[1] <= inner[1]
+            and outer[2] >= inner[2] and outer[3] >= inner[3])
+
+
+def _intersects(item, bbox) -> bool:
+    """Does the item's footprint touch bbox? Tested on its geometry, as the
+    STAC API's intersects is (a swath-edge or diagonal footprint can miss
+    a query its bbox overlaps); the item bbox only when there's no geometry."""
+    geometry = getattr(item, 'geometry', None)
+    if geometry:
+        return shape(geometry).intersects(box(*bbox))
+    item_bbox = getattr(item, 'bbox', None)
+    if not item_bbox:
+        return True   # no footprint to test against — keep it
+    w, s, e, n = item_bbox[:4] if len(item_bbox) == 4 else (
+        item_bbox[0], item_bbox[1], item_bbox[3], item_bbox[4])
+    return not (w > bbox[2] or e < bbox[0] or s > bbox[3] or n < bbox[1])
+
+
+class SearchCache:
+    """TTL-bounded, thread-safe cache of STAC search results.
+
+    Example
+    -------
+    >>> cache = SearchCache(ttl_s=600)
+    >>> items = cache.search(bbox, "2023-06-01", "2023-09-30", 25, fetch)
+    where fetch(bbox, start, end, cloud_pct) performs the real search.
+    """
+
+    def __init__(self, ttl_s: float = SEARCH_TTL_S,
+                 max_entries: int = MAX_ENTRIES):
+        self.ttl_s = float(ttl_s)
+        self.max_entries = int(max_entries)
+        self.entries: "OrderedDict[Key, Tuple[float, list]]" = OrderedDict()
+        self.inflight: Dict[Key, Future] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.subset_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def search(self, bbox: List[float], start: str, end: str, cloud_pct: int,
+               fetch: Callable[..., list]) -> list:
+        key = search_key(bbox, start, end, cloud_pct)
+        with self.lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+            fut = self.inflight.get(key)
+            if fut is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                fut = Future()
+                self.inflight[key] = fut
+                self.misses += 1
+                leader = True
+        if not leader:
+            return list(fut.result())
+
+        try:
+            items = list(fetch(bbox, start, end, cloud_pct))
+        except BaseException as e:
+            with self.lock:
+                self.inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        with self.lock:
+            self.entries[key] = (time.time(), items)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.inflight.pop(key, None)
+        fut.set_result(items)
+        return list(items)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'hits':        self.hits,
+                'subset_hits': self.subset_hits,
+                'coalesced':   self.coalesced,
+                'misses':      self.misses,
+                'entries':     len(self.entries),
+            }
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    # ── Internals (call with self.lock held) ─────────────────────────────────
+
+    def _lookup(self, key: Key) -> Optional[list]:
+        now = time.time()
+        for k in [k for k, (t, _) in self.entries.items()
+                  if now - t > self.ttl_s]:
+            del self.entries[k]
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(self.entries[key][1])
+
+        bbox, start, end, cloud = key
+        for (cb, cs, ce, cc), (_, items) in reversed(self.entries.items()):
+            if cs != start or ce != end or cc < cloud or not _contains(cb, bbox):
+                continue
+            self.subset_hits += 1
+            # Items without eo:cloud_cover fail the server-side "lt" filter
+            return [
+                it for it in items
+                if _intersects(it, bbox)
+                and it.properties.get('eo:cloud_cover') is not None
+                and it.properties['eo:cloud_cover'] < cloud
+            ]
+        return None
@@ -0,0 +1,40 @@
+"""Pre-warm the Drift instant-source XYZ cache for every DRIFT_SITES entry.
+
+    python seed_xyz_cache.py [radius_deg] [resolution] [ring]
+
+Downloads every EOX s2cloudless tile under the (2*ring+1)^2 drift tiles
+around each curated site (defaults: the app's 0.15° radius, 0.001°/px and
+the 3×3 neighbourhood) into the SQLite file at SENTINEL_XYZ_CACHE, so a
+drift that starts at any site never waits on the network. Tiles already in
+the cache are skipped; re-run with each resolution you serve.
+"""
+import sys
+import time
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+from drift import DRIFT_SITES, XYZ_CACHE, seed_xyz_cache
+
+
+def main():
+    radius = float(sys.argv[1]) if len(sys.argv) > 1 else 0.15
+    resolution = float(sys.argv[2]) if len(sys.argv) > 2 else 0.001
+    ring = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    print(f"Seeding {len(DRIFT_SITES)} sites, radius {radius}°, "
+          f"{resolution}°/px, {2 * ring + 1}x{2 * ring + 1} tiles each "
+          f"-> {XYZ_CACHE.path or '(memory only)'}")
+
+    def progress(done, total):
+        if done % 50 == 0 or done == total:
+            print(f"\r  {done}/{total} tiles", end='', flush=True)
+
+    t0 = time.perf_counter()
+    stats = seed_xyz_cache(radius, resolution, ring=ring, progress=progress)
+    print(f"\n{stats['fetched']} fetched, {stats['cached']} already cached, "
+          f"{stats['failed']} failed in {time.perf_counter() - t0:.0f}s")
+    st = XYZ_CACHE.stats()
+    print(f"cache: {st['disk_entries']} tiles, {st['disk_bytes'] / 1e6:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
-import io
 import os
-import base64
-from typing import Dict, List, Optional, Tuple
+import re
+import functools
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 # GDAL/rasterio (used under the hood by stackstac for the actual S3 reads
 # during .compute()) has no timeout by default — a stalled/black-holed
@@ -14,6 +17,8 @@ os.environ.setdefault('GDAL_HTTP_CONNECTTIMEOUT', '10')
 os.environ.setdefault('GDAL_HTTP_MAX_RETRY', '2')
 os.environ.setdefault('GDAL_HTTP_RETRY_DELAY', '1')
 
+import dask
+import dask.array as da
 import numpy as np
 import requests
 import xarray as xr
@@ -23,9 +28,25 @@ import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 from PIL import Image
 
+try:
+    import numexpr
+except ImportError:  # listed in requirements; without it the index engine
+    numexpr = None     # runs the precompiled NumPy formulas in NUMPY_FORMULAS
+
+from composite_cache import CompositeCache, composite_key
+from compute import ComputeConfig, reduce_blocks
+from encoding import encode, to_data_uri
+from search_cache import SearchCache
+
 STAC_URL  = "https://earth-search.aws.element84.com/v1"
 COLLECTION = "sentinel-2-l2a"
 
+# Compact stacks keep L2A digital numbers as uint16 (SCL classes fit too) and
+# mark missing pixels with NODATA instead of NaN — 4x smaller than float64.
+# DN 0 is already the L2A nodata value, and SCL class 0 means "No Data".
+COMPACT_DTYPE = 'uint16'
+NODATA = 0
+
 # STAC common-name → center wavelength (nm)
 SPECTRAL_ASSETS: Dict[str, int] = {
     'coastal':  443,
@@ -68,16 +89,79 @@ INDEX_COLORMAPS: Dict[str, str] = {
     'NBR2':  'RdYlGn',
 }
 
+# Index → formula over STAC common-name bands. (a, b) tuples are normalized
+# differences (a − b) / (a + b); strings are evaluated by numexpr.
+INDEX_FORMULAS: Dict[str, object] = {
+    'NDVI':  ('nir', 'red'),
+    'NDWI':  ('green', 'nir'),         # McFeeters 1996
+    'EVI':   '2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1)',
+    'SAVI':  '1.5 * (nir - red) / (nir + red + 0.5)',
+    'NBR':   ('nir', 'swir22'),
+    'NDMI':  ('nir', 'swir16'),
+    'GNDVI': ('nir', 'green'),
+    'NDRE':  ('nir', 'rededge1'),
+    'NDSI':  ('green', 'swir16'),
+    'NDBI':  ('swir16', 'nir'),
+    'MNDWI': ('green', 'swir16'),
+    'NBR2':  ('swir16', 'swir22'),     # USGS NBR2
+}
+# NumPy equivalents of the string formulas, used when numexpr isn't
+# installed. Keyed by the formula text, so an edited INDEX_FORMULAS entry
+# never silently runs a stale callable — it needs numexpr instead.
+NUMPY_FORMULAS: Dict[str, Callable[[Dict[str, np.ndarray]], np.ndarray]] = {
+    INDEX_FORMULAS['EVI']: lambda b: 2.5 * (b['nir'] - b['red'])
+        / (b['nir'] + 6 * b['red'] - 7.5 * b['blue'] + 1),
+    INDEX_FORMULAS['SAVI']: lambda b: 1.5 * (b['nir'] - b['red'])
+        / (b['nir'] + b['red'] + 0.5),
+}
+# SCL classes masked as unusable: cloud shadow, cloud medium / high
+# probability, thin cirrus. Class 0 (no data) is unusable too.
+CLOUD_CLASSES = (3, 8, 9, 10)
+# Scenes with less usable (clear, valid) area than this are dropped before
+# any spectral band is read — see load_clear_stack.
+MIN_CLEAR_FRAC = 0.02
+
+TIMELAPSE_ASSETS = ['red', 'green', 'blue', 'scl']
+
+INDEX_BLOCK_ROWS = 256   # rows per fused pass — keeps temporaries in cache
+INDEX_MEMO_SIZE  = 4     # composites whose computed indices are kept
+
+# One search cache per process: the UI analyzer and every Drift engine's own
+# analyzer share results and coalesce identical in-flight searches.
+SEARCH_CACHE = SearchCache()
+
 
 class SentinelAnalyzer:
-    def __init__(self):
+    def __init__(self, cache: Optional[CompositeCache] = None,
+                 search_cache: Optional[SearchCache] = SEARCH_CACHE,
+                 compact: bool = True,
+                 compute: Optional[ComputeConfig] = None):
         # timeout guards against a silently stalled connection hanging forever
         # (connect timeout, read timeout) in seconds.
         self.catalog = pystac_client.Client.open(STAC_URL, timeout=(10, 20))
+        # On-disk composite cache shared by load_composite(); None disables.
+        self.cache = cache
+        self.search_cache = search_cache
+        # uint16 + NODATA stacks/composites by default; float64 + NaN if False.
+        self.compact = compact
+        # Chunking / scheduler / memory bound for every dask compute below.
+        self.compute_config = compute or ComputeConfig.from_env()
+        # Read-skipping stats of the last load_clear_stack call (for the UI).
+        self.last_pushdown: Optional[Dict[str, int]] = None
+        # id(composite) -> (weakref, {index name: array}); see compute_indices
+        self._index_memo: "OrderedDict[int, Tuple[weakref.ref, Dict]]" = OrderedDict()
+        self._memo_lock = threading.Lock()
 
     def search(self, bbox: List[float], start_date: str,
                end_date: str, cloud_pct: int = 30) -> list:
         """bbox = [west, south, east, north]"""
+        if self.search_cache is None:
+            return self._search(bbox, start_date, end_date, cloud_pct)
+        return self.search_cache.search(bbox, start_date, end_date, cloud_pct,
+                                        self._search)
+
+    def _search(self, bbox: List[float], start_date: str,
+                end_date: str, cloud_pct: int) -> list:
         return list(
             self.catalog.search(
                 collections=[COLLECTION],
@@ -89,82 +173,253 @@ class SentinelAnalyzer:
 
     def load_stack(self, items: list, bbox: List[float],
                    resolution: float = 0.001,
-                   assets: Optional[List[str]] = None) -> xr.DataArray:
+                   assets: Optional[List[str]] = None,
+                   compact: Optional[bool] = None) -> xr.DataArray:
         """
         Lazy-load bands into an xarray stack in WGS-84.
         resolution in degrees — 0.001° ≈ 111 m at equator.
         assets: subset of bands to load (default: all 12 spectral + scl).
         Loading only what you need is a large speedup — e.g. RGB tiles for
         the Drift tab load 4 assets instead of 13.
+        compact: uint16 DNs with NODATA fill (default: self.compact) instead
+        of float64 with NaN fill.
+        Spatial chunks follow self.compute_config.chunks_for(resolution).
         """
         if assets is None:
             assets = list(SPECTRAL_ASSETS.keys()) + ['scl']
+        if self.compact if compact is None else compact:
+            dtype, fill_value = COMPACT_DTYPE, NODATA
+        else:
+            dtype, fill_value = 'float64', np.nan
         return stackstac.stack(
             items,
             assets=assets,
             bounds_latlon=bbox,
             epsg=4326,
             resolution=resolution,
-            dtype='float64',
+            dtype=dtype,
+            fill_value=fill_value,
             rescale=False,
+            chunksize=self.compute_config.chunks_for(resolution),
         )
 
-    def cloud_mask(self, stack: xr.DataArray) -> xr.DataArray:
+    def cloud_mask(self, stack: xr.DataArray,
+                   scl: Optional[xr.DataArray] = None) -> xr.DataArray:
         """Mask clouds / shadows using SCL band (values 3, 8, 9, 10).
-        Works with any subset of spectral bands (as long as scl is loaded)."""
-        scl  = stack.sel(band='scl')
-        bad  = (scl == 3) | (scl == 8) | (scl == 9) | (scl == 10)
+        Works with any subset of spectral bands (as long as scl is loaded),
+        or with a separately loaded (time, y, x) `scl` on the same grid."""
+        if scl is None:
+            scl = stack.sel(band='scl')
+        bad  = scl.isin(CLOUD_CLASSES)
         spec_bands = [b for b in stack.band.values.tolist() if b != 'scl']
         spec = stack.sel(band=spec_bands)
+        if _is_compact(spec):
+            return spec.where(~bad, NODATA)
         return spec.where(~bad)
 
+    def load_clear_stack(self, items: list, bbox: List[float],
+                         resolution: float = 0.001,
+                         assets: Optional[List[str]] = None,
+                         min_clear: float = MIN_CLEAR_FRAC) -> xr.DataArray:
+        """
+        Cloud-masked spectral stack, equivalent to
+        cloud_mask(load_stack(items, bbox, resolution, assets + ['scl'])) but
+        read in two phases so masked-out pixels mostly never leave S3:
+
+        1. SCL alone is read (one 20 m band) and kept in memory as uint8.
+           From it come per-scene and per-(scene, chunk) usable fractions.
+        2. Scenes under `min_clear` usable area are dropped, then the
+           spectral stack is built for the rest with every (scene, chunk)
+           that is entirely cloud / shadow / nodata replaced by a constant
+           block — dask culls those reads from the graph.
+
+        Stats land in self.last_pushdown.
+        """
+        if assets is None:
+            assets = list(SPECTRAL_ASSETS.keys())
+        spec_assets = [a for a in assets if a != 'scl']
+        kwargs = self.compute_config.dask_kwargs()
+
+        scl = self.load_stack(items, bbox, resolution, assets=['scl'],
+                              compact=True).sel(band='scl')
+        scl = scl.astype('uint8').persist(**kwargs)
+        usable = ~scl.isin(CLOUD_CLASSES) & (scl != NODATA)
+        scene_frac, block_frac = dask.compute(
+            usable.mean(dim=('y', 'x')).data, _block_fractions(usable.data),
+            **kwargs)
+
+        keep = np.flatnonzero(scene_frac >= min_clear)
+        if keep.size == 0:
+            keep = np.array([int(np.argmax(scene_frac))])
+        by_id = {it.id: it for it in items}
+        kept_ids = scl.id.values[keep].tolist() if 'id' in scl.coords else None
+        kept_items = ([by_id[i] for i in kept_ids] if kept_ids
+                      else [items[i] for i in keep])
+        scl = scl.isel(time=keep)
+        block_frac = block_frac[keep]
+
+        spec = self.load_stack(kept_items, bbox, resolution, assets=spec_assets)
+        skipped = 0
+        if spec.chunks is not None and spec.chunks[2:] == scl.chunks[1:]:
+            spec, skipped = _skip_blocks(spec, block_frac == 0)
+        scl = scl.assign_coords(time=spec.time.values)
+        self.last_pushdown = {
+            'scenes':         len(items),
+            'scenes_read':    int(keep.size),
+            'blocks':         int(spec.data.npartitions),
+            'blocks_skipped': int(skipped),
+        }
+        return self.cloud_mask(spec, scl=scl)
+
     def median_composite(self, stack: xr.DataArray) -> xr.DataArray:
-        """Time-median composite. Triggers S3 download via Dask."""
-        return stack.median(dim='time', skipna=True).compute()
+        """Time-median composite. Triggers S3 download via Dask.
+        Compact stacks are converted to float32 chunk-by-chunk for the median
+        and come back as uint16 with NODATA where no clear pixel existed.
+        With a streaming compute config (the default) spatial blocks are
+        reduced one at a time, so peak RAM is bounded by the config's
+        memory_limit instead of the full stack."""
+        def median(block):
+            if not _is_compact(block):
+                return block.median(dim='time', skipna=True)
+            med = _as_float(block).median(dim='time', skipna=True)
+            return med.fillna(NODATA).round().astype(block.dtype)
+
+        cfg = self.compute_config
+        if cfg.streaming:
+            return reduce_blocks(stack, median, cfg)
+        return median(stack).compute(**cfg.dask_kwargs())
+
+    def load_composite(self, items: list, bbox: List[float],
+                       start: str, end: str, cloud: int,
+                       resolution: float = 0.001,
+                       assets: Optional[List[str]] = None,
+                       min_clear: float = MIN_CLEAR_FRAC) -> xr.DataArray:
+        """
+        Full load_stack -> cloud_mask -> median_composite pipeline, served
+        from self.cache when the same bbox / dates / cloud / resolution /
+        assets / STAC items / min_clear were composited before.
+        """
+        if assets is None:
+            assets = list(SPECTRAL_ASSETS.keys()) + ['scl']
+        key = composite_key(bbox, start, end, cloud, resolution, assets,
+                            [it.id for it in items], compact=self.compact,
+                            min_clear=round(float(min_clear), 6))
+        if self.cache is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                hit.attrs['composite_key'] = key
+                return hit
+        if 'scl' in assets:
+            masked = self.load_clear_stack(items, bbox, resolution, assets,
+                                           min_clear=min_clear)
+        else:
+            masked = self.load_stack(items, bbox, resolution, assets=assets)
+        composite = self.median_composite(masked)
+        if self.cache is not None:
+            self.cache.put(key, composite)
+        # Content address for downstream caches (e.g. tile_server tokens)
+        composite.attrs['composite_key'] = key
+        return composite
 
     # ── Rendering ─────────────────────────────────────────────────────────────
 
     def render_rgb(self, composite: xr.DataArray,
-                   p_low: float = 2, p_high: float = 98
+                   p_low: float = 2, p_high: float = 98,
+                   stretch: Optional[Tuple[float, float]] = None
                    ) -> Tuple[np.ndarray, List[float]]:
+        """True-colour RGBA. `stretch` is a fixed (lo, hi) reflectance range
+        (see rgb_stretch) instead of this composite's own percentiles."""
         rgb = np.stack([
-            composite.sel(band='red').values,
-            composite.sel(band='green').values,
-            composite.sel(band='blue').values,
+            _band(composite, 'red'),
+            _band(composite, 'green'),
+            _band(composite, 'blue'),
         ], axis=-1) / 10000.0
 
-        valid_px = rgb[~np.isnan(rgb)]
-        lo, hi = np.nanpercentile(valid_px, (p_low, p_high))
+        lo, hi = stretch or self.rgb_stretch(composite, p_low, p_high)
         rgb = np.clip((rgb - lo) / (hi - lo + 1e-8), 0, 1)
 
         alpha = (~np.any(np.isnan(rgb), axis=-1) * 255).astype(np.uint8)
         rgba  = np.dstack([(rgb * 255).astype(np.uint8), alpha])
         return rgba, self._bounds(composite)
 
-    def render_index(self, composite: xr.DataArray,
-                     index_name: str) -> Tuple[np.ndarray, List[float]]:
+    def rgb_stretch(self, composite: xr.DataArray,
+                    p_low: float = 2, p_high: float = 98) -> Tuple[float, float]:
+        """(lo, hi) reflectance percentiles render_rgb stretches with."""
+        rgb = np.stack([_band(composite, b) for b in ('red', 'green', 'blue')],
+                       axis=-1) / 10000.0
+        lo, hi = np.nanpercentile(rgb[~np.isnan(rgb)], (p_low, p_high))
+        return float(lo), float(hi)
+
+    def render_index(self, composite: xr.DataArray, index_name: str,
+                     out: Optional[np.ndarray] = None
+                     ) -> Tuple[np.ndarray, List[float]]:
+        """Colour an index via its precomputed LUT. `out` is an optional
+        preallocated (H, W, 4) uint8 buffer to render into."""
         arr  = self._compute_index(composite, index_name)
-        cmap = plt.get_cmap(INDEX_COLORMAPS.get(index_name, 'RdYlGn'))
-        norm = mcolors.TwoSlopeNorm(vmin=-1, vcenter=0, vmax=1)
-        rgba = (cmap(norm(np.nan_to_num(arr, nan=0.0))) * 255).astype(np.uint8)
-        rgba[..., 3] = (~np.isnan(arr) * 255).astype(np.uint8)
+        rgba = index_to_rgba(arr, INDEX_COLORMAPS.get(index_name, 'RdYlGn'), out)
         return rgba, self._bounds(composite)
 
+    def compute_indices(self, composite: xr.DataArray,
+                        names: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Evaluate several spectral indices in one pass over the composite.
+        Each band any of them needs is extracted once as float32, then all
+        formulas run together over row blocks. Results are memoized per
+        composite (returned read-only), so switching layers or rendering all
+        INDEX_COLORMAPS entries for a report never recomputes.
+        """
+        for name in names:
+            if name not in INDEX_FORMULAS:
+                raise ValueError(f"Unknown index: {name}")
+        memo = self._memo_for(composite)
+        todo = [n for n in dict.fromkeys(names) if n not in memo]
+        if todo:
+            needed = sorted({b for n in todo for b in _formula_bands(n)})
+            bands  = {b: _band(composite, b) for b in needed}
+            shape  = next(iter(bands.values())).shape
+            fns    = {n: _formula_fn(n) for n in todo}
+            out    = {n: np.empty(shape, dtype=np.float32) for n in todo}
+            for r0 in range(0, shape[0], INDEX_BLOCK_ROWS):
+                rows = slice(r0, r0 + INDEX_BLOCK_ROWS)
+                block = {b: v[rows] for b, v in bands.items()}
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    for n, fn in fns.items():
+                        out[n][rows] = fn(block)
+            for n, arr in out.items():
+                arr.flags.writeable = False
+                memo[n] = arr
+        return {n: memo[n] for n in names}
+
     def render_timelapse(self, items: list, bbox: List[float],
                          resolution: float = 0.002) -> List[Image.Image]:
         """Render one RGB frame per calendar month. Returns PIL images."""
-        stack   = self.load_stack(items, bbox, resolution=resolution)
-        masked  = self.cloud_mask(stack)
-        monthly = masked.resample(time='1MS').median(skipna=True).compute()
-
-        frames = []
-        for t in monthly.time.values:
-            comp = monthly.sel(time=t)
-            if np.all(np.isnan(comp.values)):
+        return [frame for _, frame in
+                self.iter_timelapse(items, bbox, resolution=resolution)]
+
+    def iter_timelapse(self, items: list, bbox: List[float],
+                       resolution: float = 0.002,
+                       stretch: Optional[Tuple[float, float]] = None
+                       ) -> Iterator[Tuple[str, Image.Image]]:
+        """
+        Yield ('YYYY-MM', RGB frame) per calendar month as each completes,
+        so the UI can preview while later months are still loading.
+        Each month is its own red/green/blue/scl load (cloud pushdown
+        included) and median, so memory holds one month at a time. Fully
+        cloudy months are skipped. All frames share one stretch — `stretch`
+        or the first frame's percentiles — so brightness doesn't flicker.
+        """
+        for month, month_items in group_by_month(items).items():
+            masked = self.load_clear_stack(month_items, bbox, resolution,
+                                           assets=TIMELAPSE_ASSETS)
+            comp = self.median_composite(masked)
+            valid = (comp.values != NODATA) if _is_compact(comp) \
+                else ~np.isnan(comp.values)
+            if not valid.any():
                 continue
-            rgba, _ = self.render_rgb(comp)
-            frames.append(Image.fromarray(rgba, 'RGBA').convert('RGB'))
-        return frames
+            if stretch is None:
+                stretch = self.rgb_stretch(comp)
+            rgba, _ = self.render_rgb(comp, stretch=stretch)
+            yield month, Image.fromarray(rgba, 'RGBA').convert('RGB')
 
     def drift_tile(
         self,
@@ -196,17 +451,17 @@ class SentinelAnalyzer:
 
         stack  = self.load_stack(items, bbox, resolution,
                                  assets=['red', 'green', 'blue', 'scl'])
-        masked = self.cloud_mask(stack)
+        masked = _as_float(self.cloud_mask(stack))
         comp   = masked.median(dim='time', skipna=True)
         if gap_fill:
-            raw  = stack.sel(band=['red', 'green', 'blue']).median(
+            raw  = _as_float(stack.sel(band=['red', 'green', 'blue'])).median(
                 dim='time', skipna=True
             )
             comp = comp.fillna(raw)
-        comp = comp.compute()
+        comp = comp.compute(**self.compute_config.dask_kwargs())
 
         rgb = np.stack(
-            [comp.sel(band=b).values for b in ('red', 'green', 'blue')],
+            [_band(comp, b) for b in ('red', 'green', 'blue')],
             axis=-1,
         )
         valid = ~np.any(np.isnan(rgb), axis=-1)
@@ -230,12 +485,13 @@ class SentinelAnalyzer:
     def get_spectra(self, lat: float, lon: float,
                     composite: xr.DataArray) -> Optional[Dict[str, float]]:
         pt = composite.sel(y=lat, x=lon, method='nearest')
-        return {
-            band: float(pt.sel(band=band).values) / 10000.0
-            for band in SPECTRAL_ASSETS
-            if band in pt.band.values
-            and not np.isnan(float(pt.sel(band=band).values))
-        } or None
+        spectra = {}
+        for band in SPECTRAL_ASSETS:
+            if band in pt.band.values:
+                v = float(_band(pt, band))
+                if not np.isnan(v):
+                    spectra[band] = v / 10000.0
+        return spectra or None
 
     # ── Burn Scar Analysis ────────────────────────────────────────────────────
 
@@ -252,8 +508,7 @@ class SentinelAnalyzer:
         dNBR = NBR_pre − NBR_post  (positive values indicate burn).
         """
         def _nbr_composite(items):
-            stack    = self.load_stack(items, bbox, resolution)
-            masked   = self.cloud_mask(stack)
+            masked   = self.load_clear_stack(items, bbox, resolution)
             comp     = self.median_composite(masked)
             return comp, self._compute_index(comp, 'NBR')
 
@@ -294,29 +549,22 @@ class SentinelAnalyzer:
     # ── Internal helpers ──────────────────────────────────────────────────────
 
     def _compute_index(self, composite: xr.DataArray, name: str) -> np.ndarray:
-        def b(band):
-            return composite.sel(band=band).values.astype(float)
-
-        def nd(a, bnd):
-            x, y = b(a), b(bnd)
-            return np.where((x + y) == 0, np.nan, (x - y) / (x + y))
-
-        nir, red, green = b('nir'), b('red'), b('green')
-        blue, s16, s22  = b('blue'), b('swir16'), b('swir22')
-
-        if   name == 'NDVI':  return nd('nir', 'red')
-        elif name == 'NDWI':  return nd('green', 'nir')      # McFeeters 1996
-        elif name == 'EVI':   return 2.5 * (nir - red) / (nir + 6*red - 7.5*blue + 1)
-        elif name == 'SAVI':  return 1.5 * (nir - red) / (nir + red + 0.5)
-        elif name == 'NBR':   return nd('nir', 'swir22')
-        elif name == 'NDMI':  return nd('nir', 'swir16')
-        elif name == 'GNDVI': return nd('nir', 'green')
-        elif name == 'NDRE':  return nd('nir', 'rededge1')
-        elif name == 'NDSI':  return nd('green', 'swir16')
-        elif name == 'NDBI':  return nd('swir16', 'nir')
-        elif name == 'MNDWI': return nd('green', 'swir16')
-        elif name == 'NBR2':  return nd('swir16', 'swir22')  # USGS NBR2
-        else: raise ValueError(f"Unknown index: {name}")
+        return self.compute_indices(composite, [name])[name]
+
+    def _memo_for(self, composite: xr.DataArray) -> Dict[str, np.ndarray]:
+        """Per-composite index memo. Keyed by identity (DataArrays aren't
+        hashable) and validated through a weakref so a recycled id() never
+        serves another composite's indices."""
+        with self._memo_lock:
+            entry = self._index_memo.get(id(composite))
+            if entry is not None and entry[0]() is composite:
+                self._index_memo.move_to_end(id(composite))
+                return entry[1]
+            memo: Dict[str, np.ndarray] = {}
+            self._index_memo[id(composite)] = (weakref.ref(composite), memo)
+            while len(self._index_memo) > INDEX_MEMO_SIZE:
+                self._index_memo.popitem(last=False)
+            return memo
 
     def _classify_severity(self, dnbr: np.ndarray) -> np.ndarray:
         out = np.full(dnbr.shape, -1, dtype=np.int8)
@@ -332,6 +580,160 @@ class SentinelAnalyzer:
         ]
 
 
+# ── Colormap lookup tables ──────────────────────────────────────────────────
+
+LUT_BINS = 1024   # index values in [-1, 1] are quantized to this many colours
+
+
+@functools.lru_cache(maxsize=None)
+def colormap_lut(cmap_name: str) -> np.ndarray:
+    """(LUT_BINS, 4) uint8 RGBA table sampling a colormap over [-1, 1] —
+    the same mapping as TwoSlopeNorm(-1, 0, 1), computed once per cmap."""
+    cmap = plt.get_cmap(cmap_name)
+    lut = (cmap(np.linspace(0.0, 1.0, LUT_BINS)) * 255).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+def index_to_rgba(arr: np.ndarray, cmap_name: str,
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Colour an index array through its LUT: quantize to LUT_BINS bins over
+    [-1, 1] (out-of-range values clamp to the ends, NaN → transparent) and
+    gather RGBA rows straight into `out` (allocated if None). Avoids the
+    float64 H×W×4 intermediate of cmap(norm(arr)).
+    """
+    lut = colormap_lut(cmap_name)
+    if out is None:
+        out = np.empty((*arr.shape, 4), dtype=np.uint8)
+    half = (LUT_BINS - 1) / 2.0
+    scaled = np.multiply(arr, half, dtype=np.float32)
+    np.add(scaled, half + 0.5, out=scaled)           # +0.5 → round on cast
+    nodata = np.isnan(scaled)
+    scaled[nodata] = half + 0.5                      # NaN draws as 0 (masked)
+    np.clip(scaled, 0, LUT_BINS - 1, out=scaled)
+    np.take(lut, scaled.astype(np.int16), axis=0, out=out)
+    out[..., 3][nodata] = 0
+    return out
+
+
+# ── Timelapse helpers ───────────────────────────────────────────────────────
+
+def group_by_month(items: list) -> "OrderedDict[str, list]":
+    """STAC items bucketed by acquisition month ('YYYY-MM'), in order."""
+    months: Dict[str, list] = {}
+    for it in items:
+        dt = getattr(it, 'datetime', None) or it.properties.get('datetime')
+        months.setdefault(str(dt)[:7], []).append(it)
+    return OrderedDict(sorted(months.items()))
+
+
+# ── Cloud-mask pushdown helpers ─────────────────────────────────────────────
+
+def _block_fractions(usable: da.Array) -> da.Array:
+    """(time, ny_chunks, nx_chunks) mean of a boolean (time, y, x) array
+    over each of its spatial chunks."""
+    ny, nx = len(usable.chunks[1]), len(usable.chunks[2])
+    return usable.map_blocks(
+        lambda b: b.mean(axis=(1, 2), keepdims=True, dtype=np.float32),
+        chunks=(usable.chunks[0], (1,) * ny, (1,) * nx), dtype=np.float32,
+    )
+
+
+def _skip_blocks(spec: xr.DataArray, skip: np.ndarray) -> Tuple[xr.DataArray, int]:
+    """Swap the (time, band, y, x) blocks whose scenes are all marked in
+    `skip` (time, ny_chunks, nx_chunks) for constant fill blocks. Returns
+    the new stack and how many blocks no longer read anything."""
+    if not skip.any():
+        return spec, 0
+    fill = NODATA if _is_compact(spec) else np.nan
+    t_edges = np.cumsum((0,) + spec.chunks[0])
+    blocks = spec.data.blocks
+    nested, skipped = [], 0
+    for ti in range(len(spec.chunks[0])):
+        t_skip = skip[t_edges[ti]:t_edges[ti + 1]].all(axis=0)
+        per_band = []
+        for bi in range(len(spec.chunks[1])):
+            rows = []
+            for yi in range(len(spec.chunks[2])):
+                row = []
+                for xi in range(len(spec.chunks[3])):
+                    if t_skip[yi, xi]:
+                        shape = (spec.chunks[0][ti], spec.chunks[1][bi],
+                                 spec.chunks[2][yi], spec.chunks[3][xi])
+                        row.append(da.full(shape, fill, dtype=spec.dtype))
+                        skipped += 1
+                    else:
+                        row.append(blocks[ti, bi, yi, xi])
+                rows.append(row)
+            per_band.append(rows)
+        nested.append(per_band)
+    return spec.copy(data=da.block(nested)), skipped
+
+
+# ── dtype helpers ───────────────────────────────────────────────────────────
+
+def _is_compact(arr: xr.DataArray) -> bool:
+    """True for integer (uint16 + NODATA) stacks/composites."""
+    return np.issubdtype(arr.dtype, np.integer)
+
+
+def _as_float(arr: xr.DataArray) -> xr.DataArray:
+    """Lazy float32 view with NODATA -> NaN, so reductions can skipna.
+    Float inputs pass through untouched."""
+    if not _is_compact(arr):
+        return arr
+    return arr.astype(np.float32).where(arr != NODATA)
+
+
+def _band(composite: xr.DataArray, band: str) -> np.ndarray:
+    """One band's values as float32 with missing pixels as NaN, whatever
+    the storage dtype. This is the only place compact DNs become floats."""
+    vals = composite.sel(band=band).values
+    out = vals.astype(np.float32)
+    if _is_compact(composite):
+        out[vals == NODATA] = np.nan
+    return out
+
+
+def _formula_bands(name: str) -> List[str]:
+    f = INDEX_FORMULAS[name]
+    if isinstance(f, tuple):
+        return list(f)
+    return [b for b in SPECTRAL_ASSETS if b in re.findall(r'[a-z]\w*', f)]
+
+
+def _formula_expr(name: str) -> str:
+    f = INDEX_FORMULAS[name]
+    if isinstance(f, tuple):
+        a, b = f
+        return f"where({a} + {b} == 0, nan, ({a} - {b}) / ({a} + {b}))"
+    return f
+
+
+def _formula_fn(name: str) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+    """Block evaluator for an index: numexpr when installed, else a NumPy
+    callable. Formula strings are never eval()'d."""
+    f = INDEX_FORMULAS[name]
+    if numexpr is not None:
+        expr = _formula_expr(name)
+        nan = np.float32(np.nan)
+        return lambda bands: numexpr.evaluate(expr, local_dict={**bands, 'nan': nan})
+    if isinstance(f, tuple):
+        a, b = f
+        return lambda bands: _normalized_difference(bands[a], bands[b])
+    fn = NUMPY_FORMULAS.get(f)
+    if fn is None:
+        raise ValueError(f"Index {name!r} formula {f!r} needs numexpr "
+                         "(pip install numexpr)")
+    return fn
+
+
+def _normalized_difference(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    total = a + b
+    return np.where(total == 0, np.float32(np.nan), (a - b) / total)
+
+
 # ── Open-Meteo ────────────────────────────────────────────────────────────────
 
 def fetch_weather(lat: float, lon: float) -> Optional[Dict]:
@@ -357,7 +759,13 @@ def fetch_weather(lat: float, lon: float) -> Optional[Dict]:
 
 # ── Encoding helper ───────────────────────────────────────────────────────────
 
-def rgba_to_base64(rgba: np.ndarray) -> str:
-    buf = io.BytesIO()
-    Image.fromarray(rgba, 'RGBA').save(buf, format='PNG')
-    return base64.b64encode(buf.getvalue()).decode()
+def rgba_to_base64(rgba: np.ndarray, fmt: str = 'png', **kwargs) -> str:
+    """Base64 payload of an encoded RGBA layer (PNG at zlib level
+    encoding.PNG_LEVEL by default). Repeat calls on identical pixels are
+    served from encoding's LRU."""
+    return encode(rgba, fmt, **kwargs).b64()
+
+
+def rgba_to_data_uri(rgba: np.ndarray, fmt: str = 'png', **kwargs) -> str:
+    """`data:` URI for folium ImageOverlay and friends."""
+    return to_data_uri(rgba, fmt, **kwargs)
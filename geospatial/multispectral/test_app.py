@@ -16,8 +16,8 @@ import sentinel_analysis as sa
 
 
 class StubAnalyzer:
-    def __init__(self):
-        pass
+    def __init__(self, cache=None):
+        self.cache = cache
 
     def search(self, bbox, start, end, cloud_pct=30):
         return []  # -> "No scenes found" path, no network
@@ -25,8 +25,8 @@ class StubAnalyzer:
     def load_stack(self, *a, **k):
         raise RuntimeError("should not be called with empty search")
 
-    cloud_mask = median_composite = load_stack
-    render_rgb = render_index = render_timelapse = load_stack
+    cloud_mask = median_composite = load_composite = load_stack
+    render_rgb = render_index = render_timelapse = iter_timelapse = load_stack
     get_spectra = burn_scar_analysis = load_stack
 
 
@@ -0,0 +1,295 @@
+"""Unit tests for the composite / search caches and the Drift tile store
+(no network)."""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import numpy as np
+import xarray as xr
+
+
+def fake_composite(seed: int, n: int = 64) -> xr.DataArray:
+    rng = np.random.default_rng(seed)
+    return xr.DataArray(
+        rng.uniform(0, 5000, (3, n, n)),
+        dims=('band', 'y', 'x'),
+        coords={'band': ['red', 'green', 'blue'],
+                'y': np.linspace(38.0, 37.9, n),
+                'x': np.linspace(-122.5, -122.4, n)},
+    )
+
+
+class FakeItem:
+    def __init__(self, id, bbox, cloud, geometry=None):
+        self.id = id
+        self.bbox = bbox
+        self.geometry = geometry
+        self.properties = {} if cloud is None else {'eo:cloud_cover': cloud}
+
+
+def main():
+    from composite_cache import CompositeCache, composite_key
+    from search_cache import SearchCache
+
+    ok = lambda name: print(f"PASS  {name}")
+
+    # 1. Key is stable under float noise / ordering, sensitive to inputs
+    k1 = composite_key([-122.5, 37.9, -122.4, 38.0], "2023-06-01",
+                       "2023-09-30", 25, 0.001, ['red', 'scl'], ['b', 'a'])
+    k2 = composite_key([-122.5 + 1e-12, 37.9, -122.4, 38.0], "2023-06-01",
+                       "2023-09-30", 25, 0.001, ['scl', 'red'], ['a', 'b'])
+    k3 = composite_key([-122.5, 37.9, -122.4, 38.0], "2023-06-01",
+                       "2023-09-30", 30, 0.001, ['red', 'scl'], ['a', 'b'])
+    assert k1 == k2 and k1 != k3
+    ok("composite key normalization")
+
+    with tempfile.TemporaryDirectory() as root:
+        # 2. Round trip: miss, put, hit with identical pixels and coords
+        cache = CompositeCache(root, max_bytes=10 * 1024 ** 2)
+        comp = fake_composite(0)
+        assert cache.get(k1) is None
+        cache.put(k1, comp)
+        got = cache.get(k1)
+        assert got is not None
+        np.testing.assert_array_equal(got.values, comp.values)
+        assert got.band.values.tolist() == ['red', 'green', 'blue']
+        np.testing.assert_allclose(got.y.values, comp.y.values)
+        np.testing.assert_allclose(
+            got.sel(band='green').values, comp.sel(band='green').values
+        )
+        s = cache.stats()
+        assert s['hits'] == 1 and s['misses'] == 1 and s['entries'] == 1
+        ok("put / get round trip + hit/miss counters")
+
+        # 3. LRU eviction by byte budget keeps the recently-used entry
+        entry_bytes = s['bytes']
+        small = CompositeCache(root, max_bytes=int(entry_bytes * 2.5))
+        small.put('k_a', fake_composite(1))
+        time.sleep(0.02)
+        assert small.get(k1) is not None        # touch -> most recent
+        time.sleep(0.02)
+        small.put('k_b', fake_composite(2))     # 3 entries > budget
+        assert small.get('k_a') is None, "least-recently-used entry kept"
+        assert small.get(k1) is not None, "recently-used entry evicted"
+        assert small.stats()['bytes'] <= small.max_bytes
+        assert small.evictions >= 1
+        ok("size-bounded LRU eviction")
+
+        # 3b. An entry evicted between the load and the recency bump is a
+        #     miss, not an exception
+        import composite_cache
+        real_utime = composite_cache.os.utime
+
+        def evicted(path, *a):
+            raise FileNotFoundError(path)
+
+        composite_cache.os.utime = evicted
+        try:
+            assert small.get(k1) is None
+        finally:
+            composite_cache.os.utime = real_utime
+        assert small.get(k1) is not None
+        ok("concurrent eviction during get is a miss")
+
+    # 4. Search cache: exact hit, then a contained bbox / stricter cloud is
+    # answered by filtering the cached result locally
+    calls = []
+    catalog = [
+        FakeItem('west', [-123.0, 37.0, -122.6, 38.0], 5.0),
+        FakeItem('east', [-122.3, 37.0, -122.0, 38.0], 5.0),
+        FakeItem('cloudy', [-123.0, 37.0, -122.0, 38.0], 20.0),
+    ]
+
+    def fetch(bbox, start, end, cloud):
+        calls.append(tuple(bbox))
+        time.sleep(0.2)
+        return [it for it in catalog
+                if it.properties['eo:cloud_cover'] < cloud]
+
+    sc = SearchCache(ttl_s=60)
+    big = [-123.0, 37.0, -122.0, 38.0]
+    assert len(sc.search(big, "2023-06-01", "2023-09-30", 30, fetch)) == 3
+    assert len(sc.search([v + 1e-9 for v in big], "2023-06-01",
+                         "2023-09-30", 30, fetch)) == 3
+    sub = sc.search([-122.9, 37.2, -122.7, 37.8], "2023-06-01",
+                    "2023-09-30", 10, fetch)
+    assert [it.id for it in sub] == ['west'], [it.id for it in sub]
+    assert len(calls) == 1
+    s = sc.stats()
+    assert s['hits'] == 1 and s['subset_hits'] == 1 and s['misses'] == 1
+    ok("search cache exact + contained-bbox hits")
+
+    # 4b. A subset hit returns exactly what a direct search would: footprints
+    #     are matched on geometry (not their bbox), and items without cloud
+    #     cover fail the cloud filter like they do server-side
+    from shapely.geometry import box, shape
+    triangle = {'type': 'Polygon',
+                'coordinates': [[[0, 0], [1, 0], [0, 1], [0, 0]]]}
+    footprints = [
+        FakeItem('diagonal', [0.0, 0.0, 1.0, 1.0], 5.0, triangle),
+        FakeItem('full', [0.0, 0.0, 1.0, 1.0], 5.0,
+                 box(0, 0, 1, 1).__geo_interface__),
+        FakeItem('no_cloud', [0.0, 0.0, 1.0, 1.0], None,
+                 box(0, 0, 1, 1).__geo_interface__),
+        FakeItem('bbox_only', [0.7, 0.7, 1.0, 1.0], 5.0),
+    ]
+
+    def stac(bbox, start, end, cloud):
+        return [it for it in footprints
+                if (shape(it.geometry) if it.geometry else box(*it.bbox))
+                .intersects(box(*bbox))
+                and it.properties.get('eo:cloud_cover', 100) < cloud]
+
+    warm = SearchCache(ttl_s=60)
+    assert len(warm.search([0, 0, 1, 1], "2023-06-01", "2023-09-30", 30,
+                           stac)) == 3
+    for q in ([0.8, 0.8, 0.9, 0.9], [0.1, 0.1, 0.2, 0.2], [0.4, 0.4, 0.6, 0.6]):
+        cold = SearchCache(ttl_s=60).search(q, "2023-06-01", "2023-09-30", 30,
+                                            stac)
+        hit = warm.search(q, "2023-06-01", "2023-09-30", 30, stac)
+        assert [it.id for it in hit] == [it.id for it in cold], (q, hit, cold)
+    assert warm.stats()['subset_hits'] == 3 and warm.stats()['misses'] == 1
+    corner = warm.search([0.8, 0.8, 0.9, 0.9], "2023-06-01", "2023-09-30", 30,
+                         stac)
+    assert [it.id for it in corner] == ['full', 'bbox_only']
+    ok("search cache subset hit = direct search (footprints, missing cloud)")
+
+    # 5. Concurrent identical searches collapse into one request
+    import threading
+    calls.clear()
+    results = []
+    other = [-10.0, 10.0, -9.0, 11.0]
+    threads = [
+        threading.Thread(target=lambda: results.append(
+            sc.search(other, "2023-06-01", "2023-09-30", 30, fetch)))
+        for _ in range(6)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1, f"{len(calls)} upstream searches"
+    assert len(results) == 6 and all(len(r) == 3 for r in results)
+    assert sc.stats()['coalesced'] == 5
+    ok("concurrent identical searches coalesced")
+
+    # 6. TTL expiry and error propagation
+    expiring = SearchCache(ttl_s=0.05)
+    calls.clear()
+    expiring.search(big, "2023-06-01", "2023-09-30", 30, fetch)
+    time.sleep(0.1)
+    expiring.search(big, "2023-06-01", "2023-09-30", 30, fetch)
+    assert len(calls) == 2
+
+    def broken(*a):
+        raise ConnectionError("earth-search down")
+
+    try:
+        expiring.search(other, "2023-06-01", "2023-09-30", 30, broken)
+        raise AssertionError("error swallowed")
+    except ConnectionError:
+        pass
+    assert not expiring.inflight
+    ok("TTL expiry + failed search not cached")
+
+    # 7. Tile store: lossless round trip, spec-keyed, shared across threads
+    from concurrent.futures import ThreadPoolExecutor
+    from tile_store import TileStore, tile_key
+    rng = np.random.default_rng(5)
+    spec = {'source': 'live', 'key': [3, 4], 'tile_size': 0.3,
+            'resolution': 0.001, 'start': '2023-06-01', 'end': '2023-09-30',
+            'cloud': 25, 'gap_fill': True, 'stretch': [100.0, 3000.0]}
+    assert tile_key(spec) == tile_key({**spec, 'tile_size': 0.1 + 0.2})
+    for k, v in (('stretch', [100.0, 3001.0]), ('gap_fill', False),
+                 ('key', [3, 5]), ('source', 'instant')):
+        assert tile_key({**spec, k: v}) != tile_key(spec), k
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TileStore(tmp)
+        rgba = rng.integers(0, 256, (120, 150, 4), dtype=np.uint8)
+        tile = {'empty': False, 'rgba': rgba, 'bounds': [1.0, 2.0, 1.3, 2.3],
+                'stretch': (100.0, 3000.0)}
+        assert store.get(spec) is None
+        store.put(spec, tile)
+        store.put({**spec, 'key': [9, 9]}, {'empty': True, 'error': 'x'})
+        got = TileStore(tmp).get(spec)                 # a fresh process view
+        np.testing.assert_array_equal(got['rgba'], rgba)
+        assert got['bounds'] == tile['bounds'] and got['stretch'] == (100.0, 3000.0)
+        assert store.stats()['entries'] == 1
+
+        specs = [{**spec, 'key': [i, 0]} for i in range(24)]
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda sp: store.put(sp, tile), specs))
+            got = list(pool.map(store.get, specs))
+        assert all(g is not None for g in got)
+        assert not list(Path(tmp).glob('*/.*')), "temp file left behind"
+
+        one = store.stats()['bytes'] // 25
+        small = TileStore(tmp, max_bytes=int(one * 4.5))
+        small.put({**spec, 'key': [99, 0]}, tile)
+        st = small.stats()
+        assert st['entries'] == 4 and small.get({**spec, 'key': [99, 0]})
+    ok("tile store: round trip, spec keys, concurrency, LRU budget")
+
+    # 7b. Overwrites don't inflate the running size; eviction leaves headroom
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TileStore(tmp)
+        for _ in range(5):
+            store.put(spec, tile)
+        one = store.stats()['bytes']
+        assert store._bytes == one and store.stats()['entries'] == 1
+        store = TileStore(tmp, max_bytes=int(one * 10.5))
+        for i in range(10):
+            store.put({**spec, 'key': [i, 1]}, tile)   # 11 tiles > budget
+        st = store.stats()
+        assert st['bytes'] <= store.max_bytes * 0.9 and st['entries'] == 9
+        assert store._bytes == st['bytes'] and store.evictions == 2
+    ok("tile store: overwrite accounting, evicts to 90% of the budget")
+
+    # 8. XYZ cache: memory LRU in front of an MBTiles-style SQLite file
+    from xyz_cache import XYZCache
+    blobs = {i: bytes([i]) * 1000 for i in range(6)}
+    mem = XYZCache(max_bytes=3500)
+    for i, blob in blobs.items():
+        mem.put('layer', 12, i, 7, blob)
+    assert mem.get('layer', 12, 0, 7) is None          # evicted from memory
+    assert mem.get('layer', 12, 5, 7) == blobs[5]
+    assert mem.get('other', 12, 5, 7) is None
+    st = mem.stats()
+    assert st['entries'] == 3 and st['bytes'] == 3000 and st['disk_entries'] == 0
+    with tempfile.TemporaryDirectory() as tmp:
+        db = f"{tmp}/xyz.mbtiles"
+        disk = XYZCache(db, max_bytes=0, max_disk_bytes=4500)
+        for i, blob in blobs.items():
+            disk.put('layer', 12, i, 7, blob)
+        assert disk.stats()['disk_bytes'] <= 4500
+        assert disk.get('layer', 12, 0, 7) is None      # oldest written first
+        reopened = XYZCache(db)                        # a fresh process view
+        assert reopened.get('layer', 12, 5, 7) == blobs[5]
+        assert reopened.get('layer', 12, 5, 7) == blobs[5]   # now in memory
+        st = reopened.stats()
+        assert st['hits'] == 2 and st['disk_hits'] == 1
+        assert 0 < st['disk_entries'] < 6
+
+        # Overwrites replace a row's bytes; a thread pool shares the file
+        shared = XYZCache(f"{tmp}/shared.mbtiles", max_bytes=2500)
+        for _ in range(3):
+            shared.put('layer', 12, 0, 7, blobs[0])
+        assert shared.stats()['disk_bytes'] == 1000
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda i: shared.put('layer', 12, i % 6, 8,
+                                               blobs[i % 6]), range(48)))
+            got = list(pool.map(lambda i: shared.get('layer', 12, i, 8),
+                                range(6)))
+        assert got == [blobs[i] for i in range(6)]
+        st = shared.stats()
+        assert st['disk_entries'] == 7 and st['disk_bytes'] == 7000
+    ok("XYZ cache: memory LRU, SQLite persistence and disk budget")
+
+    print("\nALL TESTS PASSED")
+
+
+if __name__ == '__main__':
+    main()
@@ -162,8 +162,7 @@ def main():
     class HangingAnalyzer(FakeAnalyzer):
         def drift_tile(self, *a, **k):
             # Simulate a stalled/black-holed connection, but bounded so this
-            # test's worker thread doesn't block process exit via the
-            # ThreadPoolExecutor atexit join hook.
+            # test doesn't keep a shared broker worker busy for long.
             time.sleep(4)
             return None
 
@@ -186,7 +185,7 @@ def main():
     # retry() while the original stalled thread is *still occupying a worker*
     # (we gave up watching it, but a real thread can't be force-killed) must
     # still get its own worker immediately, not queue behind it forever —
-    # this is why the urgent pool has 2 workers, not 1.
+    # retry() starts a fresh fetch instead of joining the stalled one.
     eng3.analyzer = FakeAnalyzer()
     t_retry = time.time()
     eng3.retry(eng3.current_key())
@@ -267,6 +266,350 @@ def main():
     assert abs(x - 0.0) < 1e-6 and y < 0.01, (x, y)
     ok("web-mercator tile math")
 
+    # 15. Tile store: a second engine (another session) starts from disk
+    import tempfile
+    from tile_store import TileStore
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TileStore(tmp)
+        site = ("Store Site", 12.05, 12.05)
+        first = FakeAnalyzer()
+        e1 = DriftEngine(0.15, 0.001, "2023-06-01", "2023-09-30", 25,
+                         site=site, analyzer=first, tile_store=store)
+        deadline = time.time() + 5
+        while (len(e1.tiles) < 3 or e1.fetching()) and time.time() < deadline:
+            e1.poll(); time.sleep(0.05)
+        e1.shutdown()
+        second = FakeAnalyzer()
+        e2 = DriftEngine(0.15, 0.001, "2023-06-01", "2023-09-30", 25,
+                         site=site, analyzer=second, tile_store=store)
+        deadline = time.time() + 5
+        while e2.mosaic_b64() is None and time.time() < deadline:
+            e2.poll(); time.sleep(0.02)
+        cur = e2.current_key()
+        assert e2.mosaic_b64() is not None and store.hits >= 1
+        np.testing.assert_array_equal(e2.tiles[cur]['rgba'], e1.tiles[cur]['rgba'])
+        assert e2.stretch == (0.0, 3000.0)
+        other = DriftEngine(0.15, 0.001, "2023-06-01", "2023-09-30", 40,
+                            site=site, analyzer=FakeAnalyzer(), tile_store=store)
+        assert other.tile_spec(cur) != e2.tile_spec(cur)   # cloud is part of it
+        e2.shutdown(); other.shutdown()
+    assert second.fetch_count < first.fetch_count
+    ok(f"tile store shared across engines ({store.hits} disk hits)")
+
+    # 16. Fetch broker: sessions on the same spec share one in-flight fetch;
+    #     urgent work skips queued prefetches; released jobs never run
+    import threading
+    from fetch_broker import FetchBroker
+
+    class SlowCounting(FakeAnalyzer):
+        calls = []
+
+        def drift_tile(self, bbox, *a, **k):
+            SlowCounting.calls.append((round(bbox[0], 4), round(bbox[1], 4)))
+            time.sleep(0.3)
+            return super().drift_tile(bbox, *a, **k)
+
+    broker = FetchBroker(max_workers=4, urgent_reserve=1)
+    site = ("Busy Site", 22.05, 22.05)
+    engines = [DriftEngine(0.15, 0.001, "2023-06-01", "2023-09-30", 25,
+                           site=site, analyzer=SlowCounting(), broker=broker)
+               for _ in range(3)]
+    cur = engines[0].current_key()
+    assert engines[0].futures[cur] is engines[2].futures[cur]
+    deadline = time.time() + 5
+    while any(e.mosaic_b64() is None for e in engines) and time.time() < deadline:
+        for e in engines:
+            e.poll()
+        time.sleep(0.02)
+    assert all(e.mosaic_b64() is not None for e in engines)
+    assert all(e.stretch == (0.0, 3000.0) for e in engines)
+    calls = SlowCounting.calls
+    assert calls and len(calls) == len(set(calls)), calls   # each tile once
+    st = broker.stats()
+    assert st['coalesced'] >= 2 and st['submitted'] < 3 * st['completed']
+    for e in engines:
+        e.shutdown()
+
+    gate = threading.Event()
+    order = []
+    b = FetchBroker(max_workers=2, urgent_reserve=1)
+    b.submit('slow', gate.wait)                  # occupies the background slot
+    queued = [b.submit(f'bg{i}', order.append, f'bg{i}') for i in range(3)]
+    b.release('bg1', queued[1])
+    urgent = b.submit('now', order.append, 'now', urgent=True)
+    urgent.result(timeout=2)
+    assert order == ['now'], order
+    gate.set()
+    queued[0].result(timeout=2); queued[2].result(timeout=2)
+    assert queued[1].cancelled() and order == ['now', 'bg0', 'bg2'], order
+    assert b.stats()['dropped'] == 1
+    ok(f"fetch broker coalesces sessions ({st['coalesced']} joins) "
+       "and prioritizes urgent fetches")
+
+    # 17. Instant source: layer probed once, XYZ sub-tiles fetched
+    #     concurrently from a local stand-in for the EOX tile server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from xyz_cache import XYZCache
+
+    hits, live, peak = [], [0], [0]
+    hits_lock = threading.Lock()
+
+    class XYZHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            layer, z, y, x = self.path.strip('/').rsplit('.', 1)[0].split('/')
+            with hits_lock:
+                hits.append(layer)
+                live[0] += 1
+                peak[0] = max(peak[0], live[0])
+            time.sleep(0.05)
+            with hits_lock:
+                live[0] -= 1
+            if layer != drift.EOX_LAYERS[1]:
+                self.send_response(404); self.end_headers()
+                return
+            buf = io.BytesIO()
+            color = (int(x) % 64 * 4, int(y) % 64 * 4, 90)
+            Image.new('RGB', (256, 256), color).save(buf, format='JPEG',
+                                                     quality=95)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(buf.tell()))
+            self.end_headers()
+            self.wfile.write(buf.getvalue())
+
+        def log_message(self, *a):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), XYZHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    orig_url = drift.EOX_TILE_URL
+    drift.EOX_TILE_URL = (f"http://127.0.0.1:{server.server_address[1]}"
+                          "/{layer}/{z}/{y}/{x}.jpg")
+    drift._eox_layer, drift._eox_probe_retry_at = None, 0.0
+    try:
+        eng6 = DriftEngine(0.075, 0.0001, "2023-06-01", "2023-09-30", 25,
+                           site=("XYZ Site", 45.05, 6.05), source='instant',
+                           broker=FetchBroker(max_workers=4),
+                           xyz_cache=XYZCache())
+        deadline = time.time() + 10
+        while (eng6.mosaic_b64() is None or eng6.fetching()) \
+                and time.time() < deadline:
+            eng6.poll(); time.sleep(0.02)
+        assert len(eng6.tiles) >= 3 and not any(
+            t['empty'] for t in eng6.tiles.values())
+        # Three tiles fetched at once, but the layer names were probed once
+        assert hits.count(drift.EOX_LAYERS[0]) == 1, hits
+        assert drift.EOX_LAYERS[2] not in hits
+        hits.clear(); peak[0] = 0
+        eng6.xyz_cache = XYZCache(max_bytes=0)      # force the network path
+        t0 = time.time()
+        tile = eng6._fetch_instant(eng6.current_key())
+        elapsed = time.time() - t0
+        n_sub = len(hits)
+        assert not tile['empty'] and tile['rgba'].shape == (1500, 1500, 4)
+        assert set(hits) == {drift.EOX_LAYERS[1]}
+        assert n_sub >= 30 and peak[0] > 1, (n_sub, peak[0])
+        assert elapsed < n_sub * 0.05 / 2, f"sequential-looking: {elapsed:.2f}s"
+        # Each sub-tile landed in its own slot: red encodes x, green y
+        rgb = tile['rgba'][..., :3].astype(int)
+        assert abs(rgb[750, 1400, 0] - rgb[750, 100, 0]) > 8
+        assert abs(rgb[1400, 750, 1] - rgb[100, 750, 1]) > 8
+        assert (abs(rgb[..., 2] - 90) < 8).mean() > 0.99, "background gaps"
+        eng6.shutdown()
+    finally:
+        drift.EOX_TILE_URL = orig_url
+        drift._eox_layer, drift._eox_probe_retry_at = None, 0.0
+        server.shutdown()
+    ok(f"instant tile: {n_sub} XYZ tiles in {elapsed:.2f}s "
+       f"(peak {peak[0]} concurrent, layer probed once)")
+
+    # 17b. A failed layer probe is remembered for EOX_PROBE_BACKOFF_S, runs
+    #      once for concurrent callers, and holds no lock while it waits on
+    #      the network
+    from concurrent.futures import ThreadPoolExecutor
+
+    probed, lock_free = [], []
+
+    class DownHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            probed.append(self.path)
+            lock_free.append(drift._eox_probe_lock.acquire(blocking=False))
+            if lock_free[-1]:
+                drift._eox_probe_lock.release()
+            time.sleep(0.1)
+            self.send_response(503); self.end_headers()
+
+        def log_message(self, *a):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DownHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    drift.EOX_TILE_URL = (f"http://127.0.0.1:{server.server_address[1]}"
+                          "/{layer}/{z}/{y}/{x}.jpg")
+    drift._eox_layer, drift._eox_probe_retry_at = None, 0.0
+    try:
+        with ThreadPoolExecutor(6) as pool:
+            got = list(pool.map(lambda _: drift.eox_layer(5, 1, 1, XYZCache()),
+                                range(6)))
+        assert got == [None] * 6
+        assert len(probed) == len(drift.EOX_LAYERS), probed
+        assert all(lock_free), "probe lock held during network I/O"
+        assert drift.eox_layer(5, 1, 1, XYZCache()) is None   # backed off
+        assert len(probed) == len(drift.EOX_LAYERS)
+        drift._eox_probe_retry_at = 0.0              # backoff elapsed
+        assert drift.eox_layer(5, 1, 1, XYZCache()) is None
+        assert len(probed) == 2 * len(drift.EOX_LAYERS)
+    finally:
+        drift.EOX_TILE_URL = orig_url
+        drift._eox_layer, drift._eox_probe_retry_at = None, 0.0
+        server.shutdown()
+    ok("failed EOX layer probe: one probe, lock-free, backed off")
+
+    # 18. XYZ cache: overlapping drift tiles and later engines reuse raw
+    #     EOX tiles (memory, then the SQLite file); seeding pre-warms sites
+    import sqlite3
+    from drift import xyz_grid, seed_xyz_cache
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), XYZHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    drift.EOX_TILE_URL = (f"http://127.0.0.1:{server.server_address[1]}"
+                          "/{layer}/{z}/{y}/{x}.jpg")
+    drift._eox_layer, drift._eox_probe_retry_at = None, 0.0
+    hits.clear()
+    site = ("Cache Site", -12.05, 33.05)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = f"{tmp}/xyz.mbtiles"
+            e1 = DriftEngine(0.075, 0.0004, "2023-06-01", "2023-09-30", 25,
+                             site=site, source='instant',
+                             broker=FetchBroker(), xyz_cache=XYZCache(db))
+            deadline = time.time() + 10
+            while (len(e1.tiles) < 3 or e1.fetching()) and time.time() < deadline:
+                e1.poll(); time.sleep(0.02)
+            assert not any(t['empty'] for t in e1.tiles.values())
+            grids = [xyz_grid(e1.bbox_for(k), 0.0004)[2] for k in e1.tiles]
+            unique = set().union(*grids)
+            n_cells = sum(len(g) for g in grids)
+            # every XYZ tile downloaded once (+1 failed probe of layer 0)
+            assert len(hits) == len(unique) + 1 < n_cells + 1, (len(hits), n_cells)
+            e1.shutdown()
+
+            hits.clear()
+            restarted = XYZCache(db)                  # fresh process, same file
+            e2 = DriftEngine(0.075, 0.0004, "2023-06-01", "2023-09-30", 25,
+                             site=site, source='instant',
+                             broker=FetchBroker(), xyz_cache=restarted)
+            deadline = time.time() + 10
+            while (e2.mosaic_b64() is None or e2.fetching()) \
+                    and time.time() < deadline:
+                e2.poll(); time.sleep(0.02)
+            assert e2.mosaic_b64() is not None
+            # Only sub-tiles e1 never saw (its heading was random) go out
+            seen = set().union(*(xyz_grid(e2.bbox_for(k), 0.0004)[2]
+                                 for k in e2.tiles))
+            assert len(hits) == len(seen - unique), (len(hits), seen - unique)
+            cur = e2.current_key()
+            np.testing.assert_array_equal(e2.tiles[cur]['rgba'],
+                                          e1.tiles[cur]['rgba'])
+            assert restarted.stats()['disk_hits'] >= 1
+            e2.shutdown()
+            z, _, cells = xyz_grid(e2.bbox_for(cur), 0.0004)
+            x, y = cells[0]
+            with sqlite3.connect(db) as con:                # MBTiles TMS rows
+                assert con.execute(
+                    'SELECT COUNT(*) FROM tiles WHERE zoom_level=? AND '
+                    'tile_column=? AND tile_row=?',
+                    (z, x, 2 ** z - 1 - y)).fetchone()[0] == 1
+
+            hits.clear()
+            seeded = XYZCache(f"{tmp}/seed.mbtiles")
+            first_run = seed_xyz_cache(0.075, 0.0004, sites=[site], cache=seeded)
+            assert first_run['fetched'] == first_run['tiles'] == len(hits) > 9
+            again = seed_xyz_cache(0.075, 0.0004, sites=[site], cache=seeded)
+            assert again['cached'] == again['tiles'] and \
+                len(hits) == first_run['tiles']
+    finally:
+        drift.EOX_TILE_URL = orig_url
+        drift._eox_layer, drift._eox_probe_retry_at = None, 0.0
+        server.shutdown()
+    ok(f"XYZ cache: {len(unique)} of {n_cells} sub-tile fetches needed, "
+       f"restart served from disk, seeded {first_run['tiles']} tiles")
+
+    # 19. Incremental mosaic: pasting arrivals, shifting by whole tiles and
+    #     clearing dropped tiles matches a from-scratch stitch; per-tile
+    #     encodes are reused
+    def stitched(engine):
+        tx, ty = engine.current_key()
+        sel = [t for k, t in engine.tiles.items()
+               if abs(k[0] - tx) <= 1 and abs(k[1] - ty) <= 1
+               and not t.get('empty')]
+        res = engine.resolution
+        S = min(t['bounds'][0] for t in sel); W = min(t['bounds'][1] for t in sel)
+        N = max(t['bounds'][2] for t in sel); E = max(t['bounds'][3] for t in sel)
+        out = np.zeros((int(round((N - S) / res)) + 1,
+                        int(round((E - W) / res)) + 1, 4), dtype=np.uint8)
+        for t in sel:
+            r0 = int(round((N - t['bounds'][2]) / res))
+            c0 = int(round((t['bounds'][1] - W) / res))
+            h, w = t['rgba'].shape[:2]
+            out[r0:r0 + h, c0:c0 + w] = t['rgba'][:out.shape[0] - r0,
+                                                  :out.shape[1] - c0]
+        return out, (S, W, N, E)
+
+    def check(engine, what):
+        _, view, bounds, _ = engine._mosaic_data()
+        ref, ref_bounds = stitched(engine)
+        assert bounds == ref_bounds, what
+        np.testing.assert_array_equal(view, ref, err_msg=what)
+
+    eng7 = DriftEngine(0.15, 0.001, "2023-06-01", "2023-09-30", 25,
+                       site=("Mosaic Site", 50.05, 50.05), analyzer=FakeAnalyzer())
+    eng7.preload()
+    deadline = time.time() + 8
+    while eng7.preload_progress() is not None and time.time() < deadline:
+        eng7.poll(); time.sleep(0.05)
+    canvas = eng7._mosaic_data() and eng7._canvas
+    check(eng7, "3x3 preload")
+    tiles, _ = eng7.mosaic_tiles()
+    assert len(tiles) == 9 and all(u.startswith('data:image/webp') for u, _ in tiles)
+    first_enc = dict(eng7._tile_enc)
+
+    tx, ty = eng7.current_key()
+    eng7.lon += eng7.tile_size                      # one tile east: shift
+    check(eng7, "shifted east")
+    assert eng7._canvas is canvas and eng7._anchor == (tx + 1, ty)
+    assert len(eng7._placed) == 6
+    eng7.lat -= eng7.tile_size                      # and one south
+    check(eng7, "shifted south-east")
+    eng7.ensure((tx + 2, ty - 2), urgent=True)      # a new neighbor lands
+    deadline = time.time() + 5
+    while (tx + 2, ty - 2) not in eng7.tiles and time.time() < deadline:
+        eng7.poll(); time.sleep(0.02)
+    check(eng7, "arrival after shift")
+    with eng7.lock:                                  # evicted neighbor
+        del eng7.tiles[(tx, ty)]
+    check(eng7, "tile dropped")
+    eng7.retry((tx + 1, ty))                         # replaced in place
+    deadline = time.time() + 5
+    while (tx + 1, ty) not in eng7.tiles and time.time() < deadline:
+        eng7.poll(); time.sleep(0.02)
+    check(eng7, "tile replaced")
+    tiles, bounds = eng7.mosaic_tiles()
+    kept = [k for k in first_enc if k in eng7._tile_enc]
+    assert kept and all(eng7._tile_enc[k][1] is first_enc[k][1] for k in kept
+                        if k != (tx + 1, ty))
+    assert eng7._tile_enc[(tx + 1, ty)][1] is not first_enc[(tx + 1, ty)][1]
+    html = drift_component_html(tiles, bounds, eng7.lat, eng7.lon, 0.02, 90.0,
+                                eng7.tile_size, True, "Mosaic Site")
+    assert html.count('data:image/webp') == len(tiles)
+    b64, mb = eng7.mosaic_b64()
+    assert mb == bounds and eng7.viewport_jpeg((256, 192)) is not None
+    eng7.lat, eng7.lon = 0.05, 0.05                  # far jump: fresh canvas
+    assert eng7._mosaic_data() is None and eng7._anchor == (tx + 1, ty - 1)
+    eng7.shutdown()
+    ok(f"incremental mosaic matches a full stitch ({len(tiles)} tiles, "
+       "shift / arrival / drop / replace)")
+
     print("\nALL TESTS PASSED")
 
 
@@ -0,0 +1,82 @@
+"""Tests for encoding.py: round trips, JPEG alpha side-channel, LRU cache."""
+import sys
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+import encoding
+from sentinel_analysis import rgba_to_base64, rgba_to_data_uri
+
+
+def decode(data: bytes) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(data)))
+
+
+def main():
+    ok = lambda name: print(f"PASS  {name}")
+
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, (120, 160, 4), dtype=np.uint8)
+    rgba[..., 3] = 255
+    rgba[:20, :, 3] = 0
+
+    # 1. Lossless formats round-trip exactly (WebP drops the RGB of fully
+    #    transparent pixels); lossy ones keep shape + alpha
+    for fmt, level in (('png', 0), ('png', 1), ('png', 9), ('webp', 0)):
+        enc = encoding.encode(rgba, fmt, level=level, cache=False)
+        out = decode(enc.data)
+        np.testing.assert_array_equal(out[..., 3], rgba[..., 3])
+        np.testing.assert_array_equal(out[20:], rgba[20:])
+    lossy = decode(encoding.encode(rgba, 'webp_lossy', cache=False).data)
+    assert lossy.shape == rgba.shape
+    assert (lossy[:20, :, 3] == 0).all() and (lossy[20:, :, 3] == 255).all()
+    ok("png / webp round trip, webp_lossy keeps alpha")
+
+    # 2. JPEG: RGB payload + separate PNG alpha only when not opaque
+    enc = encoding.encode(rgba, 'jpeg', quality=90, cache=False)
+    assert enc.mime == 'image/jpeg' and decode(enc.data).shape == (120, 160, 3)
+    np.testing.assert_array_equal(decode(enc.alpha), rgba[..., 3])
+    assert enc.alpha_uri().startswith('data:image/png;base64,')
+    opaque = rgba.copy()
+    opaque[..., 3] = 255
+    assert encoding.encode(opaque, 'jpeg', cache=False).alpha is None
+    ok("jpeg + alpha mask")
+
+    # 3. Cache: identical pixels hit (even a copy), changed pixels/params miss
+    encoding.clear_cache()
+    a = encoding.encode(rgba)
+    b = encoding.encode(rgba.copy())
+    assert a is b
+    encoding.encode(rgba, level=6)
+    changed = rgba.copy()
+    changed[50, 50, 0] ^= 1
+    assert encoding.encode(changed) is not a
+    st = encoding.cache_stats()
+    assert st['hits'] == 1 and st['misses'] == 3 and st['entries'] == 3
+    ok("hash-keyed encode cache")
+
+    # 4. Helpers used by the app keep their contracts; bad input is rejected
+    b64 = rgba_to_base64(rgba)
+    np.testing.assert_array_equal(decode(base64.b64decode(b64)), rgba)
+    assert rgba_to_data_uri(rgba, 'webp').startswith('data:image/webp;base64,')
+    for bad in (lambda: encoding.encode(rgba, 'gif'),
+                lambda: encoding.encode(rgba[..., :3]),
+                lambda: encoding.to_data_uri(rgba, 'jpeg')):
+        try:
+            bad()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expected ValueError")
+    ok("rgba_to_base64 / rgba_to_data_uri + validation")
+
+    print("\nALL TESTS PASSED")
+
+
+if __name__ == '__main__':
+    main()
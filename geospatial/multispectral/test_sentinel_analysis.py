@@ -0,0 +1,281 @@
+"""Unit tests for SentinelAnalyzer's array pipeline on synthetic stacks.
+
+The STAC client is stubbed so nothing touches the network; stacks are small
+dask-backed DataArrays shaped like stackstac output (time, band, y, x).
+"""
+import sys
+import tempfile
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import warnings
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+import sentinel_analysis as sa
+from composite_cache import CompositeCache
+
+sa.pystac_client.Client.open = staticmethod(lambda *a, **k: None)
+warnings.filterwarnings('ignore', category=RuntimeWarning)
+
+BANDS = list(sa.SPECTRAL_ASSETS) + ['scl']
+
+
+def fake_stack(T=5, H=40, W=50, seed=0) -> xr.DataArray:
+    rng = np.random.default_rng(seed)
+    data = rng.integers(1, 8000, (T, len(BANDS), H, W)).astype('uint16')
+    data[:, -1] = rng.choice([4, 5, 8, 9, 3], (T, H, W))
+    data[0, :, :5, :5] = sa.NODATA          # a nodata corner in one scene
+    return xr.DataArray(
+        da.from_array(data, chunks=(1, 1, 20, 20)),
+        dims=('time', 'band', 'y', 'x'),
+        coords={'time': np.arange(T), 'band': BANDS,
+                'y': np.linspace(38.0, 37.9, H),
+                'x': np.linspace(-122.5, -122.4, W)},
+    )
+
+
+class CountingSource:
+    """Array-like for da.from_array that logs every block read, standing in
+    for stackstac's per-(scene, band, chunk) COG window fetches."""
+
+    def __init__(self, data, ids, bands, reads):
+        self.data, self.ids, self.bands, self.reads = data, ids, bands, reads
+        self.shape, self.dtype, self.ndim = data.shape, data.dtype, data.ndim
+
+    def __getitem__(self, key):
+        out = self.data[key]
+        key = tuple(slice(k, k + 1) if isinstance(k, int) else k for k in key)
+        block = self.data[key].shape
+        if out.size:
+            t, b, y, x = (k.indices(n)[0] for k, n in zip(key, self.shape))
+            for i in range(block[0]):
+                for j in range(block[1]):
+                    self.reads.append((self.ids[t + i], self.bands[b + j], y, x))
+        return out
+
+
+def cloudy_catalog(T=6, H=60, W=60):
+    """Items + a load_stack stand-in: scene s0 fully cloudy, s1 cloudy only
+    in its top-left 20×20 chunk, s2 ~1 % clear, the rest mixed."""
+    rng = np.random.default_rng(7)
+    data = rng.integers(1, 8000, (T, len(BANDS), H, W)).astype('uint16')
+    data[:, -1] = rng.choice([4, 5, 8, 9, 3], (T, H, W))
+    data[0, -1] = 9
+    data[1, -1] = 4
+    data[1, -1, :20, :20] = 8
+    data[2, -1] = 3
+    data[2, -1, 30:36, 30:36] = 4
+    return catalog(data)
+
+
+def catalog(data, dates=None):
+    """Fake STAC items over a (T, band, y, x) array + a load_stack stand-in
+    that serves any subset of them, logging reads."""
+    T, _, H, W = data.shape
+    ids = [f"s{t}" for t in range(T)]
+    dates = dates or [f"2023-01-{t + 1:02d}" for t in range(T)]
+    items = [type('Item', (), {'id': i, 'datetime': d, 'properties': {}})()
+             for i, d in zip(ids, dates)]
+    reads = []
+
+    def load_stack(its, bbox, resolution=0.001, assets=None, compact=None):
+        ti = [ids.index(it.id) for it in its]
+        bi = [BANDS.index(a) for a in assets]
+        sub = data[ti][:, bi]
+        src = CountingSource(sub, [ids[t] for t in ti], assets, reads)
+        return xr.DataArray(
+            da.from_array(src, chunks=(1, 1, 20, 20)),
+            dims=('time', 'band', 'y', 'x'),
+            coords={'time': np.array([dates[t] for t in ti], dtype='datetime64[D]'),
+                    'band': assets, 'id': ('time', [ids[t] for t in ti]),
+                    'y': np.linspace(38.0, 37.9, H),
+                    'x': np.linspace(-122.5, -122.4, W)},
+        )
+    return items, load_stack, reads
+
+
+def main():
+    ok = lambda name: print(f"PASS  {name}")
+
+    compact = sa.SentinelAnalyzer(compact=True)
+    legacy  = sa.SentinelAnalyzer(compact=False)
+    stack   = fake_stack()
+
+    # 1. Compact pipeline stays uint16 and matches the float64 path
+    masked = compact.cloud_mask(stack)
+    assert masked.dtype == np.uint16, masked.dtype
+    comp = compact.median_composite(masked)
+    assert comp.dtype == np.uint16 and comp.shape == (12, 40, 50)
+
+    stack_f = stack.astype('float64').where(stack != sa.NODATA)
+    comp_f  = legacy.median_composite(legacy.cloud_mask(stack_f))
+    diff = np.abs(comp.values - np.nan_to_num(comp_f.values, nan=0.0))
+    assert diff.max() <= 0.5, diff.max()     # median rounded to integer DN
+    ok("compact cloud_mask + median_composite (uint16, matches float64)")
+
+    # 2. Downstream readers treat NODATA as missing
+    rgba, bounds = compact.render_rgb(comp)
+    assert rgba.shape == (40, 50, 4) and len(bounds) == 4
+    spec = compact.get_spectra(37.95, -122.45, comp)
+    spec_f = legacy.get_spectra(37.95, -122.45, comp_f)
+    assert spec.keys() == spec_f.keys()
+    assert all(abs(spec[b] - spec_f[b]) < 1e-4 for b in spec)
+    ok("render_rgb / get_spectra on compact composites")
+
+    # 3. Multi-index engine: float32, one memoized pass, matches formulas
+    names = list(sa.INDEX_COLORMAPS)
+    res = compact.compute_indices(comp, names)
+    assert set(res) == set(names)
+
+    def band(b):
+        return sa._band(comp, b).astype(np.float64)
+
+    for name in names:
+        f = sa.INDEX_FORMULAS[name]
+        if isinstance(f, tuple):
+            a, b = band(f[0]), band(f[1])
+            ref = (a - b) / (a + b)
+        else:
+            ref = eval(f, {}, {b: band(b) for b in ('nir', 'red', 'blue')})
+        assert res[name].dtype == np.float32
+        np.testing.assert_allclose(res[name], ref, rtol=1e-4, atol=1e-5,
+                                   equal_nan=True, err_msg=name)
+    assert compact._compute_index(comp, 'NDVI') is res['NDVI'], "not memoized"
+    assert not res['NDVI'].flags.writeable
+    try:
+        compact.compute_indices(comp, ['NOPE'])
+        raise AssertionError("unknown index accepted")
+    except ValueError:
+        pass
+    # Without numexpr the string formulas run as NumPy callables; an edited
+    # formula string is refused rather than eval()'d
+    saved_numexpr, saved_evi = sa.numexpr, sa.INDEX_FORMULAS['EVI']
+    sa.numexpr = None
+    try:
+        fresh = sa.SentinelAnalyzer(compact=True)
+        np.testing.assert_allclose(fresh.compute_indices(comp, ['EVI'])['EVI'],
+                                   res['EVI'], rtol=1e-6, equal_nan=True)
+        sa.INDEX_FORMULAS['EVI'] = "__import__('os').getcwd() + nir"
+        try:
+            sa.SentinelAnalyzer(compact=True).compute_indices(comp, ['EVI'])
+            raise AssertionError("edited formula evaluated without numexpr")
+        except ValueError:
+            pass
+    finally:
+        sa.numexpr, sa.INDEX_FORMULAS['EVI'] = saved_numexpr, saved_evi
+    ok("compute_indices: all 12 indices, float32, memoized per composite")
+
+    # 4. LUT renderer matches matplotlib within quantization, honours `out`
+    import matplotlib.colors as mcolors
+    import matplotlib.pyplot as plt
+    arr = np.linspace(-1.2, 1.2, 40 * 50, dtype=np.float32).reshape(40, 50)
+    arr[3, :7] = np.nan
+    for cmap_name in set(sa.INDEX_COLORMAPS.values()):
+        norm = mcolors.TwoSlopeNorm(vmin=-1, vcenter=0, vmax=1)
+        ref = (plt.get_cmap(cmap_name)(norm(np.nan_to_num(arr))) * 255
+               ).astype(np.uint8)
+        ref[..., 3] = (~np.isnan(arr) * 255).astype(np.uint8)
+        got = sa.index_to_rgba(arr, cmap_name)
+        assert np.abs(ref.astype(int) - got).max() <= 8, cmap_name
+    buf = np.zeros((40, 50, 4), dtype=np.uint8)
+    rgba, _ = compact.render_index(comp, 'NDVI', out=buf)
+    assert rgba is buf and buf[..., 3].any()
+    assert (buf[..., 3][np.isnan(res['NDVI'])] == 0).all()
+    ok("LUT render_index (matches matplotlib, preallocated buffer)")
+
+    # 5. Streaming median: bounded blocks, same result, tunable scheduler
+    from compute import ComputeConfig
+    big = fake_stack(T=6, H=90, W=70, seed=3)
+    ref = compact.median_composite(compact.cloud_mask(big))
+    for cfg in (ComputeConfig(memory_limit=6 * 13 * 10 * 40 ** 2, workers=2),
+                ComputeConfig(scheduler='processes', workers=2),
+                ComputeConfig(streaming=False, workers=1)):
+        streamed = sa.SentinelAnalyzer(compute=cfg).median_composite(
+            compact.cloud_mask(big))
+        assert streamed.dims == ref.dims and streamed.dtype == np.uint16
+        np.testing.assert_array_equal(streamed.values, ref.values)
+    tiny = ComputeConfig(memory_limit=6 * 13 * 10 * 40 ** 2)
+    assert tiny.block_px(6, 13, 20) == 40          # 2×2 chunks per block
+    assert tiny.block_px(600, 13, 20) == 20        # never below one chunk
+    for res in (0.0001, 0.001, 0.002):
+        chunk = ComputeConfig().chunks_for(res)
+        tile = 1024 * 10 / (res * 111_320)
+        assert 256 <= chunk <= 2048
+        ratio = chunk / tile if chunk >= tile else tile / chunk
+        assert abs(ratio - round(ratio)) < 0.02, (res, chunk, tile)
+    assert ComputeConfig(chunksize=512).chunks_for(0.001) == 512
+    try:
+        ComputeConfig(scheduler='gpu')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+    ok("streaming median_composite + compute config")
+
+    # 6. Cloud-mask pushdown: SCL first, cloudy scenes / chunks never read
+    items, loader, reads = cloudy_catalog()
+    pd_an = sa.SentinelAnalyzer(compact=True)
+    pd_an.load_stack = loader
+    full = loader(items, None, assets=BANDS)
+    ref = pd_an.median_composite(pd_an.cloud_mask(full))
+    del reads[:]
+    got = pd_an.median_composite(pd_an.load_clear_stack(items, None, min_clear=0))
+    np.testing.assert_array_equal(got.values, ref.values)
+    spectral = [r for r in reads if r[1] != 'scl']
+    assert not [r for r in spectral if r[0] == 's0']
+    assert not [r for r in spectral if r[0] == 's1' and r[2:] == (0, 0)]
+    skipped_chunks = 9 + 1 + 8                # s0, s1 top-left, s2 but one
+    assert len(spectral) == (6 * 9 - skipped_chunks) * 12
+    assert pd_an.last_pushdown['blocks_skipped'] == skipped_chunks * 12
+    del reads[:]
+    pd_an.median_composite(pd_an.load_clear_stack(items, None))
+    st = pd_an.last_pushdown
+    assert st['scenes'] == 6 and st['scenes_read'] == 4
+    assert {r[0] for r in reads if r[1] != 'scl'} == {'s1', 's3', 's4', 's5'}
+    # Cached composites are keyed on the scene-drop threshold too
+    with tempfile.TemporaryDirectory() as root:
+        pd_an.cache = CompositeCache(root)
+        args = (items, [-122.5, 37.9, -122.4, 38.0],
+                '2023-01-01', '2023-01-31', 30)
+        strict = pd_an.load_composite(*args)
+        assert pd_an.last_pushdown['scenes_read'] == 4
+        loose = pd_an.load_composite(*args, min_clear=0)
+        assert loose.attrs['composite_key'] != strict.attrs['composite_key']
+        np.testing.assert_array_equal(loose.values, got.values)
+        del reads[:]
+        again = pd_an.load_composite(*args)
+        assert not reads and pd_an.cache.stats()['hits'] == 1
+        np.testing.assert_array_equal(again.values, strict.values)
+        pd_an.cache = None
+    ok("cloud-mask pushdown: cloudy scenes and chunks skipped, same pixels")
+
+    # 7. Incremental timelapse: per-month RGB+SCL loads, one shared stretch
+    rng = np.random.default_rng(11)
+    data = rng.integers(500, 2500, (6, len(BANDS), 40, 40)).astype('uint16')
+    data[:, -1] = 4
+    data[2:4, :-1] *= 2                     # a brighter second month
+    data[4:, -1] = 9                        # third month fully cloudy
+    items, loader, reads = catalog(data, ['2023-06-03', '2023-06-20',
+                                          '2023-07-02', '2023-07-25',
+                                          '2023-08-09', '2023-08-30'])
+    tl = sa.SentinelAnalyzer(compact=True)
+    tl.load_stack = loader
+    frames = tl.iter_timelapse(items, None)
+    month, first = next(frames)
+    assert month == '2023-06' and {r[0] for r in reads} == {'s0', 's1'}
+    assert {r[1] for r in reads} == set(sa.TIMELAPSE_ASSETS)
+    rest = list(frames)
+    assert [m for m, _ in rest] == ['2023-07']
+    a, b = np.asarray(first, float), np.asarray(rest[0][1], float)
+    assert b.mean() > a.mean() + 40         # per-frame stretch would equalize
+    assert len(tl.render_timelapse(items, None)) == 2
+    ok("iter_timelapse: lazy per-month frames, global stretch")
+
+    print("\nALL TESTS PASSED")
+
+
+if __name__ == '__main__':
+    main()
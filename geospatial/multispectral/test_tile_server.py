@@ -0,0 +1,133 @@
+"""Tests for the XYZ tile server, run for real on 127.0.0.1 (no network)."""
+import sys
+
+sys.path.insert(0, str(__import__("pathlib").Path(__file__).resolve().parent))
+
+import io
+import math
+import urllib.error
+import urllib.request
+import warnings
+
+import numpy as np
+import xarray as xr
+from PIL import Image
+
+import sentinel_analysis as sa
+
+sa.pystac_client.Client.open = staticmethod(lambda *a, **k: None)
+warnings.filterwarnings('ignore', category=RuntimeWarning)
+
+from tile_server import TileServer
+
+
+def fake_composite(H=200, W=300) -> xr.DataArray:
+    rng = np.random.default_rng(0)
+    bands = list(sa.SPECTRAL_ASSETS)
+    data = rng.integers(1, 8000, (len(bands), H, W)).astype('uint16')
+    return xr.DataArray(
+        data, dims=('band', 'y', 'x'),
+        coords={'band': bands,
+                'y': 38.0 - 0.001 * np.arange(H),
+                'x': -122.5 + 0.001 * np.arange(W)},
+    )
+
+
+def tile_xy(lat: float, lon: float, z: int):
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+def get(url: str, etag: str = None):
+    req = urllib.request.Request(url)
+    if etag:
+        req.add_header('If-None-Match', etag)
+    try:
+        with urllib.request.urlopen(req, timeout=10) as r:
+            return r.status, r.headers, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def main():
+    ok = lambda name: print(f"PASS  {name}")
+
+    analyzer = sa.SentinelAnalyzer()
+    comp = fake_composite()
+    comp.attrs['composite_key'] = 'abc123'
+    server = TileServer(cache_bytes=10 * 1024 ** 2)
+    base = server.start()
+    try:
+        # 1. Stable token; bounds cover the pixel edges
+        token = server.register(comp, analyzer)
+        assert token == 'abc123' and server.register(comp, analyzer) == token
+        anon = comp.copy()
+        anon.attrs = {}
+        t2 = server.register(anon, analyzer)
+        assert t2 != token and server.register(anon, analyzer) == t2
+        (s, w), (n, e) = server.bounds(token)
+        assert abs(w - (-122.5005)) < 1e-9 and abs(n - 38.0005) < 1e-9
+        ok("register(): stable tokens + bounds")
+
+        # 2. A tile inside the composite matches the rendered layer
+        z = 14
+        x, y = tile_xy(37.95, -122.45, z)
+        url = server.tile_url(token, 'NDVI').format(z=z, x=x, y=y)
+        assert url.startswith(base)
+        status, headers, body = get(url)
+        assert status == 200 and headers['Content-Type'] == 'image/png'
+        tile = np.asarray(Image.open(io.BytesIO(body)))
+        assert tile.shape == (256, 256, 4) and tile[..., 3].any()
+        rgba, _ = analyzer.render_index(comp, 'NDVI')
+        px = (x + 128.5 / 256) / 2 ** z * 360 - 180
+        py = math.degrees(math.atan(math.sinh(
+            math.pi * (1 - 2 * (y + 128.5 / 256) / 2 ** z))))
+        col = round((px + 122.5) / 0.001)
+        row = round((38.0 - py) / 0.001)
+        np.testing.assert_array_equal(tile[128, 128], rgba[row, col])
+        ok("tile pixels sampled from the rendered layer")
+
+        # 3. ETag → 304; repeat served from the tile LRU
+        status, _, body304 = get(url, etag=headers['ETag'])
+        assert status == 304 and body304 == b''
+        status, _, again = get(url)
+        assert status == 200 and again == body
+        st = server.stats()
+        assert st['hits'] >= 2 and st['misses'] == 1 and st['not_modified'] == 1
+        ok("ETag / 304 + per-tile cache")
+
+        # 4. Outside → transparent; unknown token/index → 404/400
+        ox, oy = tile_xy(10.0, 10.0, z)
+        status, _, body = get(server.tile_url(token, 'RGB').format(z=z, x=ox, y=oy))
+        assert status == 200
+        assert not np.asarray(Image.open(io.BytesIO(body)))[..., 3].any()
+        assert get(server.tile_url('nope', 'RGB').format(z=z, x=x, y=y))[0] == 404
+        assert get(server.tile_url(token, 'NOPE').format(z=z, x=x, y=y))[0] == 400
+        assert get(f"{base}/elsewhere")[0] == 404
+        ok("empty tiles + error statuses")
+    finally:
+        server.stop()
+
+    # 5. Tile URLs use the public base URL; a wildcard bind must have one
+    proxied = TileServer()
+    try:
+        assert proxied.start(public_url='https://maps.example.org/sentinel/') \
+            == 'https://maps.example.org/sentinel'
+        assert proxied.tile_url('abc', 'RGB') == (
+            'https://maps.example.org/sentinel/tiles/abc/RGB/{z}/{x}/{y}.png')
+    finally:
+        proxied.stop()
+    try:
+        TileServer().start(host='0.0.0.0')
+        raise AssertionError("wildcard bind without public_url accepted")
+    except ValueError:
+        pass
+    ok("public_url tile URLs; wildcard bind requires one")
+
+    print("\nALL TESTS PASSED")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""Local XYZ tile server for Sentinel-2 composites.
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+Instead of PNG-encoding a whole rendered layer into the page as a data: URI,
+app.py (when SENTINEL_TILE_URL is set) registers the composite here and points
+a folium TileLayer at
+
+    <SENTINEL_TILE_URL>/tiles/<token>/<layer>/{z}/{x}/{y}.png
+
+The browser fetches those URLs itself, so the base URL must be one it can
+reach — the server's own http://127.0.0.1:<port> only works for a browser on
+the same machine.
+
+The server is a minimal ASGI app run by uvicorn in a daemon thread. A layer
+(RGB or any INDEX_COLORMAPS entry) is rendered once per composite through the
+analyzer's own render_rgb / render_index, then each 256×256 Web-Mercator tile
+is nearest-neighbour sampled from it on demand. Encoded tiles live in a
+byte-bounded LRU; every response carries an ETag, and a matching
+If-None-Match gets a 304 with no body. The token is the composite's content
+key when it came from SentinelAnalyzer.load_composite, so a re-loaded AOI
+reuses browser- and server-cached tiles.
+
+Example
+-------
+>>> server = TileServer()
+>>> base = server.start()                    # 'http://127.0.0.1:54321'
+>>> token = server.register(composite, analyzer)
+>>> folium.TileLayer(server.tile_url(token, 'NDVI'), attr='Sentinel-2',
+...                  bounds=server.bounds(token), overlay=True).add_to(m)
+"""
+
+import asyncio
+import hashlib
+import re
+import socket
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import xarray as xr
+
+from encoding import encode
+
+TILE_SIZE = 256
+TILE_CACHE_BYTES = 64 * 1024 ** 2
+MAX_SOURCES = 8                  # composites kept registered (LRU)
+TILE_MAX_AGE_S = 3600            # Cache-Control max-age for tile responses
+
+_TILE_PATH = re.compile(
+    r'^/tiles/(?P<token>[\w-]+)/(?P<layer>\w+)/'
+    r'(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.png$'
+)
+
+
+def _png(rgba: np.ndarray) -> bytes:
+    # Tiles have their own LRU below, so bypass encoding's hash-keyed one
+    return encode(rgba, 'png', cache=False).data
+
+
+EMPTY_TILE = _png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+class _Source:
+    """One registered composite: its pixel grid and lazily rendered layers."""
+
+    def __init__(self, composite: xr.DataArray, analyzer):
+        self.composite = composite
+        self.analyzer = analyzer
+        x = composite.x.values.astype(float)
+        y = composite.y.values.astype(float)
+        self.x0, self.y0 = x[0], y[0]
+        self.dx = (x[-1] - x[0]) / max(len(x) - 1, 1) or 1e-9
+        self.dy = (y[-1] - y[0]) / max(len(y) - 1, 1) or -1e-9
+        self.shape = (len(y), len(x))
+        self.layers: Dict[str, np.ndarray] = {}
+        self.lock = threading.Lock()
+
+    def bounds(self) -> List[List[float]]:
+        """[[south, west], [north, east]] of the pixel edges (Leaflet order)."""
+        ys = (self.y0 - self.dy / 2, self.y0 + self.dy * (self.shape[0] - 0.5))
+        xs = (self.x0 - self.dx / 2, self.x0 + self.dx * (self.shape[1] - 0.5))
+        return [[min(ys), min(xs)], [max(ys), max(xs)]]
+
+    def layer(self, name: str) -> np.ndarray:
+        with self.lock:
+            if name not in self.layers:
+                if name == 'RGB':
+                    rgba, _ = self.analyzer.render_rgb(self.composite)
+                else:
+                    rgba, _ = self.analyzer.render_index(self.composite, name)
+                self.layers[name] = rgba
+            return self.layers[name]
+
+    def tile(self, name: str, z: int, x: int, y: int) -> Optional[np.ndarray]:
+        """(256, 256, 4) tile, or None if it doesn't touch the composite."""
+        n = 2 ** z
+        frac = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+        lon = (x + frac) / n * 360.0 - 180.0
+        lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + frac) / n))))
+        cols = np.rint((lon - self.x0) / self.dx).astype(np.int64)
+        rows = np.rint((lat - self.y0) / self.dy).astype(np.int64)
+        col_ok = (cols >= 0) & (cols < self.shape[1])
+        row_ok = (rows >= 0) & (rows < self.shape[0])
+        if not col_ok.any() or not row_ok.any():
+            return None
+        rgba = self.layer(name)
+        out = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+        out[np.ix_(row_ok, col_ok)] = rgba[np.ix_(rows[row_ok], cols[col_ok])]
+        return out
+
+
+class TileServer:
+    """Registry of composites + tile cache + the ASGI app serving them.
+
+    Thread-safe: Streamlit reruns call register() while uvicorn's event loop
+    renders tiles in its default executor.
+    """
+
+    def __init__(self, cache_bytes: int = TILE_CACHE_BYTES,
+                 max_sources: int = MAX_SOURCES):
+        self.cache_bytes = int(cache_bytes)
+        self.max_sources = int(max_sources)
+        self.sources: "OrderedDict[str, _Source]" = OrderedDict()
+        self.tiles: "OrderedDict[tuple, Tuple[bytes, str]]" = OrderedDict()
+        self.tile_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+        self._tokens: Dict[int, Tuple[weakref.ref, str]] = {}
+        self.base_url: Optional[str] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ── Registry ─────────────────────────────────────────────────────────────
+
+    def register(self, composite: xr.DataArray, analyzer) -> str:
+        """Make a composite servable; returns its URL token. Cheap to call
+        on every rerun — the same composite always gets the same token."""
+        token = composite.attrs.get('composite_key')
+        with self.lock:
+            if token is None:
+                entry = self._tokens.get(id(composite))
+                if entry is not None and entry[0]() is composite:
+                    token = entry[1]
+                else:
+                    token = uuid.uuid4().hex
+                    self._tokens = {
+                        k: v for k, v in self._tokens.items() if v[0]() is not None
+                    }
+                    self._tokens[id(composite)] = (weakref.ref(composite), token)
+            if token not in self.sources:
+                self.sources[token] = _Source(composite, analyzer)
+            self.sources.move_to_end(token)
+            while len(self.sources) > self.max_sources:
+                old, _ = self.sources.popitem(last=False)
+                self._drop_tiles(old)
+        return token
+
+    def bounds(self, token: str) -> List[List[float]]:
+        return self.sources[token].bounds()
+
+    def tile_url(self, token: str, layer: str) -> str:
+        """Leaflet/folium URL template for one layer of a composite."""
+        base = self.base_url or ''
+        return f"{base}/tiles/{token}/{layer}/{{z}}/{{x}}/{{y}}.png"
+
+    # ── Tiles ────────────────────────────────────────────────────────────────
+
+    def get_tile(self, token: str, layer: str, z: int, x: int,
+                 y: int) -> Optional[Tuple[bytes, str]]:
+        """(png_bytes, etag) for a tile, or None for an unknown token."""
+        key = (token, layer, z, x, y)
+        with self.lock:
+            cached = self.tiles.get(key)
+            if cached is not None:
+                self.tiles.move_to_end(key)
+                self.hits += 1
+                return cached
+            source = self.sources.get(token)
+            self.misses += 1
+        if source is None:
+            return None
+        arr = source.tile(layer, z, x, y)
+        body = EMPTY_TILE if arr is None else _png(arr)
+        etag = '"' + hashlib.sha1(
+            f"{token}/{layer}/{z}/{x}/{y}".encode()).hexdigest()[:20] + '"'
+        with self.lock:
+            if key not in self.tiles and token in self.sources:
+                self.tiles[key] = (body, etag)
+                self.tile_bytes += len(body)
+                while self.tile_bytes > self.cache_bytes and len(self.tiles) > 1:
+                    _, (old, _) = self.tiles.popitem(last=False)
+                    self.tile_bytes -= len(old)
+        return body, etag
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'hits':         self.hits,
+                'misses':       self.misses,
+                'not_modified': self.not_modified,
+                'tiles':        len(self.tiles),
+                'bytes':        self.tile_bytes,
+                'sources':      len(self.sources),
+            }
+
+    def _drop_tiles(self, token: str) -> None:
+        """Evict every cached tile of a source (call with self.lock held)."""
+        for key in [k for k in self.tiles if k[0] == token]:
+            body, _ = self.tiles.pop(key)
+            self.tile_bytes -= len(body)
+
+    # ── ASGI app ─────────────────────────────────────────────────────────────
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        match = _TILE_PATH.match(scope['path'])
+        if scope['method'] != 'GET' or match is None:
+            await _respond(send, 404, b'not found', 'text/plain')
+            return
+        g = match.groupdict()
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                None, self.get_tile, g['token'], g['layer'],
+                int(g['z']), int(g['x']), int(g['y']))
+        except (KeyError, ValueError) as e:
+            await _respond(send, 400, str(e).encode(), 'text/plain')
+            return
+        if result is None:
+            await _respond(send, 404, b'unknown composite', 'text/plain')
+            return
+
+        body, etag = result
+        headers = [
+            (b'etag', etag.encode()),
+            (b'cache-control', f'public, max-age={TILE_MAX_AGE_S}'.encode()),
+            (b'access-control-allow-origin', b'*'),
+        ]
+        if dict(scope['headers']).get(b'if-none-match') == etag.encode():
+            with self.lock:
+                self.not_modified += 1
+            await _respond(send, 304, b'', None, headers)
+            return
+        await _respond(send, 200, body, 'image/png', headers)
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self, host: str = '127.0.0.1', port: int = 0,
+              public_url: Optional[str] = None) -> str:
+        """Serve in a daemon thread; returns the base URL tiles are reached
+        at (`public_url` when the browser sees the server through a proxy).
+        Raises ImportError when uvicorn isn't installed, and ValueError for a
+        wildcard `host` without a `public_url` to hand the browser."""
+        import uvicorn
+
+        if public_url is None and host in ('0.0.0.0', '::', ''):
+            raise ValueError(f"binding {host!r} needs a public_url")
+
+        if port == 0:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.bind((host, 0))
+                port = s.getsockname()[1]
+        config = uvicorn.Config(self, host=host, port=port, log_level='warning',
+                                lifespan='on')
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True,
+                                        name='tile-server')
+        self._thread.start()
+        deadline = time.time() + 10
+        while not self._server.started:
+            if not self._thread.is_alive() or time.time() > deadline:
+                raise RuntimeError(f"tile server failed to start on {host}:{port}")
+            time.sleep(0.01)
+        self.base_url = (public_url or f"http://{host}:{port}").rstrip('/')
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+            self._server = None
+
+
+async def _respond(send, status: int, body: bytes, content_type: Optional[str],
+                   headers: Optional[list] = None) -> None:
+    headers = list(headers or [])
+    if content_type:
+        headers.append((b'content-type', content_type.encode()))
+    headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
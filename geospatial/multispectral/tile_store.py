@@ -0,0 +1,176 @@
+"""Persistent, process-wide store of rendered Drift tiles.
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+DriftEngine's own tile LRU lives in one user's session and holds a handful of
+tiles, so every new session used to re-fetch the same DRIFT_SITES tiles from
+S3 / EOX. A TileStore sits underneath all engines: a tile is addressed by
+everything that determines its pixels — source, grid key, tile size,
+resolution, date range, cloud threshold, gap fill and RGB stretch — and kept
+on local disk as a losslessly compressed RGBA PNG whose text chunk carries
+the tile's bounds and stretch. Entries are evicted least-recently-used once
+the store exceeds its byte budget.
+
+Writes go to a temp file renamed into place, so concurrent engines, threads
+and processes never see a half-written tile; a tile evicted by someone else
+mid-read is just a miss.
+
+Example
+-------
+>>> store = TileStore()
+>>> spec = engine.tile_spec(key)
+>>> tile = store.get(spec)           # {'rgba', 'bounds', 'stretch'} or None
+>>> store.put(spec, tile)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+from encoding import PNG_LEVEL
+
+DEFAULT_STORE_DIR = os.environ.get(
+    'SENTINEL_TILE_STORE',
+    str(Path.home() / '.cache' / 'sentinel_analysis' / 'drift_tiles'),
+)
+DEFAULT_MAX_BYTES = 1024 ** 3   # 1 GB
+
+
+def tile_key(spec: Dict) -> str:
+    """Stable content hash of a tile spec; floats rounded so the same spec
+    computed twice doesn't miss on the 15th decimal."""
+    def norm(v):
+        if isinstance(v, float):
+            return round(v, 9)
+        if isinstance(v, (list, tuple)):
+            return [norm(x) for x in v]
+        return v
+    payload = {k: norm(v) for k, v in spec.items()}
+    blob = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode()).hexdigest()[:32]
+
+
+class TileStore:
+    """Byte-bounded LRU of rendered tiles on local disk. Thread-safe and
+    safe to share between processes pointing at the same directory."""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # Running size estimate; a full scan re-syncs it before evicting.
+        self._bytes = sum(size for _, _, size in self._entries())
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def get(self, spec: Dict) -> Optional[Dict]:
+        path = self._path(tile_key(spec))
+        try:
+            with Image.open(path) as img:
+                img.load()
+                meta = json.loads(img.text['drift'])
+                rgba = np.asarray(img.convert('RGBA'))
+            os.utime(path, None)    # bump recency for LRU eviction
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        stretch = meta.get('stretch')
+        return {'empty': False, 'rgba': rgba, 'bounds': meta['bounds'],
+                'stretch': tuple(stretch) if stretch else None}
+
+    def put(self, spec: Dict, tile: Dict) -> None:
+        """Store a rendered (non-empty) tile: {'rgba', 'bounds'[, 'stretch']}."""
+        if tile.get('empty') or tile.get('rgba') is None:
+            return
+        path = self._path(tile_key(spec))
+        path.parent.mkdir(exist_ok=True)
+        info = PngImagePlugin.PngInfo()
+        info.add_text('drift', json.dumps({
+            'bounds':  [float(v) for v in tile['bounds']],
+            'stretch': ([float(v) for v in tile['stretch']]
+                        if tile.get('stretch') else None),
+        }))
+        fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}.', dir=path.parent)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                Image.fromarray(np.ascontiguousarray(tile['rgba']), 'RGBA').save(
+                    f, format='PNG', compress_level=PNG_LEVEL, pnginfo=info)
+            size = os.path.getsize(tmp)
+            try:
+                replaced = path.stat().st_size   # overwriting an existing tile
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        with self.lock:
+            self._bytes += size - replaced
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._entries()
+        with self.lock:
+            return {
+                'hits':      self.hits,
+                'misses':    self.misses,
+                'evictions': self.evictions,
+                'entries':   len(entries),
+                'bytes':     sum(size for _, _, size in entries),
+            }
+
+    def clear(self) -> None:
+        with self.lock:
+            for path, _, _ in self._entries():
+                path.unlink(missing_ok=True)
+            self._bytes = 0
+
+    # ── Internals ────────────────────────────────────────────────────────────
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f'{key}.png'
+
+    def _entries(self) -> list:
+        """[(path, last_used, bytes)] for every committed tile."""
+        out = []
+        for p in self.root.glob('*/*.png'):
+            if p.name.startswith('.'):
+                continue
+            try:
+                st = p.stat()
+                out.append((p, st.st_mtime, st.st_size))
+            except FileNotFoundError:
+                continue   # evicted by another thread/process mid-scan
+        return out
+
+    def _evict(self) -> None:
+        """Drop least-recently-used tiles down to 90% of the budget, so the
+        next few puts don't each trigger a full directory scan."""
+        target = int(self.max_bytes * 0.9)
+        with self.lock:
+            entries = sorted(self._entries(), key=lambda e: e[1])
+            total = sum(size for _, _, size in entries)
+            # Always keep the newest tile, even if it alone is over budget.
+            while total > target and len(entries) > 1:
+                path, _, size = entries.pop(0)
+                path.unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+            self._bytes = total
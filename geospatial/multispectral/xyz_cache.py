@@ -0,0 +1,226 @@
+"""Process-wide cache of raw XYZ basemap tiles (the Drift instant source).
+
+Pure-Python module (no Streamlit imports) so it can be unit-tested standalone.
+
+An instant drift tile is stitched from dozens of 256 px EOX JPEGs, and
+neighbouring drift tiles share the Web-Mercator tiles along their edges, so
+the same JPEG used to be downloaded once per drift tile that touched it —
+and again by every session. XYZCache keeps the encoded bytes, keyed by
+(layer, z, x, y), in two levels:
+
+- an in-memory byte-bounded LRU, shared by every DriftEngine in the process;
+- an optional SQLite file laid out like an MBTiles `tiles` table (TMS row
+  order) plus a `layer` column, so the cache survives restarts and can be
+  pre-warmed with `python seed_xyz_cache.py`. Oldest tiles are dropped once
+  it exceeds its byte budget.
+
+Basemap tiles never change for a given layer name, so entries don't expire.
+
+Example
+-------
+>>> cache = XYZCache('/tmp/eox.mbtiles')
+>>> data = cache.get('s2cloudless-2020_3857', 12, 2134, 1420)   # bytes or None
+>>> cache.put('s2cloudless-2020_3857', 12, 2134, 1420, data)
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+DEFAULT_XYZ_PATH = os.environ.get(
+    'SENTINEL_XYZ_CACHE',
+    str(Path.home() / '.cache' / 'sentinel_analysis' / 'eox_xyz.mbtiles'),
+)
+DEFAULT_MEMORY_BYTES = 256 * 1024 ** 2   # ~10k EOX JPEGs
+DEFAULT_DISK_BYTES = 2 * 1024 ** 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tiles (
+    layer       TEXT    NOT NULL,
+    zoom_level  INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row    INTEGER NOT NULL,
+    tile_data   BLOB    NOT NULL,
+    PRIMARY KEY (layer, zoom_level, tile_column, tile_row)
+);
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+INSERT OR IGNORE INTO metadata VALUES ('format', 'jpg');
+"""
+
+TileKey = Tuple[str, int, int, int]
+
+
+class XYZCache:
+    """Two-level (memory, optional SQLite) cache of raw XYZ tile bytes.
+    Thread-safe; the SQLite file may be shared between processes.
+
+    `lock` guards only the memory LRU and counters. SQLite is reached
+    through one connection per thread, outside the lock, so a pool of
+    fetchers reading and writing the file never queues on one mutex (WAL
+    lets readers run alongside the single writer)."""
+
+    def __init__(self, path: Optional[str] = None,
+                 max_bytes: int = DEFAULT_MEMORY_BYTES,
+                 max_disk_bytes: int = DEFAULT_DISK_BYTES):
+        self.path = path or None
+        self.max_bytes = int(max_bytes)
+        self.max_disk_bytes = int(max_disk_bytes)
+        self._mem: 'OrderedDict[TileKey, bytes]' = OrderedDict()
+        self._mem_bytes = 0
+        self._local = threading.local()          # .db: this thread's connection
+        self._db_ready = False
+        self._db_init_lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def get(self, layer: str, z: int, x: int, y: int) -> Optional[bytes]:
+        key = (layer, z, x, y)
+        with self.lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return data
+        db = self._open()
+        row = None
+        if db is not None:
+            row = db.execute(
+                'SELECT tile_data FROM tiles WHERE layer=? AND zoom_level=? '
+                'AND tile_column=? AND tile_row=?',
+                (layer, z, x, _tms_row(z, y))).fetchone()
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            data = bytes(row[0])
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, layer: str, z: int, x: int, y: int, data: bytes) -> None:
+        with self.lock:
+            self._remember((layer, z, x, y), data)
+        db = self._open()
+        if db is None:
+            return
+        where = (layer, z, x, _tms_row(z, y))
+        with db:
+            # Take the write lock first so the size read and the replace are
+            # one step even with other threads/processes writing the same row.
+            db.execute('BEGIN IMMEDIATE')
+            old = db.execute(
+                'SELECT LENGTH(tile_data) FROM tiles WHERE layer=? AND '
+                'zoom_level=? AND tile_column=? AND tile_row=?', where).fetchone()
+            db.execute('INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?)',
+                       (*where, sqlite3.Binary(data)))
+        with self.lock:
+            # An overwrite replaces the old row's bytes rather than adding to them
+            self._disk_bytes += len(data) - (old[0] if old else 0)
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict_disk()
+
+    def stats(self) -> Dict[str, int]:
+        db = self._open()
+        disk = (db.execute('SELECT COUNT(*) FROM tiles').fetchone()[0]
+                if db is not None else 0)
+        with self.lock:
+            return {
+                'hits':         self.hits,
+                'disk_hits':    self.disk_hits,
+                'misses':       self.misses,
+                'entries':      len(self._mem),
+                'bytes':        self._mem_bytes,
+                'disk_entries': disk,
+                'disk_bytes':   self._disk_bytes,
+            }
+
+    def clear(self) -> None:
+        with self.lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+        db = self._open()
+        if db is not None:
+            with db:
+                db.execute('DELETE FROM tiles')
+            with self.lock:
+                self._disk_bytes = 0
+
+    # ── Internals ────────────────────────────────────────────────────────────
+
+    def _open(self) -> Optional[sqlite3.Connection]:
+        """This thread's SQLite connection, opened on first use (the file
+        and schema on the first use by any thread). None for a memory-only
+        cache."""
+        if not self.path:
+            return None
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            return db
+        with self._db_init_lock:
+            if not self._db_ready:
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                init = sqlite3.connect(self.path, timeout=30)
+                init.execute('PRAGMA journal_mode=WAL')
+                init.executescript(_SCHEMA)
+                size = init.execute(
+                    'SELECT COALESCE(SUM(LENGTH(tile_data)), 0) FROM tiles'
+                ).fetchone()[0]
+                init.close()
+                with self.lock:
+                    self._disk_bytes = size
+                self._db_ready = True
+        db = sqlite3.connect(self.path, timeout=30)
+        self._local.db = db
+        return db
+
+    def _remember(self, key: TileKey, data: bytes) -> None:
+        """Insert into the memory LRU (call with the lock held)."""
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        if len(data) > self.max_bytes:
+            return
+        self._mem[key] = data
+        self._mem_bytes += len(data)
+        while self._mem_bytes > self.max_bytes:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+
+    def _evict_disk(self) -> None:
+        """Drop the oldest-written tiles down to 90% of the disk budget. One
+        thread evicts at a time; others carry on rather than wait for it."""
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            target = int(self.max_disk_bytes * 0.9)
+            with self._open() as db:
+                rows = db.execute('SELECT rowid, LENGTH(tile_data) FROM tiles '
+                                  'ORDER BY rowid').fetchall()
+                total = sum(size for _, size in rows)
+                drop = []
+                for rowid, size in rows:
+                    if total <= target:
+                        break
+                    drop.append((rowid,))
+                    total -= size
+                db.executemany('DELETE FROM tiles WHERE rowid=?', drop)
+            with self.lock:
+                self._disk_bytes = total
+        finally:
+            self._evict_lock.release()
+
+
+def _tms_row(z: int, y: int) -> int:
+    """MBTiles stores rows bottom-up (TMS); XYZ counts them top-down."""
+    return (1 << z) - 1 - y